@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from ansible_hint.parser import (UnicodeRepr, ProductionBase, Eof, CharRange, Literal,
+        Optional, OneOf, Sequence, OrGroup, OneOrMore, OneOrMoreUntil, ZeroOrMore,
+        ZeroOrMoreUntil, Decl, UnreportedDecl, ExpandedDecl, SideTableDecl, TokenDecl, DeclRef,
+        Lookahead, Cut, Debug, IndentAtLeast, SameIndent, Dedent, Jinja)
+from ansible_hint.grammar import decl_refs
+from ansible_hint.lexer import token_pattern
+
+DECL_TYPES = (Decl, UnreportedDecl, ExpandedDecl, SideTableDecl, TokenDecl)
+
+# productions that succeed without consuming text whenever they succeed at all
+ZERO_WIDTH_TYPES = (Eof, Lookahead, Cut, IndentAtLeast, SameIndent, Dedent)
+
+# productions that always succeed, so later alternatives are never tried
+ALWAYS_SUCCEEDS_TYPES = (Optional, ZeroOrMore, Cut)
+
+# widest CharRange whose characters first_chars() lists
+MAX_FIRST_RANGE = 64
+
+# first_chars() of a production that may succeed or have effects at any character
+UNKNOWN_FIRST = (None, True)
+
+# kinds of findings, in report order within a decl
+MISSING_DECL = 'missing-decl'
+NULLABLE_REPETITION = 'nullable-repetition'
+SHADOWED_ALTERNATIVE = 'shadowed-alternative'
+INVALID_TOKEN = 'invalid-token'
+UNREACHABLE_DECL = 'unreachable-decl'
+BACKTRACKING = 'backtracking'
+
+
+class GrammarFinding(UnicodeRepr):
+    def __init__(self, kind, decl, msg):
+        self.kind = kind
+        self.decl = decl
+        self.msg = msg
+
+    def __unicode__(self):
+        return '{}: {} [{}]'.format(self.decl, self.msg, self.kind)
+
+
+class GrammarError(Exception, UnicodeRepr):
+    def __init__(self, findings):
+        Exception.__init__(self)
+        self.findings = findings
+
+    def __unicode__(self):
+        return '\n'.join(map(unicode, self.findings))
+
+
+def _children(prod):
+    if isinstance(prod, DECL_TYPES):
+        return [prod.prod]
+    if isinstance(prod, (Sequence, OrGroup)):
+        return list(prod.items)
+    if isinstance(prod, (Optional, OneOrMore, ZeroOrMore)):
+        return [prod.production]
+    if isinstance(prod, (Lookahead, Debug)):
+        return [prod.item]
+    # NOTE: Negate and the *Until productions only test their production
+    return []
+
+
+def _walk(prod):
+    """ Yields prod and every production nested in it, not following DeclRefs """
+    stack = [prod]
+    while stack:
+        item = stack.pop()
+        yield item
+        stack.extend(reversed(_children(item)))
+
+
+class GrammarAnalyzer(object):
+    """
+    Static checks for a list of decls that find grammar mistakes which show
+    up as hangs or slow parses rather than as errors.  The start decl is the
+    first decl, as in load_grammar().
+    """
+    def __init__(self, decls):
+        self.decls = list(decls)
+        self.decl_map = dict((decl.name, decl) for decl in self.decls)
+        self.nullable_decls = self._find_nullable_decls()
+
+    def nullable(self, prod):
+        """ Returns True if prod can succeed without consuming any text """
+        if isinstance(prod, ZERO_WIDTH_TYPES + (Optional, ZeroOrMore, ZeroOrMoreUntil)):
+            return True
+        if isinstance(prod, Literal):
+            return prod.text == ''
+        if isinstance(prod, DECL_TYPES):
+            return self.nullable(prod.prod)
+        if isinstance(prod, DeclRef):
+            return prod.name in self.nullable_decls
+        if isinstance(prod, Sequence):
+            return all(self.nullable(x) for x in prod.items)
+        if isinstance(prod, OrGroup):
+            return any(self.nullable(x) for x in prod.items)
+        if isinstance(prod, (OneOrMore, Debug)):
+            return self.nullable(_children(prod)[0])
+        return False
+
+    def _find_nullable_decls(self):
+        self.nullable_decls = set()
+        changed = True
+        while changed:
+            changed = False
+            for decl in self.decls:
+                if decl.name not in self.nullable_decls and self.nullable(decl.prod):
+                    self.nullable_decls.add(decl.name)
+                    changed = True
+        return self.nullable_decls
+
+    def fixed_text(self, prod, seen=()):
+        """ Returns the only text prod can match, or None """
+        if isinstance(prod, Literal):
+            return prod.text
+        if isinstance(prod, DECL_TYPES):
+            return self.fixed_text(prod.prod, seen)
+        if isinstance(prod, DeclRef):
+            decl = self.decl_map.get(prod.name)
+            if decl is None or prod.name in seen:
+                return None
+            return self.fixed_text(decl, seen + (prod.name,))
+        if isinstance(prod, Sequence):
+            parts = [self.fixed_text(x, seen) for x in prod.items]
+            if None in parts:
+                return None
+            return ''.join(parts)
+        return None
+
+    def first_chars(self, prod, seen=()):
+        """
+        Returns (chars, nullable) for prod before the end of the text.  prod
+        can only succeed, or have any effect besides failing, where the next
+        character is in chars, or also anywhere if nullable.  chars is None
+        when not known, as for Any, Negate and the zero-width checks.
+        """
+        if prod.has_fail_msg():
+            return UNKNOWN_FIRST
+        if isinstance(prod, Literal):
+            return (prod.text[:1], not prod.text)
+        if isinstance(prod, OneOf):
+            return (prod.text, False)
+        if isinstance(prod, CharRange):
+            if ord(prod.end_ch) - ord(prod.start_ch) >= MAX_FIRST_RANGE:
+                return UNKNOWN_FIRST
+            return (''.join(unichr(x) for x in range(ord(prod.start_ch), ord(prod.end_ch) + 1)),
+                    False)
+        if isinstance(prod, Eof):
+            return ('', False)
+        if isinstance(prod, Jinja):
+            return ('{', False)
+        if isinstance(prod, DECL_TYPES):
+            return self.first_chars(prod.prod, seen)
+        if isinstance(prod, DeclRef):
+            decl = self.decl_map.get(prod.name)
+            if decl is None or prod.name in seen:
+                return UNKNOWN_FIRST
+            return self.first_chars(decl, seen + (prod.name,))
+        if isinstance(prod, Sequence):
+            chars = set()
+            for item in prod.items:
+                item_chars, nullable = self.first_chars(item, seen)
+                if item_chars is None:
+                    return UNKNOWN_FIRST
+                chars.update(item_chars)
+                if not nullable:
+                    return (''.join(sorted(chars)), False)
+            return (''.join(sorted(chars)), True)
+        if isinstance(prod, OrGroup):
+            firsts = [self.first_chars(x, seen) for x in prod.items]
+            if any(chars is None for chars, nullable in firsts):
+                return UNKNOWN_FIRST
+            return (''.join(sorted(set(''.join(x[0] for x in firsts)))),
+                    any(x[1] for x in firsts))
+        if isinstance(prod, (Optional, ZeroOrMore)):
+            chars, nullable = self.first_chars(prod.production, seen)
+            return (chars, True)
+        if isinstance(prod, OneOrMore):
+            return self.first_chars(prod.production, seen)
+        return UNKNOWN_FIRST
+
+    def scans(self):
+        """
+        Returns {OneOrMoreUntil or ZeroOrMoreUntil: chars} for the repetitions
+        whose term can only match where the next character is in chars, so
+        that the parser can skip to those characters without testing it
+        """
+        result = {}
+        stack = list(self.decls)
+        seen = set()
+        while stack:
+            prod = stack.pop()
+            if id(prod) in seen:
+                continue
+            seen.add(id(prod))
+            # NOTE: unlike _walk(), this also finds the repetitions within terms
+            stack.extend(x for x in prod.ctor_args() if isinstance(x, ProductionBase))
+            if isinstance(prod, (OneOrMoreUntil, ZeroOrMoreUntil)):
+                chars, nullable = self.first_chars(prod.term)
+                if chars is not None and not nullable:
+                    result[prod] = chars
+        return result
+
+    def leading(self, prod):
+        """ Returns the first production that prod evaluates """
+        while isinstance(prod, Sequence) and prod.items:
+            prod = prod.items[0]
+        return prod
+
+    def analyze(self):
+        """ Returns a list of GrammarFindings, grouped by decl in grammar order """
+        findings = []
+        reachable = self.reachable()
+        for decl in self.decls:
+            findings.extend(self.check_decl(decl))
+            if decl.name not in reachable:
+                findings.append(GrammarFinding(UNREACHABLE_DECL, decl.name,
+                        'Not reachable from "{}"'.format(self.decls[0].name)))
+        findings.extend(self.backtracking())
+        return findings
+
+    def check_decl(self, decl):
+        findings = []
+        if isinstance(decl, TokenDecl):
+            findings.extend(self.check_token(decl))
+        for prod in _walk(decl.prod):
+            if isinstance(prod, DeclRef) and prod.name not in self.decl_map:
+                findings.append(GrammarFinding(MISSING_DECL, decl.name,
+                        'Reference to undeclared "{}"'.format(prod.name)))
+            elif isinstance(prod, (OneOrMore, ZeroOrMore)) and self.nullable(prod.production):
+                findings.append(GrammarFinding(NULLABLE_REPETITION, decl.name,
+                        '{} repeats {}, which can match empty text and never stop'.format(
+                            type(prod).__name__, prod.production)))
+            elif isinstance(prod, OrGroup):
+                findings.extend(self.check_alternatives(decl, prod))
+        return findings
+
+    def check_token(self, decl):
+        try:
+            token_pattern(decl, self.decl_map, (decl.name,))
+        except ValueError as e:
+            return [GrammarFinding(INVALID_TOKEN, decl.name, unicode(e))]
+        if self.nullable(decl.prod):
+            return [GrammarFinding(INVALID_TOKEN, decl.name,
+                    'Token can match empty text, where it never matches')]
+        return []
+
+    def check_alternatives(self, decl, prod):
+        findings = []
+        texts = [self.fixed_text(x) for x in prod.items]
+        for later in range(1, len(prod.items)):
+            for earlier in range(later):
+                if isinstance(prod.items[earlier], ALWAYS_SUCCEEDS_TYPES):
+                    reason = 'always succeeds'
+                elif (texts[earlier] is not None and texts[later] is not None
+                        and texts[later].startswith(texts[earlier])):
+                    reason = 'matches a prefix of it'
+                else:
+                    continue
+                findings.append(GrammarFinding(SHADOWED_ALTERNATIVE, decl.name,
+                        'Alternative {} ({}) is never tried; alternative {} {}'.format(
+                            later + 1, prod.items[later], earlier + 1, reason)))
+                break
+        return findings
+
+    def reachable(self):
+        result = set()
+        stack = [self.decls[0].name] if self.decls else []
+        while stack:
+            name = stack.pop()
+            if name in result or name not in self.decl_map:
+                continue
+            result.add(name)
+            # NOTE: unlike _walk(), this follows the productions that Negate tests
+            stack.extend(decl_refs(self.decl_map[name]))
+        return result
+
+    def _shared_leads(self, decl):
+        # (alternative numbers, lead decl name) for alternatives starting with the same decl
+        for prod in _walk(decl.prod):
+            if not isinstance(prod, OrGroup):
+                continue
+            leads = {}
+            for index, item in enumerate(prod.items):
+                lead = self.leading(item)
+                if isinstance(lead, DeclRef) and lead.name in self.decl_map:
+                    leads.setdefault(lead.name, []).append(index + 1)
+            for name in sorted(leads):
+                if len(leads[name]) > 1:
+                    yield leads[name], name
+
+    def backtracking(self):
+        """
+        Estimates hot spots: OrGroups whose alternatives start with the same
+        decl, which is then parsed again at the same offset for each failed
+        alternative.  The estimate multiplies through nested hot spots.
+        """
+        shared = dict((decl.name, list(self._shared_leads(decl))) for decl in self.decls)
+        factors = {}
+
+        def factor(name, seen):
+            # worst-case evaluations at one offset caused by parsing name once
+            if name in factors:
+                return factors[name]
+            if name in seen:
+                return 1
+            result = 1
+            for alternatives, lead in shared.get(name, ()):
+                result = max(result, len(alternatives) * factor(lead, seen | set([name])))
+            factors[name] = result
+            return result
+
+        findings = []
+        for decl in self.decls:
+            for alternatives, lead in shared[decl.name]:
+                worst = len(alternatives) * factor(lead, set([decl.name]))
+                findings.append((worst, GrammarFinding(BACKTRACKING, decl.name,
+                        'Alternatives {} start with "{}", which may be parsed {} times '
+                        'at one offset'.format(', '.join(map(unicode, alternatives)), lead, worst))))
+        findings.sort(key=lambda x: -x[0])
+        return [finding for worst, finding in findings]
+
+
+def analyze_grammar(decls, strict=False):
+    """
+    Returns the GrammarFindings for decls.  If strict, raises GrammarError
+    instead when there are any findings.
+    """
+    findings = GrammarAnalyzer(decls).analyze()
+    if strict and findings:
+        raise GrammarError(findings)
+    return findings
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from ansible_hint.parser import UnicodeRepr, ParseCtx, ParseError, Sequence, OrGroup, DeclRef
+from ansible_hint.grammar import production_children
+from ansible_hint.lines import LineTable
+
+# parts of the input parsed to see how re-evaluation grows with input size
+FRACTIONS = (0.25, 0.5, 1.0)
+
+# longest excerpt shown in a report
+EXCERPT_CHARS = 200
+
+
+class EvaluationCounter(object):
+    """
+    ParseCtx tracer that counts Decl evaluations per (Decl name, offset),
+    and which decl was evaluating when a pair was evaluated again.
+    """
+    def __init__(self):
+        self.counts = {}
+        self.callers = {}
+
+    def evaluate(self, ctx, decl):
+        key = (decl.name, ctx.pos)
+        count = self.counts[key] = self.counts.get(key, 0) + 1
+        if count > 1:
+            # NOTE: decl is already on top of the stack
+            stack = ctx.state.decl_stack
+            caller = (decl.name, stack[-2] if len(stack) > 1 else None)
+            self.callers[caller] = self.callers.get(caller, 0) + 1
+
+    def ratios(self):
+        """ Returns a dict of decl name -> evaluations per distinct offset """
+        evaluations = {}
+        offsets = {}
+        for (name, offset), count in self.counts.items():
+            evaluations[name] = evaluations.get(name, 0) + count
+            offsets[name] = offsets.get(name, 0) + 1
+        return dict((name, evaluations[name] / offsets[name]) for name in evaluations)
+
+    def worst(self, name):
+        """ Returns (offset, count) of the first most evaluated offset for name """
+        count, offset = max((count, -offset) for (decl, offset), count in self.counts.items()
+                if decl == name)
+        return -offset, count
+
+    def top_callers(self, name, num=2):
+        """ Returns the names of the decls that re-evaluated name most often """
+        callers = [(count, caller) for (decl, caller), count in self.callers.items()
+                if decl == name and caller is not None]
+        return [caller for count, caller in sorted(callers, reverse=True)[:num]]
+
+
+def count_evaluations(decls, decl, text):
+    """ Parses text from decl and returns its EvaluationCounter """
+    counter = EvaluationCounter()
+    ctx = ParseCtx(decls, tracer=counter)
+    ctx.reset(text)
+    try:
+        ctx.get_decl(decl).evaluate(ctx)
+    except ParseError:
+        # NOTE: the evaluations up to the error still count
+        pass
+    return counter
+
+
+def production_paths(prod, name, path=()):
+    """ Yields the path of steps from prod to each DeclRef to name within it """
+    if isinstance(prod, DeclRef):
+        if prod.name == name:
+            yield path
+        return
+    for index, child in enumerate(production_children(prod)):
+        if isinstance(prod, OrGroup):
+            step = 'OrGroup alternative {}'.format(index + 1)
+        elif isinstance(prod, Sequence):
+            step = 'Sequence item {}'.format(index + 1)
+        else:
+            step = type(prod).__name__
+        for result in production_paths(child, name, path + (step,)):
+            yield result
+
+
+class BacktrackingReport(UnicodeRepr):
+    def __init__(self, decl, ratios, position, count, paths, excerpt):
+        self.decl = decl
+        # (fraction of input, evaluations per offset)
+        self.ratios = ratios
+        self.position = position
+        self.count = count
+        # (caller decl, [step, ...])
+        self.paths = paths
+        self.excerpt = excerpt
+
+    def __unicode__(self):
+        lines = ['"{}" is evaluated {:.1f} times per offset ({})'.format(
+                self.decl, self.ratios[-1][1], ', '.join('{:.1f} at {:.0%}'.format(ratio, fraction)
+                    for fraction, ratio in self.ratios))]
+        lines.append('  worst at {}:{}, {} evaluations'.format(
+                self.position[0] + 1, self.position[1] + 1, self.count))
+        for caller, steps in self.paths:
+            lines.append('  via {}: {}'.format(caller, ' > '.join(steps) or '(direct)'))
+        lines.append('  excerpt: {!r}'.format(self.excerpt))
+        return '\n'.join(lines)
+
+
+class BacktrackingDetector(object):
+    """
+    Finds decls whose evaluations per offset grow with the size of the
+    input, which makes the parse superlinear.  The input is parsed from
+    decl at several prefix lengths, ending at line boundaries.
+    """
+    def __init__(self, decls, decl, min_ratio=2.0, min_growth=1.5):
+        self.decls = list(decls)
+        self.decl_map = dict((x.name, x) for x in self.decls)
+        self.decl = decl
+        self.min_ratio = min_ratio
+        self.min_growth = min_growth
+
+    def prefixes(self, text):
+        result = []
+        for fraction in FRACTIONS:
+            end = len(text)
+            if fraction < 1:
+                end = text.rfind('\n', 0, int(len(text) * fraction)) + 1
+            if end > 0 and (not result or end > len(result[-1][1])):
+                result.append((fraction, text[:end]))
+        return result
+
+    def growing(self, ratios):
+        # ratios for one decl, smallest input first
+        return (len(ratios) > 1 and ratios[-1][1] >= self.min_ratio
+                and ratios[-1][1] >= ratios[0][1] * self.min_growth)
+
+    def detect(self, text):
+        """ Returns BacktrackingReports for text, the fastest growing first """
+        ratios = {}
+        counter = None
+        for fraction, prefix in self.prefixes(text):
+            counter = count_evaluations(self.decls, self.decl, prefix)
+            for name, ratio in counter.ratios().items():
+                ratios.setdefault(name, []).append((fraction, ratio))
+
+        reports = []
+        for name in sorted(ratios):
+            if self.growing(ratios[name]):
+                reports.append(self.report(name, ratios[name], counter, text))
+        reports.sort(key=lambda x: -x.ratios[-1][1] / x.ratios[0][1])
+        return reports
+
+    def report(self, name, ratios, counter, text):
+        offset, count = counter.worst(name)
+        lines = LineTable(text)
+        paths = []
+        for caller in counter.top_callers(name):
+            for steps in production_paths(self.decl_map[caller].prod, name):
+                paths.append((caller, list(steps)))
+                break
+        return BacktrackingReport(name, ratios, lines.position(offset), count, paths,
+                self.excerpt(name, text, lines.line_of(offset), lines))
+
+    def excerpt(self, name, text, line, lines):
+        """
+        Returns the fewest lines from line on, doubling, for which name is
+        still evaluated at least min_ratio times per offset on its own.
+        """
+        num = 1
+        while True:
+            end = lines.end(min(line + num, len(lines)) - 1)
+            excerpt = text[lines.start(line):end]
+            if line + num >= len(lines):
+                break
+            ratio = count_evaluations(self.decls, self.decl, excerpt).ratios().get(name, 0)
+            if ratio >= self.min_ratio:
+                break
+            num *= 2
+        if len(excerpt) > EXCERPT_CHARS:
+            excerpt = excerpt[:EXCERPT_CHARS] + '...'
+        return excerpt
@@ -2,19 +2,29 @@
 
 from __future__ import division, absolute_import, print_function, unicode_literals
 from ansible_hint.parser import *
+from ansible_hint.grammar import LazyDecls
 
 # some shorthand to make things more readable
 DR = DeclRef
-TS = DR('ts')
 L = Literal
 
-bnf_parser_decls = [
-    # declaration_set      :=  declaration+
-    Decl('declaration_set', OneOrMore(DR('declaration'))),
+def build_bnf_parser_decls():
+    """ Builds the SimpleParse BNF grammar used to read grammar files """
+    TS = DR('ts')
 
-    # declaration         :=  ts, (unreportedname/expandedname/name) ,ts,':',':'?,'=',seq_group
+    return [
+    # declaration_set      :=  (import / declaration)+
+    Decl('declaration_set', OneOrMore(OrGroup(DR('import'), DR('declaration')))),
+
+    # import              :=  ts, '@import', ts, name
+    Decl('import', TS, L('@import'), TS,
+        DR('name').on_fail('Expected grammar module name after @import')
+    ),
+
+    # declaration         :=  ts, (token_indicator, ts)?, (unreportedname/expandedname/name) ,ts,':',':'?,'=',seq_group
     Decl('declaration',
         TS,
+        Optional(Sequence(DR('token_indicator'), TS)),
         OrGroup(
             DR('unreportedname'), DR('expandedname'), DR('name')
         ).on_fail('Expected name, <unreported>, or >expanded< declaration'),
@@ -23,18 +33,21 @@ bnf_parser_decls = [
         DR('seq_group')
     ),
 
-    # element_token       :=  lookahead_indicator?, ts, negpos_indicator?,ts, (literal/range/group/name),ts, occurence_indicator?, ts, error_on_fail?
+    # element_token       :=  lookahead_indicator?, ts, negpos_indicator?,ts, (literal/range/group/builtin_call/name),ts, occurence_indicator?, ts, error_on_fail?
     Decl('element_token',
         Optional(DR('lookahead_indicator')), TS,
         Optional(DR('neg_indicator')), TS,
         OrGroup(
-            DR('literal'), DR('range'), DR('group'), DR('name')
+            DR('literal'), DR('range'), DR('group'), DR('builtin_call'), DR('name')
         ),
         TS,
         Optional(DR('occurrence_indicator')), TS,
         Optional(DR('error_on_fail'))
     ),
 
+    # token_indicator     :=  '@token'
+    Decl('token_indicator', L('@token')),
+
     # negpos_indicator    :=  [-+]
     Decl('neg_indicator', L('-')),
 
@@ -54,23 +67,35 @@ bnf_parser_decls = [
         L(')').on_fail('Expected closing ")"')
     ),
 
-    # seq_group           :=  ts,(error_on_fail/fo_group/element_token),
+    # seq_group           :=  ts,(error_on_fail/cut/fo_group/element_token),
     #                           (ts, seq_indicator, ts,
-    #                               (error_on_fail/fo_group/element_token)
+    #                               (error_on_fail/cut/fo_group/element_token)
     #                           )*, ts
     #
     Decl('seq_group', TS,
         OrGroup(
-            DR('error_on_fail'), DR('fo_group'), DR('element_token')
+            DR('error_on_fail'), DR('cut'), DR('fo_group'), DR('element_token')
         ).on_fail('Expected one or more terms in sequence'),
         ZeroOrMore(Sequence(
             TS, DR('seq_indicator'), TS,
             OrGroup(
-                DR('error_on_fail'), DR('fo_group'), DR('element_token')
+                DR('error_on_fail'), DR('cut'), DR('fo_group'), DR('element_token')
             )
         )), TS
     ),
 
+    # cut                 :=  "~"
+    Decl('cut', L('~')),
+
+    # builtin_call        :=  name, ts, '(', ts, builtin_arg, ts, ')'
+    Decl('builtin_call', DR('name'), TS, L('('), TS,
+        DR('builtin_arg').on_fail('Expected integer argument'), TS,
+        L(')').on_fail('Expected closing ")"')
+    ),
+
+    # builtin_arg         :=  [0-9]+
+    Decl('builtin_arg', OneOrMore(CharRange('0', '9'))),
+
     # fo_group            :=  element_token, (ts, fo_indicator, ts, element_token)+
     Decl('fo_group', TS,
         DR('element_token'),
@@ -94,15 +119,18 @@ bnf_parser_decls = [
     # expandedname        :=  '>', name, '<'
     Decl('expandedname', L('>'), DR('name'), L('<').on_fail('Expected closing "<"')),
 
-    # name                :=  [a-zA-Z_],[a-zA-Z0-9_]*
-    Decl('name', OrGroup(CharRange('a', 'z'), CharRange('A', 'Z'), L('_')),
+    # @token name         :=  [a-zA-Z_],[a-zA-Z0-9_]*
+    TokenDecl('name', OrGroup(CharRange('a', 'z'), CharRange('A', 'Z'), L('_')),
         ZeroOrMore(OrGroup(
             CharRange('a', 'z'), CharRange('A', 'Z'), CharRange('0', '9'), L('_')
         ))
     ),
 
-    # <ts>                :=  ( [ \011-\015]+ / comment )*
-    UnreportedDecl('ts', ZeroOrMore(OrGroup(
+    # <ts>                :=  space?
+    UnreportedDecl('ts', Optional(DR('space'))),
+
+    # @token <space>      :=  ( [ \011-\015]+ / comment )+
+    UnreportedTokenDecl('space', OneOrMore(OrGroup(
         OneOrMore(OrGroup(L(' '), CharRange('\011', '\015'))), DR('comment')
     ))),
 
@@ -205,6 +233,10 @@ bnf_parser_decls = [
     )
 ]
 
+# built on first use, or loaded from the frozen module generated at install time
+bnf_parser_decls = LazyDecls('bnf')
+
+
 class SemanticError(Exception):
     pass
 
@@ -236,79 +268,98 @@ class ParserBase(object):
         return None
 
 
+ESCAPED_LITERAL_CHAR_LOOKUP = {
+    '\\': '\\',
+    'a': '\a',
+    'b': '\b',
+    'n': '\n',
+    'r': '\r',
+    't': '\t',
+    'v': '\v',
+    '"': '\"',
+    '\'': '\'',
+}
+
+ESCAPED_LITERAL_LOOKUP = {
+    'CHAR': lambda x: x.text,
+    'CHAR_NO_SNGLQUOTE': lambda x: x.text,
+    'CHAR_NO_DBLQUOTE': lambda x: x.text,
+    'HEX_ESCAPED_CHAR': lambda x: unichr(int('0x'+x.text, 16)),
+    'UNICODE_ESCAPED_CHAR_16': lambda x: unichr(int('0x'+x.text, 16)),
+    'UNICODE_ESCAPED_CHAR_32': lambda x: unichr(int('0x'+x.text, 16)),
+    'OCTAL_ESCAPED_CHAR': lambda x: unichr(int('0x'+x.text, 16)),
+    'SPECIAL_ESCAPED_CHAR': lambda x: ESCAPED_LITERAL_CHAR_LOOKUP[x.text],
+}
+
+LITERAL_LOOKUP = {
+    'CHAR': lambda x: x.text,
+    'CHAR_NO_SNGLQUOTE': lambda x: x.text,
+    'CHAR_NO_DBLQUOTE': lambda x: x.text,
+    'ESCAPED_CHAR': lambda x: x.text,
+}
+
+ELEMENT_NEGATE_OCCURRENCE_LOOKUP = {
+    '?': lambda x: Optional(Negate(x)),
+    '+': lambda x: OneOrMoreUntil(x),
+    '*': lambda x: ZeroOrMoreUntil(x),
+}
+
+ELEMENT_OCCURRENCE_LOOKUP = {
+    '?': Optional,
+    '+': OneOrMore,
+    '*': ZeroOrMore,
+}
+
+# names that resolve to engine productions instead of declarations
+BUILTIN_NAME_LOOKUP = {
+    'Eof': Eof,
+    'Indent': Indent,
+    'SameIndent': SameIndent,
+    'Dedent': Dedent,
+    'Jinja': Jinja,
+}
+
+BUILTIN_CALL_LOOKUP = {
+    'IndentAtLeast': IndentAtLeast,
+}
+
+DECL_NAME_LOOKUP = {
+    'name': lambda x: (Decl, x.text),
+    'unreportedname': lambda x: (UnreportedDecl, x.children[0].text),
+    'expandedname': lambda x: (ExpandedDecl, x.children[0].text),
+}
+
+# decl type -> its type when declared with @token
+TOKEN_DECL_LOOKUP = {
+    Decl: TokenDecl,
+    UnreportedDecl: UnreportedTokenDecl,
+}
+
+
 class BnfParserGenerator(ParserBase):
-    def __init__(self):
-        # TODO: set BNF options here (warnings as errors, alternate syntax, etc)
+    # NOTE: lookup tables are shared by all instances; method tables are
+    # bound at the end of the class body, and are called with self explicitly
+    ESCAPED_LITERAL_CHAR_LOOKUP = ESCAPED_LITERAL_CHAR_LOOKUP
+    ESCAPED_LITERAL_LOOKUP = ESCAPED_LITERAL_LOOKUP
+    LITERAL_LOOKUP = LITERAL_LOOKUP
+    element_negate_occurrence_lookup = ELEMENT_NEGATE_OCCURRENCE_LOOKUP
+    element_occurrence_lookup = ELEMENT_OCCURRENCE_LOOKUP
+    decl_name_lookup = DECL_NAME_LOOKUP
+    token_decl_lookup = TOKEN_DECL_LOOKUP
+    builtin_name_lookup = BUILTIN_NAME_LOOKUP
+    builtin_call_lookup = BUILTIN_CALL_LOOKUP
+
+    def __init__(self, strict=False):
+        # TODO: set BNF options here (alternate syntax, etc)
         # TODO: allow factory-creation of ParseCtx
         # TODO: allow factory-creation of BasicParser
 
         self.default_fail_msg = "Syntax Error"
         self.warnings = []
-        self._build_lookups()
-
-    def _build_lookups(self):
-        self.ESCAPED_LITERAL_CHAR_LOOKUP = {
-            '\\': '\\',
-            'a': '\a',
-            'b': '\b',
-            'n': '\n',
-            'r': '\r',
-            't': '\t',
-            'v': '\v',
-            '"': '\"',
-            '\'': '\'',
-        }
-
-        self.ESCAPED_LITERAL_LOOKUP = {
-            'CHAR': lambda x: x.text,
-            'CHAR_NO_SNGLQUOTE': lambda x: x.text,
-            'CHAR_NO_DBLQUOTE': lambda x: x.text,
-            'HEX_ESCAPED_CHAR': lambda x: unichr(int('0x'+x.text, 16)),
-            'UNICODE_ESCAPED_CHAR_16': lambda x: unichr(int('0x'+x.text, 16)),
-            'UNICODE_ESCAPED_CHAR_32': lambda x: unichr(int('0x'+x.text, 16)),
-            'OCTAL_ESCAPED_CHAR': lambda x: unichr(int('0x'+x.text, 16)),
-            'SPECIAL_ESCAPED_CHAR': lambda x: \
-                    self.ESCAPED_LITERAL_CHAR_LOOKUP[x.text],
-        }
-
-        self.LITERAL_LOOKUP = {
-            'CHAR': lambda x: x.text,
-            'CHAR_NO_SNGLQUOTE': lambda x: x.text,
-            'CHAR_NO_DBLQUOTE': lambda x: x.text,
-            'ESCAPED_CHAR': lambda x: x.text,
-        }
-
-        self.element_prod_lookup = {
-            'literal': self._process_literal,
-            'range': self._process_range,
-            'seq_group': self._process_seq_group,
-            'fo_group': self._process_fo_group,
-            'name': self._process_decl_ref,
-        }
-
-        self.element_negate_occurrence_lookup = {
-            '?': lambda x: Optional(Negate(x)),
-            '+': lambda x: OneOrMoreUntil(x),
-            '*': lambda x: ZeroOrMoreUntil(x),
-        }
-
-        self.element_occurrence_lookup = {
-            '?': Optional,
-            '+': OneOrMore,
-            '*': ZeroOrMore,
-        }
-
-        self.group_prod_lookup = {
-            'seq_group': self._process_seq_group,
-            'fo_group': self._process_fo_group,
-            'element_token': self._process_element_token,
-        }
-
-        self.decl_name_lookup = {
-            'name': lambda x: (Decl, x.text),
-            'unreportedname': lambda x: (UnreportedDecl, x.children[0].text),
-            'expandedname': lambda x: (ExpandedDecl, x.children[0].text),
-        }
+        # names of the grammar modules imported by the last text processed
+        self.imports = []
+        # grammar analysis findings raise GrammarError instead of adding warnings
+        self.strict = strict
 
     def _get_literal_value(self, ast, convert_escapes=True):
         """ Walk AST, gathering text in order """
@@ -336,8 +387,17 @@ class BnfParserGenerator(ParserBase):
 
     def _process_decl_ref(self, ast):
         name = ast.text.strip()
+        if name in self.builtin_name_lookup:
+            return self.builtin_name_lookup[name]()
         return DeclRef(name)
 
+    def _process_builtin_call(self, ast):
+        name = self._get_child_token(ast, 'name').text
+        arg = int(self._get_child_token(ast, 'builtin_arg').text)
+        if name not in self.builtin_call_lookup:
+            self._error(ast, 'Unknown builtin "{}"'.format(name))
+        return self.builtin_call_lookup[name](arg)
+
     def _process_char_range(self, ast):
         return
 
@@ -383,9 +443,9 @@ class BnfParserGenerator(ParserBase):
             elif name == 'occurrence_indicator':
                 occurrence = node.text
             elif name == 'error_on_fail':
-                error_on_fail = self._get_child_token(x)
+                error_on_fail = node
             else:
-                prod = self.element_prod_lookup[name](node)
+                prod = self.element_prod_lookup[name](self, node)
 
         # process flags and build result
         if negate and occurrence:
@@ -401,11 +461,14 @@ class BnfParserGenerator(ParserBase):
 
         return prod
 
+    def _process_cut(self, ast):
+        return Cut()
+
     def _process_fo_group(self, ast):
         productions = []
         for node in ast.children:
             if node.name == 'element_token':
-                productions.append(self.group_prod_lookup[node.name](node))
+                productions.append(self.group_prod_lookup[node.name](self, node))
         return OrGroup(*productions)
 
     def _process_seq_group(self, ast):
@@ -417,8 +480,9 @@ class BnfParserGenerator(ParserBase):
             if node.name == 'error_on_fail':
                 error_msg = self._get_error_on_fail_value(node)
             else:
-                prod = self.group_prod_lookup[node.name](node)
-                prod.on_fail(error_msg)
+                prod = self.group_prod_lookup[node.name](self, node)
+                if error_msg is not None:
+                    prod.on_fail(error_msg)
                 productions.append(prod)
         if len(productions) == 1:
             return productions[0]
@@ -428,7 +492,17 @@ class BnfParserGenerator(ParserBase):
     def _process_declaration(self, ast):
         # get the name and type of the decl
         node = ast.children[0]
+        token = node.name == 'token_indicator'
+        if token:
+            node = ast.children[1]
         ctor, name = self.decl_name_lookup[node.name](node)
+        # NOTE: references to a builtin name resolve to the builtin, never to a decl
+        if name in self.builtin_name_lookup:
+            self._error(node, 'Declaration "{}" has the name of a builtin'.format(name))
+        if token:
+            if ctor not in self.token_decl_lookup:
+                self._error(node, 'A token cannot be an >expanded< declaration')
+            ctor = self.token_decl_lookup[ctor]
 
         # process the production(s) that make up the decl
         node = self._get_token(ast, 'seq_group')
@@ -439,7 +513,10 @@ class BnfParserGenerator(ParserBase):
     def _process_declaration_set(self, ast):
         decls = []
         for item in ast.children:
-            decls.append(self._process_declaration(item))
+            if item.name == 'import':
+                self.imports.append(self._get_child_token(item, 'name').text)
+            else:
+                decls.append(self._process_declaration(item))
         return decls
 
     def _process_ast_result(self, ast_result):
@@ -453,12 +530,41 @@ class BnfParserGenerator(ParserBase):
         return self._process_declaration_set(node)
 
     def _get_ast(self, decl, bnf_text):
-        ctx = ParseCtx(bnf_parser_decls)
+        ctx = ParseCtx(bnf_parser_decls.decls)
         ctx.reset(bnf_text)
         return ctx.get_decl(decl).evaluate(ctx)
 
-    def process(self, bnf_text):
+    def process_module(self, bnf_text):
+        """
+        Returns the decls of a grammar module; the names of the modules it
+        imports are in self.imports.  The decls are not analyzed, as they
+        may refer to decls of the imported modules.
+        """
+        self.imports = []
         ast = self._get_ast('declaration_set', bnf_text)
-        decl_set = self._process_ast_result(ast)
-        return BasicParser(decl_set)
+        return self._process_ast_result(ast)
 
+    def process(self, bnf_text):
+        decl_set = self.process_module(bnf_text)
+        if self.imports:
+            raise SemanticError('Grammar imports {}; load it with link_grammar()'.format(
+                    ', '.join(self.imports)))
+        parser = BasicParser(decl_set, strict=self.strict)
+        self.warnings.extend(map(unicode, parser.findings))
+        return parser
+
+    element_prod_lookup = {
+        'literal': _process_literal,
+        'range': _process_range,
+        'seq_group': _process_seq_group,
+        'fo_group': _process_fo_group,
+        'builtin_call': _process_builtin_call,
+        'name': _process_decl_ref,
+    }
+
+    group_prod_lookup = {
+        'cut': _process_cut,
+        'seq_group': _process_seq_group,
+        'fo_group': _process_fo_group,
+        'element_token': _process_element_token,
+    }
@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import argparse
+import io
+import os
+import sys
+
+
+def build_arg_parser():
+    parser = argparse.ArgumentParser(prog='ansible_hint',
+            description='Configurable linter for Ansible')
+    parser.add_argument('files', nargs='*',
+            help='files to check (default with --changed-since: all YAML files in the repository)')
+    parser.add_argument('--grammar', default='yaml',
+            help='name of the grammar used to parse files (default: yaml)')
+    parser.add_argument('--decl', default=None,
+            help='declaration to start parsing from (default: first in grammar)')
+    parser.add_argument('--document-workers', type=int, default=0, metavar='N',
+            help='parse YAML documents separately; with N > 1, on N worker processes')
+    parser.add_argument('--rule', action='append', dest='rules', metavar='NAME',
+            help='enable only the named rule; may be repeated (default: all rules)')
+    parser.add_argument('--changed-since', default=None, metavar='REF',
+            help='only check YAML files changed since the git REF, and files that '
+                 'include them or are included by them')
+    parser.add_argument('--follow-includes', action='store_true',
+            help='also check the files and roles that the files include, each file once, '
+                 'included files first')
+    parser.add_argument('--export-graph', default=None, metavar='FILE',
+            help='write the include and role dependency graph to FILE as JSON, or as '
+                 'Graphviz DOT if FILE ends in .dot; implies --follow-includes')
+    parser.add_argument('--format', default='text', choices=['text', 'jsonl', 'sarif'],
+            help='output format: plain text, JSON Lines or SARIF (default: text)')
+    parser.add_argument('--jobs', type=int, default=0, metavar='N',
+            help='lint files on N worker processes; output keeps the order of the files')
+    parser.add_argument('--rule-stats', action='store_true',
+            help='print per-rule call counts and times to stderr')
+    parser.add_argument('--max-steps', type=int, default=None, metavar='N',
+            help='stop parsing a file after N declaration evaluations')
+    parser.add_argument('--max-parse-time', type=float, default=None, metavar='SECONDS',
+            help='stop parsing a file after SECONDS of wall time')
+    parser.add_argument('--max-depth', type=int, default=None, metavar='N',
+            help='stop parsing a file when declarations nest deeper than N')
+    parser.add_argument('--memoize', action='store_true',
+            help='remember the result of each declaration at each offset while parsing, so '
+                 'that backtracking never parses the same text twice; memory is bounded by '
+                 'the cuts of the grammar, such as the one after each "---"')
+    parser.add_argument('--detect-backtracking', action='store_true',
+            help='report declarations that make parsing superlinear to stderr')
+    parser.add_argument('--memory-report', action='store_true',
+            help='print the peak and retained memory of the parse, tree, line-table and rule '
+                 'phases of each file, and the resident memory at the end of each, to stderr')
+    parser.add_argument('--max-memory', type=size, default=None, metavar='SIZE',
+            help='stream a file projected to need more memory than SIZE (such as 512M), '
+                 'or skip it if that does not fit either')
+    parser.add_argument('--stream', action='store_true',
+            help='read each file as the parser needs it, keeping only the text after the '
+                 'last "---" in memory, for files larger than memory')
+    parser.add_argument('--watch', action='store_true',
+            help='keep running: after the first run, re-lint the files that change and the '
+                 'files that include them, printing only the diagnostics that changed; files '
+                 'may also be directories, whose YAML files are watched')
+    parser.add_argument('--watch-interval', type=float, default=None, metavar='SECONDS',
+            help='seconds between checks for changed files with --watch (default: 0.05)')
+    parser.add_argument('--lsp', action='store_true',
+            help='run as a Language Server Protocol server on stdin and stdout, publishing '
+                 'the diagnostics of the documents open in an editor as they are edited')
+    parser.add_argument('--lsp-debounce', type=float, default=None, metavar='SECONDS',
+            help='seconds without an edit before a document is linted with --lsp '
+                 '(default: 0.2)')
+    parser.add_argument('--metrics', action='append', metavar='FILE',
+            help='write run metrics to FILE at the end of the run: files and bytes per second, '
+                 'time per phase, cache hit rates, worker utilization and the slowest files '
+                 'and rules; as JSON if FILE ends in .json, or in Prometheus text format '
+                 'otherwise; may be repeated')
+    parser.add_argument('--metrics-top', type=int, default=10, metavar='N',
+            help='number of slowest files and rules in the metrics (default: 10)')
+    return parser
+
+
+def size(text):
+    from ansible_hint.memory import parse_size
+    try:
+        return parse_size(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(unicode(e))
+
+
+def main(argv=None):
+    arg_parser = build_arg_parser()
+    args = arg_parser.parse_args(argv)
+    if not args.files and args.changed_since is None and not args.lsp:
+        arg_parser.error('no files to check')
+
+    # NOTE: deferred so that --help and argument errors stay fast
+    from ansible_hint.runner import LintRunner
+    from ansible_hint.rules import RULES
+    from ansible_hint.parser import ParseBudget
+    from ansible_hint.output import FORMATTERS
+
+    names = args.rules or list(RULES)
+    for name in names:
+        if name not in RULES:
+            print('Unknown rule "{}"'.format(name), file=sys.stderr)
+            return 2
+    rules = [RULES[name]() for name in names]
+
+    budget = None
+    if (args.max_steps, args.max_parse_time, args.max_depth) != (None, None, None) or args.lsp:
+        budget = ParseBudget(args.max_steps, args.max_parse_time, args.max_depth)
+
+    if args.changed_since is not None:
+        from ansible_hint.vcs import GitError
+        # NOTE: a runner without rules keeps only the nodes that name other files
+        selector = LintRunner(args.grammar, args.decl, budget=budget, jobs=args.jobs,
+                project=True)
+        try:
+            args.files = select_changed(selector, args.files, args.changed_since)
+        except GitError as e:
+            print('git: {}'.format(e), file=sys.stderr)
+            return 2
+        finally:
+            selector.close()
+
+    project = args.follow_includes or args.export_graph is not None
+    runner = LintRunner(args.grammar, args.decl, args.document_workers, rules, budget=budget,
+            jobs=args.jobs, project=project, max_memory=args.max_memory,
+            memory_report=args.memory_report, metrics=bool(args.metrics),
+            memoize=args.memoize, stream=args.stream)
+    if args.lsp:
+        return serve_lsp(runner, args.lsp_debounce)
+    formatter = FORMATTERS[args.format](sys.stdout, rules)
+    status = 0
+    try:
+        formatter.begin()
+        if args.watch:
+            status = watch(runner, formatter, args.files, project, args.watch_interval)
+        else:
+            lint = runner.lint_project if project else runner.lint_files
+            for path, diagnostics in lint(args.files):
+                formatter.write_file(path, diagnostics)
+                if diagnostics:
+                    status = 1
+        formatter.end()
+        if args.metrics:
+            runner.metrics.finish(runner.engine, max(args.jobs, 1))
+    finally:
+        runner.close()
+    if args.export_graph is not None:
+        export_graph(runner.graph, args.export_graph)
+    for path in args.metrics or ():
+        export_metrics(runner.metrics, path, args.metrics_top)
+    if args.rule_stats:
+        print(runner.engine.format_stats(), file=sys.stderr)
+    if args.memory_report:
+        print(runner.memory.format_report(), file=sys.stderr)
+    if args.detect_backtracking:
+        detect_backtracking(runner, args.files)
+    return status
+
+
+def select_changed(runner, paths, ref):
+    """
+    Returns the files in paths, or all YAML files if there are none, that
+    changed since ref, include a changed file, directly or through other
+    files, or are included by one; runner parses the files to find out
+    """
+    from ansible_hint.includes import related_files
+    from ansible_hint.vcs import changed_files, work_tree_files
+
+    if paths:
+        paths = [os.path.normpath(path) for path in paths]
+    else:
+        paths = work_tree_files()
+    return related_files(runner, paths, changed_files(ref))
+
+
+def watch(runner, formatter, paths, follow_includes, interval=None):
+    """ Lints paths, then the changes to them until interrupted; returns the exit status """
+    from ansible_hint.watch import DEFAULT_INTERVAL, Watcher
+
+    watcher = Watcher(runner, paths, follow_includes)
+    try:
+        interval = DEFAULT_INTERVAL if interval is None else interval
+        for path, diagnostics, fixed in watcher.watch(interval):
+            formatter.write_fixed(path, fixed)
+            formatter.write_file(path, diagnostics)
+    except KeyboardInterrupt:
+        pass
+    return 1 if any(watcher.diagnostics.values()) else 0
+
+
+def serve_lsp(runner, debounce=None):
+    from ansible_hint.lsp import DEFAULT_DEBOUNCE, serve
+
+    try:
+        return serve(runner, sys.stdin, sys.stdout,
+                DEFAULT_DEBOUNCE if debounce is None else debounce)
+    finally:
+        runner.close()
+
+
+def export_graph(graph, path):
+    text = graph.to_dot() if path.endswith('.dot') else graph.to_json()
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(text + '\n')
+
+
+def export_metrics(metrics, path, top):
+    text = metrics.to_json(top) + '\n' if path.endswith('.json') else metrics.to_prometheus(top)
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+
+def detect_backtracking(runner, paths):
+    from ansible_hint.backtracking import BacktrackingDetector
+
+    detector = BacktrackingDetector(runner.decls, runner.decl)
+    for path in paths:
+        # NOTE: a file that cannot be read was already reported by the lint
+        try:
+            with io.open(path, encoding='utf-8') as f:
+                text = f.read()
+        except (IOError, OSError, UnicodeDecodeError):
+            continue
+        reports = detector.detect(text)
+        for report in reports:
+            print('{}: {}'.format(path, report), file=sys.stderr)
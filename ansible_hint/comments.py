@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+
+# decls collected into the side table instead of the tree when comments are enabled
+COMMENT_DECLS = ('comment',)
+
+
+class CommentTable(object):
+    """
+    Comments of a parsed text as a side table of (offset, text), sorted by
+    offset, with bisect lookups around any offset.
+    """
+    def __init__(self, entries=()):
+        self.offsets = array(b'l')
+        self.texts = []
+        for offset, text in sorted(entries):
+            self.offsets.append(offset)
+            self.texts.append(text)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __iter__(self):
+        return iter(zip(self.offsets, self.texts))
+
+    def preceding(self, offset):
+        """ Returns the last (offset, text) starting before offset, or None """
+        index = bisect_left(self.offsets, offset) - 1
+        if index < 0:
+            return None
+        return (self.offsets[index], self.texts[index])
+
+    def following(self, offset):
+        """ Returns the first (offset, text) starting at or after offset, or None """
+        index = bisect_left(self.offsets, offset)
+        if index == len(self.texts):
+            return None
+        return (self.offsets[index], self.texts[index])
+
+    def between(self, start, end):
+        """ Returns the (offset, text) of comments starting in [start, end) """
+        lo = bisect_left(self.offsets, start)
+        hi = bisect_left(self.offsets, end)
+        return list(zip(self.offsets[lo:hi], self.texts[lo:hi]))
+
+    def attach(self, nodes, lines):
+        """
+        Returns an OrderedDict of node -> [(offset, text)] for nodes in
+        document order.  A comment that shares a line with the end of a node
+        belongs to the last node on that line; any other comment belongs to
+        the first node after it, as a doc comment would.  lines is the
+        LineTable of the parsed text.
+        """
+        nodes = list(nodes)
+        starts = [lines.start(node.pos[0]) + node.pos[1] for node in nodes]
+        result = OrderedDict((node, []) for node in nodes)
+        for offset, text in self:
+            index = bisect_right(starts, offset) - 1
+            line = lines.line_of(offset)
+            if (index >= 0 and not lines.is_comment(line)
+                    and lines.line_of(starts[index]) == line):
+                result[nodes[index]].append((offset, text))
+            elif index + 1 < len(nodes):
+                result[nodes[index + 1]].append((offset, text))
+            elif index >= 0:
+                result[nodes[index]].append((offset, text))
+        return result
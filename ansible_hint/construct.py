@@ -0,0 +1,267 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import datetime
+import math
+import re
+from collections import OrderedDict
+from ansible_hint.parser import ParseError
+
+# implicit types of plain scalars, as resolved by YAML 1.1 loaders such as PyYAML
+BOOL_VALUES = {
+    'yes': True, 'Yes': True, 'YES': True, 'true': True, 'True': True, 'TRUE': True,
+    'on': True, 'On': True, 'ON': True,
+    'no': False, 'No': False, 'NO': False, 'false': False, 'False': False, 'FALSE': False,
+    'off': False, 'Off': False, 'OFF': False,
+}
+
+NULL_VALUES = set(['', '~', 'null', 'Null', 'NULL'])
+
+INT = re.compile(r'''^(?:[-+]?0b[0-1_]+
+    |[-+]?0[0-7_]+
+    |[-+]?(?:0|[1-9][0-9_]*)
+    |[-+]?0x[0-9a-fA-F_]+
+    |[-+]?[1-9][0-9_]*(?::[0-5]?[0-9])+)$''', re.X)
+
+FLOAT = re.compile(r'''^(?:[-+]?(?:[0-9][0-9_]*)\.[0-9_]*(?:[eE][-+][0-9]+)?
+    |\.[0-9][0-9_]*(?:[eE][-+][0-9]+)?
+    |[-+]?[0-9][0-9_]*(?::[0-5]?[0-9])+\.[0-9_]*
+    |[-+]?\.(?:inf|Inf|INF)
+    |\.(?:nan|NaN|NAN))$''', re.X)
+
+TIMESTAMP = re.compile(r'''^(?P<year>[0-9][0-9][0-9][0-9])-(?P<month>[0-9][0-9]?)-(?P<day>[0-9][0-9]?)
+    (?:(?:[Tt]|[ \t]+)(?P<hour>[0-9][0-9]?):(?P<minute>[0-9][0-9]):(?P<second>[0-9][0-9])
+    (?:\.(?P<fraction>[0-9]*))?(?:[ \t]*(?P<tz>Z|(?P<tz_sign>[-+])(?P<tz_hour>[0-9][0-9]?)
+    (?::(?P<tz_minute>[0-9][0-9]))?))?)?$''', re.X)
+
+# double-quoted escape -> character
+DOUBLE_ESCAPES = {
+    '0': '\0', 'a': '\x07', 'b': '\x08', 't': '\x09', '\t': '\x09', 'n': '\x0a', 'v': '\x0b',
+    'f': '\x0c', 'r': '\x0d', 'e': '\x1b', ' ': ' ', '"': '"', '/': '/', '\\': '\\',
+    'N': '\x85', '_': '\xa0', 'L': '\u2028', 'P': '\u2029',
+}
+
+# hex escape -> number of hex digits
+DOUBLE_HEX_ESCAPES = {'x': 2, 'u': 4, 'U': 8}
+
+# the line break in a quoted scalar, with the white space around it
+QUOTED_BREAK = re.compile(r'[ \t]*\n(?:[ \t]*\n)*[ \t]*')
+
+
+def _sexagesimal(text, convert):
+    value = 0
+    for part in text.split(':'):
+        value = value * 60 + convert(part)
+    return value
+
+
+def _int(text):
+    sign = -1 if text[0] == '-' else 1
+    text = text.lstrip('+-').replace('_', '')
+    if text.startswith('0b'):
+        return sign * int(text[2:], 2)
+    if text.startswith('0x'):
+        return sign * int(text[2:], 16)
+    if ':' in text:
+        return sign * _sexagesimal(text, int)
+    if text != '0' and text.startswith('0'):
+        return sign * int(text, 8)
+    return sign * int(text)
+
+
+def _float(text):
+    sign = -1 if text[0] == '-' else 1
+    text = text.lstrip('+-').replace('_', '').lower()
+    if text == '.inf':
+        return sign * float('inf')
+    if text == '.nan':
+        return float('nan')
+    if ':' in text:
+        return sign * _sexagesimal(text, float)
+    return sign * float(text)
+
+
+def _timestamp(match):
+    date = datetime.date(int(match.group('year')), int(match.group('month')),
+            int(match.group('day')))
+    if match.group('hour') is None:
+        return date
+    fraction = (match.group('fraction') or '')[:6].ljust(6, '0')
+    result = datetime.datetime(date.year, date.month, date.day, int(match.group('hour')),
+            int(match.group('minute')), int(match.group('second')), int(fraction))
+    if match.group('tz_sign'):
+        # NOTE: returned as naive UTC, since there are no tzinfo classes to use
+        delta = datetime.timedelta(hours=int(match.group('tz_hour')),
+                minutes=int(match.group('tz_minute') or 0))
+        result -= delta if match.group('tz_sign') == '+' else -delta
+    return result
+
+
+def resolve_plain(text):
+    """ Returns the value of a plain scalar: None, a bool, int, float, date or text """
+    if text in NULL_VALUES:
+        return None
+    if text in BOOL_VALUES:
+        return BOOL_VALUES[text]
+    if INT.match(text):
+        return _int(text)
+    if FLOAT.match(text):
+        return _float(text)
+    match = TIMESTAMP.match(text)
+    if match is not None:
+        return _timestamp(match)
+    return text
+
+
+def _fold(text):
+    # a single line break becomes a space; each further one is kept
+    return QUOTED_BREAK.sub(lambda x: '\n' * (x.group().count('\n') - 1) or ' ', text)
+
+
+def unquote_single(text):
+    """ Returns the value of a single-quoted scalar, given with its quotes """
+    return _fold(text[1:-1]).replace("''", "'")
+
+
+def unquote_double(text):
+    """ Returns the value of a double-quoted scalar, given with its quotes """
+    text = text[1:-1]
+    parts = []
+    index = 0
+    while True:
+        escape = text.find('\\', index)
+        end = escape if escape != -1 else len(text)
+        parts.append(_fold(text[index:end]))
+        if escape == -1:
+            break
+        ch = text[escape + 1]
+        index = escape + 2
+        if ch == '\n':
+            # an escaped line break joins the lines without a space
+            parts[-1] = parts[-1].rstrip(' \t')
+            index = len(text) - len(text[index:].lstrip(' \t\n'))
+        elif ch in DOUBLE_HEX_ESCAPES:
+            digits = DOUBLE_HEX_ESCAPES[ch]
+            code = int(text[index:index + digits], 16)
+            parts.append(unichr(code) if code <= 0xffff else
+                    ('\\U%08x' % code).decode('unicode-escape'))
+            index += digits
+        else:
+            parts.append(DOUBLE_ESCAPES[ch])
+    return ''.join(parts)
+
+
+def _scalar(node):
+    if node.name in ('plain_scalar', 'flow_scalar', 'plain_key'):
+        return resolve_plain(node.text)
+    if node.name == 'single_quoted':
+        return unquote_single(node.text)
+    return unquote_double(node.text)
+
+
+def _mapping(node):
+    result = OrderedDict()
+    for pair in node.children:
+        # mapping_entry or flow_pair
+        children = [x for x in pair.children if x.name != 'comment']
+        if not children:
+            continue
+        key = construct_node(children[0])
+        try:
+            hash(key)
+        except TypeError:
+            raise ParseError(children[0].pos, 'Unhashable mapping key')
+        result[key] = construct_node(children[1]) if len(children) > 1 else None
+    return result
+
+
+def construct_node(node):
+    """
+    Returns the Python value of a node of the full yaml grammar; an
+    unhashable mapping key is a ParseError
+    """
+    name = node.name
+    if name in ('document', 'key', 'sequence_entry'):
+        children = [x for x in node.children if x.name != 'comment']
+        return construct_node(children[0]) if children else None
+    if name in ('block_mapping', 'flow_mapping'):
+        return _mapping(node)
+    if name in ('block_sequence', 'flow_sequence'):
+        return [construct_node(x) for x in node.children if x.name != 'comment']
+    return _scalar(node)
+
+
+def construct_documents(ast_result):
+    """
+    Returns the value of each document in a parse from the "stream" decl of
+    the full yaml grammar, as a YAML 1.1 loader would construct it.  Tags,
+    anchors and aliases are not supported by the grammar.
+    """
+    result = []
+    for stream in ast_result.items:
+        # NOTE: a document marker without a document is a null document
+        pending = False
+        for node in stream.children:
+            if node.name == 'document_start':
+                if pending:
+                    result.append(None)
+                pending = True
+            elif node.name == 'document':
+                result.append(construct_node(node))
+                pending = False
+        if pending:
+            result.append(None)
+    return result
+
+
+def _kind(value):
+    # NOTE: True == 1, so values of different kinds are never the same
+    if isinstance(value, bool):
+        return bool
+    if isinstance(value, (int, long)):
+        return int
+    if isinstance(value, basestring):
+        return basestring
+    return type(value)
+
+
+def _naive_utc(value):
+    if isinstance(value, datetime.datetime) and value.utcoffset() is not None:
+        return value.replace(tzinfo=None) - value.utcoffset()
+    return value
+
+
+def _same(a, b):
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return _kind(a) is _kind(b) and _naive_utc(a) == _naive_utc(b)
+
+
+def first_difference(a, b, path=''):
+    """
+    Returns (path, a value, b value) for the first place where two loaded
+    YAML values differ, or None if they are the same
+    """
+    if isinstance(a, dict) and isinstance(b, dict):
+        keys = list(a) + [x for x in b if x not in a]
+        for key in keys:
+            key_path = '{}[{!r}]'.format(path, key)
+            if key not in a or key not in b:
+                return key_path, a.get(key, '<missing>'), b.get(key, '<missing>')
+            difference = first_difference(a[key], b[key], key_path)
+            if difference is not None:
+                return difference
+        return None
+    if isinstance(a, list) and isinstance(b, list):
+        for index in range(max(len(a), len(b))):
+            item_path = '{}[{}]'.format(path, index)
+            if index >= len(a) or index >= len(b):
+                return (item_path, a[index] if index < len(a) else '<missing>',
+                        b[index] if index < len(b) else '<missing>')
+            difference = first_difference(a[index], b[index], item_path)
+            if difference is not None:
+                return difference
+        return None
+    if _same(a, b):
+        return None
+    return path or '<document>', a, b
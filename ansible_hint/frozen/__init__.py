@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+# Frozen grammar modules are generated here by ansible_hint.grammar.freeze_all()
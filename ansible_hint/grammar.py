@@ -0,0 +1,388 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import hashlib
+import io
+import marshal
+import os
+import tempfile
+from collections import OrderedDict
+from importlib import import_module
+from ansible_hint.metrics import count_cache
+from ansible_hint.parser import (ProductionBase, Decl, UnreportedDecl, ExpandedDecl,
+        SideTableDecl, TokenDecl, UnreportedTokenDecl, DeclRef, Grammar, Jinja, JINJA_NODES)
+
+# name -> (module, builder function) for grammars built in Python; modules are
+# only imported on first use
+GRAMMARS = {
+    'bnf': ('ansible_hint.bnf', 'build_bnf_parser_decls'),
+}
+
+# name -> grammar module for grammars written in BNF; see link_grammar()
+GRAMMAR_MODULES = {
+    'yaml': 'yaml_block',
+    'yaml_core': 'yaml_core',
+}
+
+# grammar modules are <name>.bnf files in this directory
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+FROZEN_PACKAGE = 'ansible_hint.frozen'
+
+# frozen grammar modules are named <prefix><module name>
+FROZEN_MODULE_PREFIX = 'module_'
+
+FROZEN_HEADER = '''# -*- coding: utf-8 -*-
+# Generated by ansible_hint.grammar.freeze_grammar() - do not edit
+
+from __future__ import unicode_literals
+from ansible_hint.parser import *
+
+'''
+
+# compiled modules are cached in this directory, or in ~/.cache/ansible_hint;
+# an empty value turns the cache off
+CACHE_ENV = 'ANSIBLE_HINT_CACHE'
+
+# part of the cache key; bump when the compiled form of the same BNF changes
+MODULE_CACHE_VERSION = 1
+
+_loaded = {}
+_derived = {}
+_modules = {}
+_linked = {}
+
+
+class GrammarImportError(Exception):
+    pass
+
+
+def _build_grammar(name):
+    module_name, fn_name = GRAMMARS[name]
+    return getattr(import_module(module_name), fn_name)()
+
+
+def _import_frozen(name):
+    try:
+        return import_module('{}.{}'.format(FROZEN_PACKAGE, name))
+    except ImportError:
+        return None
+
+
+def load_grammar(name, keep=None, side_table=()):
+    """
+    Returns the Grammar for a named grammar, preferring the frozen module.
+
+    Decls named in side_table record their text in the parse side table
+    instead of the tree; see side_table_grammar().  If keep is given, the
+    grammar is pruned to build only those nodes; see prune_grammar().  The
+    start decl is the first decl in the grammar.
+    """
+    decls = _loaded.get(name)
+    count_cache('grammar', decls is not None)
+    if decls is None:
+        if name in GRAMMAR_MODULES:
+            decls = link_grammar(GRAMMAR_MODULES[name])
+        else:
+            frozen = _import_frozen(name)
+            decls = frozen.decls if frozen is not None else _build_grammar(name)
+        decls = _loaded[name] = Grammar(decls)
+    if keep is None and not side_table:
+        return decls
+
+    key = (name, None if keep is None else frozenset(keep), frozenset(side_table))
+    derived = _derived.get(key)
+    count_cache('derived_grammar', derived is not None)
+    if derived is None:
+        derived = side_table_grammar(decls, side_table)
+        if keep is not None:
+            derived = prune_grammar(derived, keep, decls[0].name)
+        derived = _derived[key] = Grammar(derived)
+    return derived
+
+
+class GrammarModule(object):
+    """ The compiled decls of one grammar module and the names of its imports """
+    def __init__(self, name, imports, decls):
+        self.name = name
+        self.imports = tuple(imports)
+        self.decls = Grammar(decls)
+
+
+def compile_module(name, text):
+    """ Returns the GrammarModule for the BNF text of module name """
+    # NOTE: deferred because the BNF generator imports this module
+    from ansible_hint.bnf import BnfParserGenerator
+
+    generator = BnfParserGenerator()
+    decls = generator.process_module(text)
+    return GrammarModule(name, generator.imports, decls)
+
+
+def module_cache_dir():
+    path = os.environ.get(CACHE_ENV)
+    if path is None:
+        path = os.path.join(os.path.expanduser('~'), '.cache', 'ansible_hint')
+    return path or None
+
+
+def _cache_path(name, source):
+    key = hashlib.sha1('{}\n'.format(MODULE_CACHE_VERSION).encode('utf-8') + source)
+    return os.path.join(module_cache_dir(), '{}-{}.grammar'.format(name, key.hexdigest()[:16]))
+
+
+def _read_cached_module(name, path):
+    try:
+        with open(path, 'rb') as f:
+            content = f.read()
+    except (IOError, OSError):
+        return None
+    # NOTE: a truncated, corrupt or outdated file can fail to decode in many ways,
+    # such as zlib.error or an IndexError for a production type that is gone; all
+    # of them are cache misses, and the module is compiled again
+    try:
+        imports, data = marshal.loads(content)
+        return GrammarModule(name, imports, Grammar.loads(data))
+    except Exception:
+        return None
+
+
+def _write_cached_module(module, path):
+    # NOTE: written to a temporary file first, as other processes may read it
+    try:
+        directory = os.path.dirname(path)
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as f:
+            f.write(marshal.dumps((module.imports, module.decls.dumps())))
+        os.rename(f.name, path)
+    except (IOError, OSError):
+        pass
+
+
+def load_module(name):
+    """
+    Returns the GrammarModule name, compiling <name>.bnf only if neither a
+    frozen module nor a compiled copy of the same source in the cache
+    directory exists.  Each module is loaded once per process.
+    """
+    module = _modules.get(name)
+    if module is not None:
+        return module
+    frozen = _import_frozen(FROZEN_MODULE_PREFIX + name)
+    if frozen is not None:
+        module = GrammarModule(name, frozen.imports, frozen.decls)
+    else:
+        try:
+            with open(os.path.join(MODULE_DIR, name + '.bnf'), 'rb') as f:
+                source = f.read()
+        except IOError:
+            raise GrammarImportError('No grammar module "{}"'.format(name))
+        path = _cache_path(name, source) if module_cache_dir() else None
+        if path is not None:
+            module = _read_cached_module(name, path)
+            count_cache('module_cache', module is not None)
+        if module is None:
+            module = compile_module(name, source.decode('utf-8'))
+            if path is not None:
+                _write_cached_module(module, path)
+    _modules[name] = module
+    return module
+
+
+def link_grammar(name, modules=None, _importing=()):
+    """
+    Returns the Grammar of module name together with the modules it
+    imports, which are loaded with load_module() unless found in the modules
+    dict.
+
+    A decl replaces an imported decl of the same name in place.  The new
+    decls of a module come before the imported ones, so the start decl is
+    the module's first new decl, or that of its first import if it only
+    overrides.  Decls are shared, not copied, so grammars linked from the
+    same modules share them in memory.
+    """
+    linked = _linked.get(name) if modules is None else None
+    if linked is not None:
+        return linked
+    if name in _importing:
+        raise GrammarImportError('Grammar modules import each other: {}'.format(
+                ' > '.join(_importing + (name,))))
+    module = modules[name] if modules is not None and name in modules else load_module(name)
+
+    merged = OrderedDict()
+    for imported in module.imports:
+        for decl in link_grammar(imported, modules, _importing + (name,)):
+            merged[decl.name] = decl
+    new = []
+    for decl in module.decls:
+        if decl.name in merged:
+            merged[decl.name] = decl
+        else:
+            new.append(decl)
+    linked = Grammar(new + list(merged.values()))
+    if modules is None:
+        _linked[name] = linked
+    return linked
+
+
+def production_children(prod):
+    return [x for x in prod.ctor_args() if isinstance(x, ProductionBase)]
+
+
+def decl_refs(prod):
+    """ Returns the names of all decls referenced within prod """
+    result = set()
+    stack = [prod]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, DeclRef):
+            result.add(item.name)
+        stack.extend(production_children(item))
+    return result
+
+
+def builtin_nodes(prod):
+    """ Returns the names of the nodes that builtin productions within prod build """
+    result = set()
+    stack = [prod]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, Jinja):
+            result.update(JINJA_NODES)
+        stack.extend(production_children(item))
+    return result
+
+
+def prune_grammar(decls, keep, start):
+    """
+    Returns decls rewritten so that only the start decl and Decls named in
+    keep build AST nodes.  Other Decls become ExpandedDecls if a kept node
+    can appear beneath them, or UnreportedDecls otherwise, and TokenDecls
+    become UnreportedTokenDecls.  A Decl whose production has a builtin that
+    builds a kept node, such as Jinja, is expanded too.  Kept nodes have the
+    same text, position and order as with the full grammar.
+    """
+    refs = dict((decl.name, decl_refs(decl.prod)) for decl in decls)
+    builtins = dict((decl.name, builtin_nodes(decl.prod) & set(keep)) for decl in decls)
+    producers = set(decl.name for decl in decls
+            if type(decl) in (Decl, TokenDecl) and (decl.name in keep or decl.name == start))
+
+    # decls that can produce a kept node, directly or through their children
+    contains = set()
+    changed = True
+    while changed:
+        changed = False
+        for decl in decls:
+            # NOTE: a token's node never has children
+            if decl.name in contains or isinstance(decl,
+                    (UnreportedDecl, SideTableDecl, TokenDecl)):
+                continue
+            if builtins[decl.name] or refs[decl.name] & (producers | contains):
+                contains.add(decl.name)
+                changed = True
+
+    result = []
+    for decl in decls:
+        if decl.name in producers or isinstance(decl,
+                (UnreportedDecl, SideTableDecl, UnreportedTokenDecl)):
+            result.append(decl)
+            continue
+        elif isinstance(decl, TokenDecl):
+            pruned = UnreportedTokenDecl(decl.name, decl.prod)
+        elif decl.name in contains:
+            pruned = ExpandedDecl(decl.name, decl.prod)
+        else:
+            pruned = UnreportedDecl(decl.name, decl.prod)
+        pruned.on_fail_msg = decl.on_fail_msg
+        result.append(pruned)
+    return result
+
+
+def side_table_grammar(decls, names):
+    """ Returns decls with the Decls named in names rewritten as SideTableDecls """
+    result = []
+    for decl in decls:
+        if decl.name in names and type(decl) is Decl:
+            decl = SideTableDecl(decl.name, decl.prod).on_fail(decl.on_fail_msg)
+        result.append(decl)
+    return result
+
+
+def production_source(prod):
+    """ Returns Python source that rebuilds a production """
+    args = ', '.join(map(_value_source, prod.ctor_args()))
+    result = '{}({})'.format(type(prod).__name__, args)
+    if prod.has_fail_msg():
+        result += '.on_fail({})'.format(repr(prod.on_fail_msg))
+    return result
+
+
+def _value_source(value):
+    if hasattr(value, 'ctor_args'):
+        return production_source(value)
+    return repr(value)
+
+
+def freeze_grammar(decls, imports=None):
+    """
+    Returns the source of a frozen grammar module for decls, and for the
+    names of imported grammar modules if imports is given
+    """
+    lines = [FROZEN_HEADER]
+    if imports is not None:
+        lines.append('imports = {!r}\n\n'.format(list(imports)))
+    lines.append('decls = [\n')
+    for decl in decls:
+        lines.append('    {},\n'.format(production_source(decl)))
+    lines.append(']\n')
+    return ''.join(lines)
+
+
+def freeze_all(path):
+    """
+    Writes a frozen module for every registered Python grammar, and for
+    every grammar module that a registered BNF grammar uses, into path
+    """
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    init_path = os.path.join(path, '__init__.py')
+    if not os.path.exists(init_path):
+        io.open(init_path, 'w', encoding='utf-8').close()
+    sources = []
+    for name in sorted(GRAMMARS):
+        sources.append((name, freeze_grammar(_build_grammar(name))))
+
+    pending = sorted(GRAMMAR_MODULES.values())
+    done = set()
+    while pending:
+        name = pending.pop(0)
+        if name in done:
+            continue
+        done.add(name)
+        module = load_module(name)
+        sources.append((FROZEN_MODULE_PREFIX + name, freeze_grammar(module.decls, module.imports)))
+        pending.extend(module.imports)
+
+    for name, source in sources:
+        with io.open(os.path.join(path, name + '.py'), 'w', encoding='utf-8') as f:
+            f.write(source)
+
+
+class LazyDecls(object):
+    """ Sequence of decls for a named grammar, loaded on first access """
+    def __init__(self, name):
+        self.name = name
+
+    @property
+    def decls(self):
+        return load_grammar(self.name)
+
+    def __iter__(self):
+        return iter(self.decls)
+
+    def __len__(self):
+        return len(self.decls)
+
+    def __getitem__(self, index):
+        return self.decls[index]
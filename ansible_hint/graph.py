@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import json
+import os
+from collections import OrderedDict
+
+# keys whose value names another YAML file to include
+INCLUDE_KEYS = ['include', 'include_tasks', 'import_tasks', 'import_playbook', 'include_vars']
+
+# keys whose value is a role name, or a mapping with the role name under "name"
+ROLE_KEYS = ['include_role', 'import_role']
+
+# keys whose value is a list of role names, or of mappings with "role" or "name"
+ROLE_LIST_KEYS = ['roles', 'dependencies']
+
+# files of a role that are read when the role is used
+ROLE_FILES = ['tasks/main', 'handlers/main', 'defaults/main', 'vars/main', 'meta/main']
+
+# every key that file_references() follows
+REFERENCE_KEYS = INCLUDE_KEYS + ROLE_KEYS + ROLE_LIST_KEYS
+
+# nodes that file_references() reads, which must not be pruned from the tree
+REFERENCE_NODES = set(['mapping_entry', 'key', 'plain_key', 'flow_pair', 'flow_scalar',
+        'plain_scalar', 'single_quoted', 'double_quoted', 'block_mapping', 'flow_mapping',
+        'block_sequence', 'sequence_entry', 'flow_sequence'])
+
+SCALAR_NODES = set(['plain_key', 'plain_scalar', 'flow_scalar', 'single_quoted', 'double_quoted'])
+
+
+def mentions_reference(text):
+    """ Returns whether text contains any key that file_references() follows """
+    return any(key in text for key in REFERENCE_KEYS)
+
+
+def scalar_text(node):
+    """ Returns the text of a scalar node, or None if it is not a plain string """
+    while node.name in ('key', 'sequence_entry') and len(node.children) == 1:
+        node = node.children[0]
+    if node.name not in SCALAR_NODES:
+        return None
+    text = node.text
+    if node.name in ('single_quoted', 'double_quoted'):
+        text = text[1:-1]
+    # NOTE: templated names are only known when the play runs
+    if '{{' in text or '{%' in text:
+        return None
+    return text
+
+
+def _entries(node):
+    # (key node, value node or None) for a mapping node
+    for child in node.children:
+        if child.name in ('mapping_entry', 'flow_pair'):
+            yield child.children[0], child.children[1] if len(child.children) > 1 else None
+
+
+def _role_name(node):
+    if node is None:
+        return None
+    if node.name in ('block_mapping', 'flow_mapping'):
+        for key, value in _entries(node):
+            if scalar_text(key) in ('role', 'name') and value is not None:
+                return scalar_text(value)
+        return None
+    return scalar_text(node)
+
+
+def _items(node):
+    # the entries of a sequence node
+    if node.name == 'block_sequence':
+        return [x.children[0] for x in node.children if x.children]
+    if node.name == 'flow_sequence':
+        return list(node.children)
+    return []
+
+
+def find_role(path, name):
+    """
+    Returns the directory of the role name used from the file at path, or
+    None.  Roles are looked up in the roles directory next to path and next
+    to each of its parent directories, and name may also be a path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    candidates = [os.path.join(directory, name)]
+    while True:
+        candidates.append(os.path.join(directory, 'roles', name))
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            break
+        directory = parent
+    for candidate in candidates:
+        if os.path.isdir(os.path.join(candidate, 'tasks')):
+            # NOTE: relative paths stay relative, like the paths of included files
+            return os.path.normpath(candidate if os.path.isabs(path) else os.path.relpath(candidate))
+    return None
+
+
+def role_files(role):
+    """ Returns the existing files of the role directory role that Ansible reads """
+    result = []
+    for name in ROLE_FILES:
+        for extension in ('.yml', '.yaml'):
+            path = os.path.join(role, name + extension)
+            if os.path.isfile(path):
+                result.append(os.path.normpath(path))
+                break
+    return result
+
+
+def file_references(path, ast_result):
+    """
+    Returns (kind, path) for each existing file that the parse of the file
+    at path includes or uses as a role, in document order.  kind is the key
+    that referenced the file.
+    """
+    base = os.path.dirname(path)
+    result = []
+
+    def add_role(kind, name):
+        role = find_role(path, name) if name else None
+        if role is not None:
+            result.extend((kind, x) for x in role_files(role))
+
+    stack = list(reversed(ast_result.items))
+    while stack:
+        node = stack.pop()
+        stack.extend(reversed(node.children))
+        if node.name not in ('mapping_entry', 'flow_pair') or len(node.children) < 2:
+            continue
+        kind = scalar_text(node.children[0])
+        value = node.children[1]
+        if kind in INCLUDE_KEYS:
+            target = scalar_text(value)
+            if target:
+                target = os.path.normpath(os.path.join(base, target))
+                if os.path.isfile(target):
+                    result.append((kind, target))
+        elif kind in ROLE_KEYS:
+            add_role(kind, _role_name(value))
+        elif kind in ROLE_LIST_KEYS:
+            for item in _items(value):
+                add_role(kind, _role_name(item))
+    return result
+
+
+class GraphFile(object):
+    def __init__(self, path):
+        self.path = path
+        self.text = None
+        self.result = None
+        self.error = None
+        # (kind, path) of the files this one references
+        self.references = []
+
+
+class DependencyGraph(object):
+    """
+    The files of a project and the files each one includes or uses as a
+    role.  Each physical file is one node, under the first path it was
+    added with, so a file reached through several paths is parsed once and
+    its parse result is shared by every file that references it.
+    """
+    def __init__(self):
+        self.files = OrderedDict()
+        self._paths = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, path):
+        return self.canonical(path) is not None
+
+    def canonical(self, path):
+        """ Returns the path that the file at path was added with, or None """
+        return self._paths.get(os.path.realpath(path))
+
+    def add(self, path):
+        """ Adds the file at path, returning (its canonical path, whether it is new) """
+        existing = self.canonical(path)
+        if existing is not None:
+            return existing, False
+        path = os.path.normpath(path)
+        self._paths[os.path.realpath(path)] = path
+        self.files[path] = GraphFile(path)
+        return path, True
+
+    def remove(self, path):
+        """ Removes the file at path and the references to it """
+        path = self.canonical(path)
+        del self._paths[os.path.realpath(path)]
+        del self.files[path]
+        for item in self.files.values():
+            if any(target == path for kind, target in item.references):
+                item.references = [x for x in item.references if x[1] != path]
+
+    def add_reference(self, path, kind, target):
+        self.files[path].references.append((kind, target))
+
+    def dependencies(self, path):
+        """ Returns the paths that the file at path references, each once """
+        result = []
+        for kind, target in self.files[self.canonical(path)].references:
+            if target not in result:
+                result.append(target)
+        return result
+
+    def dependents(self, path):
+        """ Returns the paths that reference the file at path """
+        path = self.canonical(path)
+        return [x.path for x in self.files.values()
+                if any(target == path for kind, target in x.references)]
+
+    def all_dependents(self, paths):
+        """ Returns the paths that reference any of paths, directly or through other files """
+        # path -> paths that reference it
+        referenced_by = {}
+        for item in self.files.values():
+            for kind, target in item.references:
+                referenced_by.setdefault(target, set()).add(item.path)
+        result = set()
+        stack = [self.canonical(x) or x for x in paths]
+        while stack:
+            for source in referenced_by.get(stack.pop(), ()):
+                if source not in result:
+                    result.add(source)
+                    stack.append(source)
+        return [path for path in self.files if path in result]
+
+    def topological_order(self, paths=None):
+        """
+        Returns all paths, or only those in paths, with each file after the
+        files it references.  Ties keep the order the files were added in,
+        or the order of paths; a reference that closes a cycle is ignored.
+        Only references among paths are followed, so paths should include
+        every file between two of them, as changed files together with
+        their all_dependents() do.
+        """
+        result = []
+        done = set()
+        selected = None if paths is None else set(paths)
+        for start in (self.files if paths is None else paths):
+            if start in done:
+                continue
+            # (path, iterator over its dependencies)
+            stack = [(start, iter(self.dependencies(start)))]
+            done.add(start)
+            while stack:
+                path, dependencies = stack[-1]
+                for target in dependencies:
+                    if target not in done and (selected is None or target in selected):
+                        done.add(target)
+                        stack.append((target, iter(self.dependencies(target))))
+                        break
+                else:
+                    stack.pop()
+                    result.append(path)
+        return result
+
+    def to_dict(self):
+        """ Returns the graph as a dict of nodes and edges, nodes in topological order """
+        nodes = []
+        for path in self.topological_order():
+            node = OrderedDict()
+            node['path'] = path
+            error = self.files[path].error
+            node['error'] = unicode(error) if error is not None else None
+            nodes.append(node)
+        edges = []
+        for item in self.files.values():
+            for kind, target in item.references:
+                edges.append(OrderedDict([('source', item.path), ('target', target),
+                        ('kind', kind)]))
+        return OrderedDict([('nodes', nodes), ('edges', edges)])
+
+    def to_json(self, indent=4):
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_dot(self):
+        lines = ['digraph ansible_hint {']
+        for path in self.topological_order():
+            lines.append('    {};'.format(json.dumps(path)))
+        for item in self.files.values():
+            for kind, target in item.references:
+                lines.append('    {} -> {} [label={}];'.format(
+                        json.dumps(item.path), json.dumps(target), json.dumps(kind)))
+        lines.append('}')
+        return '\n'.join(lines)
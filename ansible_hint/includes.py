@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+from ansible_hint.graph import mentions_reference
+
+YAML_EXTENSIONS = ('.yml', '.yaml')
+
+
+def is_yaml(path):
+    return path.endswith(YAML_EXTENSIONS)
+
+
+def file_mentions_reference(path):
+    """
+    Returns whether the file at path contains any key that
+    file_references() follows, which a file must to reference another, or
+    whether it cannot be read, which its lint reports
+    """
+    try:
+        with io.open(path, encoding='utf-8') as f:
+            return mentions_reference(f.read())
+    except (IOError, OSError, UnicodeDecodeError):
+        return True
+
+
+def related_files(runner, paths, changed):
+    """
+    Returns the paths that are in changed, include a changed file or use
+    it as a role, directly or through other files, or are referenced by a
+    changed file, in the order of paths.  runner must be a project runner;
+    it parses only the files that are changed or mention a reference key,
+    and the files those reference.  All paths must be normalized.
+    """
+    changed = set(changed)
+    graph = runner.build_graph([path for path in paths
+            if path in changed or file_mentions_reference(path)])
+    roots = [graph.canonical(path) for path in changed if path in graph]
+    selected = set(roots)
+    selected.update(graph.all_dependents(roots))
+    for path in roots:
+        selected.update(graph.dependencies(path))
+    return [path for path in paths if path in changed or graph.canonical(path) in selected]
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import re
+from array import array
+from bisect import bisect_left
+from ansible_hint.parser import (Eof, Any, CharRange, Literal, Negate, Optional, OneOf,
+        Sequence, OrGroup, OneOrMore, OneOrMoreUntil, ZeroOrMore, ZeroOrMoreUntil, Decl,
+        UnreportedDecl, ExpandedDecl, SideTableDecl, TokenDecl, DeclRef, Lookahead)
+
+ANY_CHAR = r'[\s\S]'
+
+# characters escaped within a regular expression character class
+CLASS_SPECIAL = '\\]^-'
+
+# production type -> function of (pattern of each production within it) -> pattern
+PATTERN_LOOKUP = {
+    Sequence: lambda *items: '(?:{})'.format(''.join(items)),
+    OrGroup: lambda *items: '(?:{})'.format('|'.join(items)),
+    Optional: '(?:{})?'.format,
+    ZeroOrMore: '(?:{})*'.format,
+    OneOrMore: '(?:{})+'.format,
+    Negate: ('(?!{})' + ANY_CHAR).format,
+    # NOTE: like the productions, these fail if term never matches
+    OneOrMoreUntil: ('(?:(?!{0})' + ANY_CHAR + ')+(?={0})').format,
+    ZeroOrMoreUntil: ('(?:(?!{0})' + ANY_CHAR + ')*(?={0})').format,
+    Lookahead: '(?={})'.format,
+}
+
+DECL_TYPES = (Decl, UnreportedDecl, ExpandedDecl, SideTableDecl, TokenDecl)
+
+
+def _class_char(ch):
+    return '\\' + ch if ch in CLASS_SPECIAL else ch
+
+
+def token_pattern(prod, decl_map, seen=()):
+    """
+    Returns a regular expression that matches what prod matches, for a
+    token.  Raises ValueError if prod cannot be part of a token.
+    """
+    if prod.has_fail_msg():
+        raise ValueError('{} has an error message, which a token cannot report'.format(prod))
+    if isinstance(prod, Literal):
+        return re.escape(prod.text)
+    if isinstance(prod, OneOf):
+        if not prod.text:
+            return '(?!)'
+        return '[{}]'.format(''.join(map(_class_char, prod.text)))
+    if isinstance(prod, CharRange):
+        return '[{}-{}]'.format(_class_char(prod.start_ch), _class_char(prod.end_ch))
+    if isinstance(prod, Any):
+        return ANY_CHAR
+    if isinstance(prod, Eof):
+        return r'\Z'
+    if isinstance(prod, DECL_TYPES):
+        return token_pattern(prod.prod, decl_map, seen)
+    if isinstance(prod, DeclRef):
+        if prod.name in seen:
+            raise ValueError('"{}" refers to itself, which a token cannot'.format(prod.name))
+        if prod.name not in decl_map:
+            raise ValueError('Reference to undeclared "{}"'.format(prod.name))
+        return token_pattern(decl_map[prod.name], decl_map, seen + (prod.name,))
+    build = PATTERN_LOOKUP.get(type(prod))
+    if build is None:
+        raise ValueError('{} cannot be part of a token'.format(type(prod).__name__))
+    return build(*[token_pattern(x, decl_map, seen) for x in prod.ctor_args()])
+
+
+def build_lexer(decls):
+    """ Returns the Lexer for the TokenDecls among decls, or None if there are none """
+    tokens = [decl for decl in decls if isinstance(decl, TokenDecl)]
+    if not tokens:
+        return None
+    return Lexer(tokens, dict((decl.name, decl) for decl in decls))
+
+
+class Lexer(object):
+    """
+    Matches the tokens of a grammar with one master regular expression.
+
+    A token matches as a regular expression does, so unlike elsewhere in
+    the grammar a repetition within it gives back text and the next
+    alternative is tried when the rest of the token does not match.  Where
+    more than one token matches, the one declared first wins.
+    """
+    def __init__(self, tokens, decl_map):
+        self.tokens = list(tokens)
+        self.names = [decl.name for decl in self.tokens]
+        # token name -> kind, the index of its group in the master expression
+        self.kinds = dict((name, index) for index, name in enumerate(self.names))
+        self.regex = re.compile('|'.join('({})'.format(token_pattern(x, decl_map, (x.name,)))
+                for x in self.tokens), re.U)
+
+    def with_decl(self, decl, decl_map):
+        """ Returns the Lexer for decl_map, where decl was added or replaced a decl """
+        tokens = [decl if x.name == decl.name else x for x in self.tokens]
+        if isinstance(decl, TokenDecl) and decl.name not in self.kinds:
+            tokens.append(decl)
+        tokens = [x for x in tokens if isinstance(x, TokenDecl)]
+        return Lexer(tokens, decl_map) if tokens else None
+
+    def match(self, text, pos):
+        """ Returns (kind, end) of the token at offset pos of text, or None """
+        match = self.regex.match(text, pos)
+        if match is None or match.end() == pos:
+            # NOTE: a token never matches empty text
+            return None
+        return match.lastindex - 1, match.end()
+
+    def tokenize(self, text):
+        return TokenTable(self, text)
+
+
+class TokenTable(object):
+    """
+    The tokens of a text, lexed in one pass into arrays of the start, end
+    and kind of each.  The pass starts each token where the last ended;
+    the token at any other offset, as when a production that is not a
+    token consumed part of one, is matched when it is asked for.
+    """
+    def __init__(self, lexer, text):
+        self.lexer = lexer
+        self.text = text
+        self.starts = array(b'l')
+        self.ends = array(b'l')
+        self.kinds = array(b'H')
+        # offset -> (kind, end) or None, for offsets that no token of the pass starts at
+        self.others = {}
+        regex = lexer.regex
+        pos = 0
+        size = len(text)
+        while pos < size:
+            match = regex.match(text, pos)
+            if match is None or match.end() == pos:
+                match = regex.search(text, pos + 1)
+                while match is not None and match.end() == match.start():
+                    match = regex.search(text, match.start() + 1)
+                if match is None:
+                    break
+            self.starts.append(match.start())
+            self.ends.append(match.end())
+            self.kinds.append(match.lastindex - 1)
+            pos = match.end()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def at(self, pos):
+        """ Returns (kind, end) of the token at offset pos, or None """
+        index = bisect_left(self.starts, pos)
+        if index < len(self.starts) and self.starts[index] == pos:
+            return self.kinds[index], self.ends[index]
+        if pos not in self.others:
+            self.others[pos] = self.lexer.match(self.text, pos)
+        return self.others[pos]
+
+    def end(self, kind, pos):
+        """ Returns the end of the token at offset pos if it is of kind, or None """
+        found = self.at(pos)
+        if found is None or found[0] != kind:
+            return None
+        return found[1]
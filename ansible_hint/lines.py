@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from array import array
+from bisect import bisect_right
+from ansible_hint.prescan import BLANK, COMMENT, TABS, PreScan
+
+
+class LineTable(object):
+    """
+    Per-line whitespace facts for a text, computed in a single pass.
+
+    Lines are numbered from 0 as in AstNode.pos, and every per-line lookup
+    is O(1).  Columns are relative to the start of the line.  The pass is a
+    PreScan's, which may be shared with the parser.
+    """
+    def __init__(self, text, prescan=None):
+        self.text = text
+        if prescan is None:
+            prescan = PreScan(text)
+        self.starts, self.ends, self.indents, self.content_ends, self.flags = prescan.lines()
+
+    @classmethod
+    def read(cls, stream, chunk_size=65536):
+        """
+        Returns the LineTable of the text read from the file-like object
+        stream, a chunk of whole lines at a time, for text that is not kept
+        in memory.  The table has no text, so the indent_text() and spaces()
+        of a line with tabs are not available.
+        """
+        table = cls.__new__(cls)
+        table.text = None
+        table.starts, table.ends, table.indents, table.content_ends = [array(b'l')
+                for _ in range(4)]
+        table.flags = array(b'B')
+        base = 0
+        while True:
+            chunk = stream.read(chunk_size)
+            if chunk and not chunk.endswith('\n'):
+                chunk += stream.readline()
+            starts, ends, indents, content_ends, flags = PreScan(chunk).lines()
+            # NOTE: a chunk that ends in a newline ends in an empty line, which
+            # is the start of the next chunk
+            count = len(starts) - 1 if chunk.endswith('\n') else len(starts)
+            table.starts.extend(x + base for x in starts[:count])
+            table.ends.extend(x + base for x in ends[:count])
+            table.indents.extend(indents[:count])
+            table.content_ends.extend(content_ends[:count])
+            table.flags.extend(flags[:count])
+            base += len(chunk)
+            if not chunk.endswith('\n'):
+                return table
+
+    def __len__(self):
+        return len(self.starts)
+
+    def start(self, line):
+        return self.starts[line]
+
+    def end(self, line):
+        """ Offset of the end of line, not including the newline """
+        return self.ends[line]
+
+    def indent(self, line):
+        """ Width of the leading whitespace, counting tabs as one column """
+        return self.indents[line]
+
+    def indent_text(self, line):
+        start = self.starts[line]
+        return self.text[start:start + self.indents[line]]
+
+    def spaces(self, line):
+        """ Number of leading spaces before any tab """
+        if self.flags[line] & TABS:
+            text = self.indent_text(line)
+            return len(text) - len(text.lstrip(' '))
+        return self.indents[line]
+
+    def trailing(self, line):
+        """ (start, end) columns of trailing whitespace; all of a blank line """
+        end = self.ends[line] - self.starts[line]
+        if self.flags[line] & BLANK:
+            return (0, end)
+        return (self.content_ends[line], end)
+
+    def has_tabs(self, line):
+        return bool(self.flags[line] & TABS)
+
+    def is_blank(self, line):
+        return bool(self.flags[line] & BLANK)
+
+    def is_comment(self, line):
+        return bool(self.flags[line] & COMMENT)
+
+    def line_of(self, offset):
+        return bisect_right(self.starts, offset) - 1
+
+    def position(self, offset):
+        line = self.line_of(offset)
+        return (line, offset - self.starts[line])
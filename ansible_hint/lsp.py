@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import copy
+import json
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from timeit import default_timer
+from urllib import unquote
+from urlparse import urlparse
+from ansible_hint.parser import ParseBudget
+from ansible_hint.rules import Diagnostic
+
+# seconds that a document must go unchanged before it is linted again
+DEFAULT_DEBOUNCE = 0.2
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+
+# LSP DiagnosticSeverity of syntax errors and of rule diagnostics
+ERROR = 1
+WARNING = 2
+
+# LSP TextDocumentSyncKind
+INCREMENTAL_SYNC = 2
+
+
+def read_message(stream):
+    """ Returns the next JSON-RPC message of stream, or None at its end """
+    length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            if length is not None:
+                break
+            continue
+        name, _, value = line.partition(b':')
+        if name.strip().lower() == b'content-length':
+            length = int(value)
+    return json.loads(stream.read(length).decode('utf-8'))
+
+
+def write_message(stream, message):
+    body = json.dumps(message).encode('utf-8')
+    stream.write(b'Content-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+    stream.flush()
+
+
+def uri_path(uri):
+    """ Returns the path of a file URI, or the URI itself if it is not one """
+    parsed = urlparse(uri)
+    if parsed.scheme != 'file':
+        return uri
+    return unquote(parsed.path.encode('utf-8')).decode('utf-8')
+
+
+def utf16_column(line, column):
+    """ Returns the UTF-16 code units of the first column characters of line, as LSP counts """
+    return column + sum(1 for ch in line[:column] if ord(ch) > 0xffff)
+
+
+def char_column(line, units):
+    """ Returns the characters of line within its first units UTF-16 code units """
+    column = 0
+    for ch in line:
+        units -= 2 if ord(ch) > 0xffff else 1
+        if units < 0:
+            break
+        column += 1
+    return column
+
+
+def line_offsets(text):
+    """ Returns the offset of the start of each line of text """
+    offsets = [0]
+    index = text.find('\n')
+    while index >= 0:
+        offsets.append(index + 1)
+        index = text.find('\n', index + 1)
+    return offsets
+
+
+def apply_change(text, change):
+    """ Returns text with an LSP TextDocumentContentChangeEvent applied """
+    if 'range' not in change:
+        return change['text']
+    offsets = line_offsets(text)
+
+    def offset(position):
+        line = position['line']
+        if line >= len(offsets):
+            return len(text)
+        start = offsets[line]
+        end = offsets[line + 1] - 1 if line + 1 < len(offsets) else len(text)
+        return start + char_column(text[start:end], position['character'])
+
+    start, end = offset(change['range']['start']), offset(change['range']['end'])
+    return text[:start] + change['text'] + text[end:]
+
+
+def log_error(msg):
+    """ Writes msg and the traceback of the exception being handled to stderr """
+    print(msg, file=sys.stderr)
+    traceback.print_exc(file=sys.stderr)
+
+
+def lsp_diagnostic(diagnostic, lines):
+    """ Returns the LSP Diagnostic for a Diagnostic, spanning the rest of its line """
+    line, column = diagnostic.position
+    text = lines[line].rstrip('\r') if line < len(lines) else ''
+    start = utf16_column(text, column)
+    result = OrderedDict()
+    result['range'] = OrderedDict([
+        ('start', OrderedDict([('line', line), ('character', start)])),
+        ('end', OrderedDict([('line', line), ('character', max(utf16_column(text, len(text)),
+                start))])),
+    ])
+    result['severity'] = ERROR if diagnostic.rule is None else WARNING
+    if diagnostic.rule is not None:
+        result['code'] = diagnostic.rule
+    result['source'] = 'ansible_hint'
+    result['message'] = diagnostic.msg
+    return result
+
+
+class Document(object):
+    def __init__(self, uri, version, text):
+        self.uri = uri
+        self.version = version
+        self.text = text
+
+
+class LanguageServer(object):
+    """
+    Lints the documents that an editor has open and publishes their
+    diagnostics, speaking the Language Server Protocol over a pair of byte
+    streams.
+
+    Documents and the grammar stay in memory.  A document is linted once
+    it has gone debounce seconds without an edit, on a single lint thread.
+    An edit to a document that is being linted cancels its parse through
+    the cancel event of the ParseBudget of that lint, a copy of the
+    runner's, and a result for a version that is no longer current is
+    never published.  A lint that fails publishes the error as the
+    document's only diagnostic, and a handler that fails answers its
+    request with an internal error; both are logged to stderr.
+    """
+    def __init__(self, runner, input, output, debounce=DEFAULT_DEBOUNCE):
+        self.runner = runner
+        self.input = input
+        self.output = output
+        self.debounce = debounce
+        # uri -> Document
+        self.documents = {}
+        # uri -> time at which the document is linted
+        self.due = {}
+        # (uri, cancel event) of the lint in progress
+        self.running = None
+        self.lock = threading.Condition()
+        self.write_lock = threading.Lock()
+        self.shutdown = False
+        self.stopped = False
+
+        # method -> handler of its params; requests return their result
+        self.handlers = {
+            'initialize': self.initialize,
+            'shutdown': self.request_shutdown,
+            'textDocument/didOpen': self.did_open,
+            'textDocument/didChange': self.did_change,
+            'textDocument/didClose': self.did_close,
+        }
+
+    def send(self, message):
+        with self.write_lock:
+            write_message(self.output, message)
+
+    def serve(self):
+        """ Handles messages until exit or the end of the input, returning the exit status """
+        thread = threading.Thread(target=self.lint_loop)
+        thread.daemon = True
+        thread.start()
+        try:
+            while True:
+                try:
+                    message = read_message(self.input)
+                except ValueError:
+                    self.send(OrderedDict([('jsonrpc', '2.0'), ('id', None), ('error',
+                            OrderedDict([('code', PARSE_ERROR), ('message', 'Invalid JSON')]))]))
+                    continue
+                if message is None or message.get('method') == 'exit':
+                    break
+                self.handle(message)
+        finally:
+            with self.lock:
+                self.stopped = True
+                if self.running is not None:
+                    self.running[1].set()
+                self.lock.notify()
+            thread.join()
+        return 0 if self.shutdown else 1
+
+    def handle(self, message):
+        handler = self.handlers.get(message.get('method'))
+        error = None
+        if handler is None:
+            error = METHOD_NOT_FOUND, 'Unknown method "{}"'.format(message.get('method'))
+        else:
+            try:
+                result = handler(message.get('params') or {})
+            except (KeyError, TypeError, AttributeError) as e:
+                error = INVALID_PARAMS, 'Invalid params: {}'.format(e)
+            except Exception as e:
+                log_error('Error handling {}'.format(message.get('method')))
+                error = INTERNAL_ERROR, 'Internal error: {}'.format(e)
+        if 'id' not in message:
+            # NOTE: notifications get no response, and unknown ones such as
+            # $/cancelRequest are ignored
+            return
+        response = OrderedDict([('jsonrpc', '2.0'), ('id', message['id'])])
+        if error is None:
+            response['result'] = result
+        else:
+            response['error'] = OrderedDict([('code', error[0]), ('message', error[1])])
+        self.send(response)
+
+    def initialize(self, params):
+        return OrderedDict([
+            ('capabilities', OrderedDict([('textDocumentSync', OrderedDict([
+                ('openClose', True), ('change', INCREMENTAL_SYNC)]))])),
+            ('serverInfo', OrderedDict([('name', 'ansible_hint')])),
+        ])
+
+    def request_shutdown(self, params):
+        self.shutdown = True
+        return None
+
+    def did_open(self, params):
+        item = params['textDocument']
+        with self.lock:
+            self.documents[item['uri']] = Document(item['uri'], item.get('version'), item['text'])
+        self.schedule(item['uri'], 0)
+
+    def did_change(self, params):
+        item = params['textDocument']
+        with self.lock:
+            document = self.documents.get(item['uri'])
+            if document is None:
+                return
+            for change in params['contentChanges']:
+                document.text = apply_change(document.text, change)
+            document.version = item.get('version')
+        self.schedule(item['uri'], self.debounce)
+
+    def did_close(self, params):
+        uri = params['textDocument']['uri']
+        with self.lock:
+            self.documents.pop(uri, None)
+            self.due.pop(uri, None)
+            if self.running is not None and self.running[0] == uri:
+                self.running[1].set()
+        self.publish(uri, None, [])
+
+    def schedule(self, uri, delay):
+        """ Lints the document uri after delay seconds, cancelling a lint of it in progress """
+        with self.lock:
+            self.due[uri] = default_timer() + delay
+            if self.running is not None and self.running[0] == uri:
+                self.running[1].set()
+            self.lock.notify()
+
+    def _next_due(self):
+        # waits for the next document that is due, returning (uri, version, text, cancel)
+        while not self.stopped:
+            wait = None
+            if self.due:
+                uri, due = min(self.due.items(), key=lambda x: x[1])
+                wait = due - default_timer()
+                if wait <= 0:
+                    del self.due[uri]
+                    document = self.documents[uri]
+                    cancel = threading.Event()
+                    self.running = (uri, cancel)
+                    return uri, document.version, document.text, cancel
+            self.lock.wait(wait)
+        return None
+
+    def lint_loop(self):
+        while True:
+            with self.lock:
+                job = self._next_due()
+            if job is None:
+                return
+            uri, version, text, cancel = job
+            try:
+                diagnostics = self.lint(uri, text, cancel)
+            except Exception as e:
+                # NOTE: the lint thread must outlive a failed lint
+                log_error('Error linting {}'.format(uri))
+                diagnostics = [Diagnostic(uri_path(uri), (0, 0), 'Internal error: {}'.format(e))]
+            with self.lock:
+                self.running = None
+                document = self.documents.get(uri)
+                current = (not cancel.is_set() and document is not None
+                        and document.version == version)
+            if current:
+                self.publish(uri, version, diagnostics, text)
+
+    def lint(self, uri, text, cancel):
+        """ Returns the diagnostics of text, which are not complete if cancel was set """
+        # NOTE: the budget is where the parser looks for cancellation
+        budget = copy.copy(self.runner.budget) if self.runner.budget is not None else ParseBudget()
+        budget.cancel = cancel
+        return self.runner.lint_text(uri_path(uri), text, budget)
+
+    def publish(self, uri, version, diagnostics, text=''):
+        lines = text.split('\n')
+        params = OrderedDict([('uri', uri)])
+        if version is not None:
+            params['version'] = version
+        params['diagnostics'] = [lsp_diagnostic(x, lines) for x in diagnostics]
+        self.send(OrderedDict([('jsonrpc', '2.0'), ('method', 'textDocument/publishDiagnostics'),
+                ('params', params)]))
+
+
+def serve(runner, input, output, debounce=DEFAULT_DEBOUNCE):
+    return LanguageServer(runner, input, output, debounce).serve()
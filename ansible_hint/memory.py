@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import os
+import re
+import sys
+from collections import OrderedDict
+from ansible_hint.parser import ParseError
+
+try:
+    import tracemalloc
+except ImportError:
+    # NOTE: Python 2 only has tracemalloc when patched for pytracemalloc
+    tracemalloc = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# bytes of parser working memory and tree per character of text; a pruned
+# tree only has the nodes rules need, and a streamed parse only keeps the
+# text of the current document, the textless nodes of the documents before it
+# and a LineTable.  Measured by bench/bench_memory.py with CPython 2.7 as 190,
+# 75 and 20, and rounded up; run it again when the parser or the tree changes.
+BYTES_PER_CHAR = 192
+PRUNED_BYTES_PER_CHAR = 80
+STREAMED_BYTES_PER_CHAR = 24
+
+# size unit -> bytes
+SIZE_UNITS = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+SIZE = re.compile(r'^\s*([0-9]+(?:\.[0-9]*)?)\s*([kKmMgG]?)(?:i?[bB])?\s*$')
+
+# NOTE: ru_maxrss is in bytes on macOS and in KB elsewhere
+RSS_UNIT = 1 if sys.platform == 'darwin' else 1024
+
+# resident pages of this process are the second field
+STATM = '/proc/self/statm'
+
+
+def current_rss():
+    """ Returns the resident memory of this process in bytes, or None if it is not known """
+    try:
+        with open(STATM) as f:
+            return int(f.read().split()[1]) * os.sysconf(str('SC_PAGE_SIZE'))
+    except (IOError, OSError, ValueError, IndexError):
+        return None
+
+
+def parse_size(text):
+    """ Returns the bytes of a size such as "4096", "512K", "1.5G" or "64MB" """
+    match = SIZE.match(text)
+    if match is None:
+        raise ValueError('Invalid size "{}"'.format(text))
+    return int(float(match.group(1)) * SIZE_UNITS[match.group(2).lower()])
+
+
+def format_size(size):
+    if size < 1024:
+        return '{}B'.format(size)
+    for unit in ['KB', 'MB', 'GB']:
+        size /= 1024
+        if size < 1024:
+            break
+    return '{:.1f}{}'.format(size, unit)
+
+
+def projected_memory(size, pruned=True):
+    """ Returns the bytes that parsing size characters is projected to need """
+    return size * (PRUNED_BYTES_PER_CHAR if pruned else BYTES_PER_CHAR)
+
+
+def projected_stream_memory(size, largest, pruned=True):
+    """
+    Returns the bytes that a streamed parse of size characters, whose
+    largest document has largest characters, is projected to need
+    """
+    return size * STREAMED_BYTES_PER_CHAR + projected_memory(largest, pruned)
+
+
+class MemoryLimitExceeded(ParseError):
+    """ A file that no parse mode is projected to lint within the memory limit """
+
+
+class MemoryTracker(object):
+    """
+    Measures the memory that each phase of linting each file allocates,
+    and the resident memory of the process at the end of each phase.
+
+    A phase's peak is the most memory allocated during it, above what was
+    allocated when it began, and its retained memory is what it left
+    allocated.  A phase measured more than once for a file, as when its
+    documents are parsed one at a time, keeps its largest measurements.
+
+    With tracemalloc only Python allocations are counted.  Without it, as
+    on Python 2, the peak is the growth of the process-wide peak RSS, which
+    stays 0 while an earlier phase or file's peak is higher, and retained
+    memory is not known; the RSS at the end of each phase is then the
+    measurement to compare across files.
+    """
+    def __init__(self):
+        # path -> phase -> [peak, retained, RSS at its end]
+        self.files = OrderedDict()
+        self.tracing = tracemalloc is not None
+        if self.tracing and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self._start = None
+
+    def _memory(self):
+        # (allocated, peak) in bytes; allocated is None without tracemalloc
+        if self.tracing:
+            return tracemalloc.get_traced_memory()
+        if resource is not None:
+            return None, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT
+        return None, 0
+
+    def begin(self):
+        if self.tracing and hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        self._start = self._memory()
+
+    def end(self, path, phase):
+        """ Adds the memory allocated since begin() to phase of the file at path """
+        start, start_peak = self._start
+        allocated, peak = self._memory()
+        if start is None:
+            peak, retained = peak - start_peak, None
+        else:
+            # NOTE: without reset_peak() the peak may be from an earlier phase
+            retained = max(allocated - start, 0)
+            peak = max(peak - start, retained)
+        rss = current_rss()
+        measured = self.files.setdefault(path, OrderedDict()).setdefault(phase,
+                [0, retained, rss])
+        measured[0] = max(measured[0], peak)
+        if retained is not None:
+            measured[1] = max(measured[1], retained)
+        if rss is not None:
+            measured[2] = max(measured[2], rss)
+
+    def phases(self, path):
+        """
+        Returns (phase, peak, retained, RSS) for the parse, tree, lines and
+        rules phases of the file at path, with None for what is not known.
+        The parser builds the tree as it matches, so there is no separate
+        AST-build phase: the tree is what the parse retains, and the parse
+        phase is the working memory above it.  The tree is only known with
+        tracemalloc.  The lines phase builds the LineTable.
+        """
+        measured = self.files.get(path, {})
+        result = []
+        if 'parse' in measured:
+            peak, tree, rss = measured['parse']
+            if tree is None:
+                result.append(('parse', peak, None, rss))
+            else:
+                result.append(('parse', max(peak - tree, 0), 0, rss))
+                result.append(('tree', tree, tree, None))
+        for phase in ['lines', 'rules']:
+            if phase in measured:
+                result.append((phase,) + tuple(measured[phase]))
+        return result
+
+    def format_report(self):
+        def kb(size):
+            return '-' if size is None else '{:.1f}'.format(size / 1024)
+
+        lines = ['{:<40} {:<6} {:>12} {:>12} {:>12}'.format('file', 'phase', 'peak KB',
+                'retained KB', 'RSS KB')]
+        for path in self.files:
+            for index, (phase, peak, retained, rss) in enumerate(self.phases(path)):
+                lines.append('{:<40} {:<6} {:>12} {:>12} {:>12}'.format(
+                        path if index == 0 else '', phase, kb(peak), kb(retained), kb(rss)))
+        if not self.tracing:
+            lines.append('tracemalloc is not available: peaks are the growth of the '
+                    'process-wide peak RSS, which is 0 after a larger phase or file; RSS is '
+                    'the resident memory of the process at the end of each phase')
+        return '\n'.join(lines)
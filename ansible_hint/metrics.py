@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import json
+from collections import OrderedDict
+from timeit import default_timer
+
+# Prometheus metric names are <prefix><name>
+METRIC_PREFIX = 'ansible_hint_'
+
+# cache name -> [hits, misses] in this process; see count_cache()
+CACHE_COUNTS = OrderedDict()
+
+
+def count_cache(name, hit):
+    """ Counts one lookup in the named cache """
+    counts = CACHE_COUNTS.get(name)
+    if counts is None:
+        counts = CACHE_COUNTS[name] = [0, 0]
+    counts[0 if hit else 1] += 1
+
+
+def _rate(count, seconds):
+    return count / seconds if seconds > 0 else 0.0
+
+
+def _label_value(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class RunMetrics(object):
+    """
+    Times a lint run: each phase of each file, the run as a whole and the
+    rules, with the bytes read and the cache lookups made during it.
+
+    Each measurement is a pair of timer calls around work that takes far
+    longer, so collecting metrics costs well under 1% of the run.  File
+    workers measure their files with their own RunMetrics, and send each
+    file's measurements and rule times back with its result; see pop() and
+    merge().
+    """
+    def __init__(self):
+        self.start = default_timer()
+        self.seconds = None
+        # path -> phase -> seconds, and path -> bytes read
+        self.files = OrderedDict()
+        self.bytes = {}
+        # phase -> seconds, for work not done for one file, such as loading the grammar
+        self.phases = OrderedDict()
+        # rule name -> [calls, seconds] reported by workers
+        self.rules = OrderedDict()
+        self.workers = 1
+        self.caches = OrderedDict()
+        self._cache_start = dict((name, tuple(x)) for name, x in CACHE_COUNTS.items())
+        # rule name -> (calls, seconds) already sent back by pop()
+        self._rules_sent = {}
+
+    def add(self, path, phase, seconds):
+        """ Adds seconds to phase of the file at path, or of the run if path is None """
+        phases = self.phases if path is None else self.files.setdefault(path, OrderedDict())
+        phases[phase] = phases.get(phase, 0.0) + seconds
+
+    def add_bytes(self, path, size):
+        self.bytes[path] = self.bytes.get(path, 0) + size
+
+    def pop(self, path, engine):
+        """
+        Returns what was measured for path, with the rule times since the
+        last pop(), for merge(); this RunMetrics then forgets them
+        """
+        rules = []
+        for name, stats in engine.stats.items():
+            calls, seconds = self._rules_sent.get(name, (0, 0.0))
+            if stats.calls != calls:
+                rules.append((name, stats.calls - calls, stats.time - seconds))
+                self._rules_sent[name] = (stats.calls, stats.time)
+        return self.files.pop(path, None), self.bytes.pop(path, None), rules
+
+    def merge(self, path, phases, size, rules):
+        """ Adds the measurements that a worker's pop() returned for path """
+        if phases is not None:
+            self.files[path] = phases
+        if size is not None:
+            self.bytes[path] = size
+        self._add_rules(rules)
+
+    def _add_rules(self, rules):
+        for name, calls, seconds in rules:
+            totals = self.rules.setdefault(name, [0, 0.0])
+            totals[0] += calls
+            totals[1] += seconds
+
+    def finish(self, engine, workers=1):
+        """
+        Ends the run, adding the rule times of engine, which linted in this
+        process, and the cache lookups since the run began
+        """
+        self.seconds = default_timer() - self.start
+        self.workers = workers
+        self._add_rules((name, x.calls, x.time) for name, x in engine.stats.items() if x.calls)
+        for name, (hits, misses) in CACHE_COUNTS.items():
+            start_hits, start_misses = self._cache_start.get(name, (0, 0))
+            self.caches[name] = (hits - start_hits, misses - start_misses)
+
+    def file_seconds(self, path):
+        return sum(self.files.get(path, {}).values())
+
+    def to_dict(self, top=10):
+        """ Returns the metrics of a finished run, with the top slowest files and rules """
+        seconds = self.seconds
+        size = sum(self.bytes.values())
+        phases = OrderedDict(self.phases)
+        busy = 0.0
+        for path, measured in self.files.items():
+            for phase, phase_seconds in measured.items():
+                phases[phase] = phases.get(phase, 0.0) + phase_seconds
+                busy += phase_seconds
+        caches = OrderedDict()
+        for name, (hits, misses) in self.caches.items():
+            caches[name] = OrderedDict([('hits', hits), ('misses', misses),
+                    ('hit_rate', hits / (hits + misses) if hits + misses else None)])
+        files = sorted(self.files, key=self.file_seconds, reverse=True)[:top]
+        rules = sorted(self.rules.items(), key=lambda x: x[1][1], reverse=True)[:top]
+        return OrderedDict([
+            ('seconds', seconds),
+            ('files', len(self.files)),
+            ('bytes', size),
+            ('files_per_second', _rate(len(self.files), seconds)),
+            ('bytes_per_second', _rate(size, seconds)),
+            ('phases', phases),
+            ('caches', caches),
+            ('workers', self.workers),
+            ('worker_utilization', _rate(busy, seconds * self.workers)),
+            ('slowest_files', [OrderedDict([('path', path), ('seconds', self.file_seconds(path)),
+                    ('bytes', self.bytes.get(path, 0))]) for path in files]),
+            ('slowest_rules', [OrderedDict([('rule', name), ('seconds', rule_seconds),
+                    ('calls', calls)]) for name, (calls, rule_seconds) in rules]),
+        ])
+
+    def to_json(self, top=10, indent=4):
+        return json.dumps(self.to_dict(top), indent=indent)
+
+    def to_prometheus(self, top=10):
+        """ Returns the metrics in the Prometheus text exposition format """
+        data = self.to_dict(top)
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            name = METRIC_PREFIX + name
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+            for labels, value in samples:
+                if labels:
+                    name_labels = '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(
+                            key, _label_value(unicode(x))) for key, x in labels))
+                else:
+                    name_labels = name
+                lines.append('{} {!r}'.format(name_labels, value))
+
+        metric('run_seconds', 'gauge', 'Wall time of the run', [((), data['seconds'])])
+        metric('files', 'gauge', 'Files linted', [((), data['files'])])
+        metric('bytes', 'gauge', 'Bytes of the files read', [((), data['bytes'])])
+        metric('files_per_second', 'gauge', 'Files linted per second of the run',
+                [((), data['files_per_second'])])
+        metric('bytes_per_second', 'gauge', 'Bytes read per second of the run',
+                [((), data['bytes_per_second'])])
+        metric('phase_seconds', 'gauge', 'Time spent in each phase, over all files and workers',
+                [((('phase', phase),), x) for phase, x in data['phases'].items()])
+        caches = data['caches'].items()
+        metric('cache_hits', 'gauge', 'Cache lookups that found an entry',
+                [((('cache', name),), x['hits']) for name, x in caches])
+        metric('cache_misses', 'gauge', 'Cache lookups that found no entry',
+                [((('cache', name),), x['misses']) for name, x in caches])
+        metric('cache_hit_ratio', 'gauge', 'Share of cache lookups that found an entry',
+                [((('cache', name),), x['hit_rate']) for name, x in caches
+                 if x['hit_rate'] is not None])
+        metric('workers', 'gauge', 'Processes that linted files', [((), data['workers'])])
+        metric('worker_utilization_ratio', 'gauge',
+                'Share of the wall time of all workers spent on files',
+                [((), data['worker_utilization'])])
+        metric('file_seconds', 'gauge', 'Time spent on each of the slowest files',
+                [((('rank', index + 1), ('path', x['path'])), x['seconds'])
+                 for index, x in enumerate(data['slowest_files'])])
+        metric('rule_seconds', 'gauge', 'Time spent in each of the slowest rules',
+                [((('rank', index + 1), ('rule', x['rule'])), x['seconds'])
+                 for index, x in enumerate(data['slowest_rules'])])
+        metric('rule_calls', 'gauge', 'Visitor calls of each of the slowest rules',
+                [((('rank', index + 1), ('rule', x['rule'])), x['calls'])
+                 for index, x in enumerate(data['slowest_rules'])])
+        return '\n'.join(lines) + '\n'
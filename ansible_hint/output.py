@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import json
+from collections import OrderedDict
+
+SARIF_SCHEMA = 'https://json.schemastore.org/sarif-2.1.0.json'
+SARIF_VERSION = '2.1.0'
+
+# SARIF rule id for diagnostics that no rule reported, such as syntax errors
+PARSE_ERROR_RULE = 'parse_error'
+
+
+class Formatter(object):
+    """
+    Writes diagnostics to a byte stream as each file finishes.
+
+    begin() is called once before the first file and end() once after the
+    last; write_file() is called with each file's diagnostics, in order,
+    and flushes the stream so that output is never held back.  In watch
+    mode write_fixed() is also called, with the diagnostics of a file that
+    a re-lint no longer reports.
+    """
+    def __init__(self, stream, rules=()):
+        self.stream = stream
+        self.rules = rules
+
+    def write(self, text):
+        self.stream.write(text.encode('utf-8'))
+
+    def begin(self):
+        pass
+
+    def write_file(self, path, diagnostics):
+        for diagnostic in diagnostics:
+            self.write_diagnostic(diagnostic)
+        self.stream.flush()
+
+    def write_fixed(self, path, diagnostics):
+        for diagnostic in diagnostics:
+            self.write_fixed_diagnostic(diagnostic)
+        self.stream.flush()
+
+    def write_diagnostic(self, diagnostic):
+        """ To be overridden """
+        pass
+
+    def write_fixed_diagnostic(self, diagnostic):
+        """ To be overridden by formatters that can mark a diagnostic as fixed """
+        pass
+
+    def end(self):
+        self.stream.flush()
+
+
+class TextFormatter(Formatter):
+    def write_diagnostic(self, diagnostic):
+        self.write(unicode(diagnostic) + '\n')
+
+    def write_fixed_diagnostic(self, diagnostic):
+        self.write('fixed: ' + unicode(diagnostic) + '\n')
+
+
+class JsonLinesFormatter(Formatter):
+    def write_diagnostic(self, diagnostic, fixed=False):
+        data = OrderedDict()
+        data['path'] = diagnostic.path
+        data['line'] = diagnostic.position[0] + 1
+        data['column'] = diagnostic.position[1] + 1
+        data['message'] = diagnostic.msg
+        data['rule'] = diagnostic.rule
+        if fixed:
+            data['fixed'] = True
+        self.write(json.dumps(data) + '\n')
+
+    def write_fixed_diagnostic(self, diagnostic):
+        self.write_diagnostic(diagnostic, fixed=True)
+
+
+class SarifFormatter(Formatter):
+    """
+    Writes one SARIF log with a single run.  The log is written around the
+    results array, so each result is written as soon as its file is done.
+    """
+    def begin(self):
+        driver = OrderedDict()
+        driver['name'] = 'ansible_hint'
+        driver['rules'] = [OrderedDict([('id', rule.name)]) for rule in self.rules]
+        driver['rules'].append(OrderedDict([('id', PARSE_ERROR_RULE)]))
+        run = OrderedDict([('tool', OrderedDict([('driver', driver)])), ('results', [])])
+        log = OrderedDict()
+        log['$schema'] = SARIF_SCHEMA
+        log['version'] = SARIF_VERSION
+        log['runs'] = [run]
+
+        # split the document where the results go
+        head, tail = json.dumps(log).rsplit('[]', 1)
+        self.tail = tail
+        self.write(head + '[')
+        self.first = True
+
+    def write_diagnostic(self, diagnostic, fixed=False):
+        region = OrderedDict()
+        region['startLine'] = diagnostic.position[0] + 1
+        region['startColumn'] = diagnostic.position[1] + 1
+        location = OrderedDict()
+        location['artifactLocation'] = OrderedDict([('uri', diagnostic.path)])
+        location['region'] = region
+        result = OrderedDict()
+        result['ruleId'] = diagnostic.rule or PARSE_ERROR_RULE
+        result['level'] = 'error'
+        result['message'] = OrderedDict([('text', diagnostic.msg)])
+        result['locations'] = [OrderedDict([('physicalLocation', location)])]
+        if fixed:
+            result['baselineState'] = 'absent'
+
+        self.write(('\n' if self.first else ',\n') + json.dumps(result))
+        self.first = False
+
+    def write_fixed_diagnostic(self, diagnostic):
+        self.write_diagnostic(diagnostic, fixed=True)
+
+    def end(self):
+        self.write('\n]' + self.tail + '\n')
+        Formatter.end(self)
+
+# name -> formatter class
+FORMATTERS = OrderedDict([
+    ('text', TextFormatter),
+    ('jsonl', JsonLinesFormatter),
+    ('sarif', SarifFormatter),
+])
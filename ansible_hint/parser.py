@@ -1,8 +1,16 @@
 # -*- coding: utf-8 -*-
 
 from __future__ import division, absolute_import, print_function, unicode_literals
+import copy
+import io
 import json
+import marshal
+import re
+import zlib
 from collections import OrderedDict
+from timeit import default_timer
+from ansible_hint.lines import LineTable
+from ansible_hint.prescan import PreScan
 
 
 class UnicodeRepr(object):
@@ -18,11 +26,79 @@ class ParseError(Exception, UnicodeRepr):
         self.position = position
         self.msg = msg
 
+    def __reduce__(self):
+        # NOTE: errors are sent back from file workers
+        return (type(self), (self.position, self.msg))
+
     def __unicode__(self):
         return '({}, {}): {}'.format(
                 self.position[0] + 1, self.position[1] + 1, self.msg)
 
 
+class ParseBudgetExceeded(ParseError):
+    """ Raised when a parse runs past one of the limits of its ParseBudget """
+    # outermost and innermost decls shown in msg for deep stacks
+    STACK_ENDS = 3
+
+    def __init__(self, position, msg, decl_stack):
+        stack = decl_stack
+        if len(stack) > 2 * self.STACK_ENDS:
+            stack = stack[:self.STACK_ENDS] + ['...'] + stack[-self.STACK_ENDS:]
+        ParseError.__init__(self, position, '{} in {}'.format(msg, ' > '.join(stack)))
+        self.limit_msg = msg
+        self.decl_stack = decl_stack
+
+    def __reduce__(self):
+        # NOTE: errors are sent back from document workers
+        return (type(self), (self.position, self.limit_msg, self.decl_stack))
+
+
+class ParseCancelled(ParseError):
+    """ Raised when the cancel event of a parse's ParseBudget is set """
+
+
+class ParseBudget(object):
+    """
+    Per-parse limits on Decl evaluations (steps), wall time in seconds and
+    Decl nesting depth.  None means no limit.
+
+    cancel, if set, is an object such as a threading.Event whose is_set()
+    returns true once the parse should stop; it is checked with the clock.
+
+    A file whose parts are parsed separately is parsed within a budget
+    from for_file(), so that the limits hold for the file as a whole.
+    """
+    # steps between checks of the clock
+    TIME_CHECK_STEPS = 1024
+
+    def __init__(self, max_steps=None, max_time=None, max_depth=None, cancel=None):
+        self.max_steps = max_steps
+        self.max_time = max_time
+        self.max_depth = max_depth
+        self.cancel = cancel
+        # default_timer() time at which parses end, instead of max_time after they start
+        self.deadline = None
+        # steps already taken by earlier parts of the file, which a parse starts from
+        self.spent_steps = 0
+
+    def for_file(self):
+        """
+        Returns a copy of this budget for the parts of one file: they share
+        the deadline max_time from now, and the caller adds the steps of each
+        part to spent_steps
+        """
+        budget = copy.copy(self)
+        if self.max_time is not None:
+            budget.deadline = default_timer() + self.max_time
+        return budget
+
+    def __getstate__(self):
+        # NOTE: the budget is sent to workers, but an event cannot be
+        state = dict(self.__dict__)
+        state['cancel'] = None
+        return state
+
+
 class AstNode(UnicodeRepr):
     def __init__(self, name, text, pos, *children):
         self.name = name
@@ -47,6 +123,9 @@ class AstNode(UnicodeRepr):
 
 
 class AstResult(UnicodeRepr):
+    # CommentTable of a complete parse, if comments were collected
+    comments = None
+
     def __init__(self, value=True):
         if isinstance(value, list):
             self._state = True
@@ -81,19 +160,104 @@ class AstResult(UnicodeRepr):
         return self._data
 
 
+class ChoicePoint(object):
+    """ An open backtrack point; cut is set once a Cut commits to it """
+    __slots__ = ('pos', 'cut')
+
+    def __init__(self, pos):
+        self.pos = pos
+        self.cut = False
+
+
+class ParseState(object):
+    """ Per-parse state shared by a ParseCtx and all of its clones """
+    def __init__(self, memoize=False, budget=None):
+        self.memo = {} if memoize else None
+        self.choices = []
+        self.commit_pos = 0
+        self.first_line = 0
+        self.lines = None
+        self.prescan = None
+        self.tokens = None
+        self.steps = budget.spent_steps if budget is not None else 0
+        self.decl_stack = []
+        # (start offset, node) of the nodes built since the last release of
+        # the input, when released text is dropped from nodes
+        self.nodes = None
+        self.deadline = None
+        if budget is not None and budget.deadline is not None:
+            self.deadline = budget.deadline
+        elif budget is not None and budget.max_time is not None:
+            self.deadline = default_timer() + budget.max_time
+
+
 class ParseCtx(object):
-    def __init__(self, declarations=None):
+    def __init__(self, declarations=None, memoize=False, budget=None, tracer=None):
+        """ tracer.evaluate(ctx, decl) is called before each Decl is evaluated """
+        self.memoize = memoize
+        if tracer is not None and budget is None:
+            # the tracer hooks into the budget's step accounting
+            budget = ParseBudget()
+        self.budget = budget
+        self.tracer = tracer
         self.reset('')
-        self.declarations = {}
-        if declarations is not None:
-            for decl in declarations:
-                self.add_decl(decl)
-
-    def reset(self, text):
+        if isinstance(declarations, Grammar):
+            # NOTE: shared by every ctx of the grammar; add_decl() copies it first
+            self.declarations = declarations.decl_map
+            # NOTE: a tracer sees every evaluation, so nothing is skipped
+            self.scans = declarations.scans() if tracer is None else {}
+            self.lexer = declarations.lexer()
+        else:
+            declarations = list(declarations or ())
+            self.declarations = dict((decl.name, decl) for decl in declarations)
+            self.scans = {}
+            self.lexer = None
+            if any(isinstance(decl, TokenDecl) for decl in declarations):
+                # NOTE: deferred because the lexer imports the productions below
+                from ansible_hint.lexer import build_lexer
+                self.lexer = build_lexer(declarations)
+
+    def reset(self, text, line=0):
         self.text = text
         self.pos = 0
         self.col = 0
-        self.line = 0
+        self.line = line
+        self.indents = (-1,)
+        self.side_table = None
+        self.state = ParseState(self.memoize, self.budget)
+        self.state.first_line = line
+
+    def line_table(self):
+        """ Returns the LineTable for text, built on first use """
+        state = self.state
+        if state.lines is None:
+            state.lines = LineTable(self.text, self.prescan())
+        return state.lines
+
+    def prescan(self):
+        """ Returns the PreScan of text, built on first use """
+        state = self.state
+        if state.prescan is None:
+            state.prescan = PreScan(self.text)
+        return state.prescan
+
+    def tokens(self):
+        """ Returns the TokenTable of text, built on first use """
+        tokens = self.state.tokens
+        if tokens is None or tokens.lexer is not self.lexer or tokens.text is not self.text:
+            tokens = self.state.tokens = self.lexer.tokenize(self.text)
+        return tokens
+
+    def token_end(self, name):
+        """ Returns the end of the name token at the current offset, or None if there is none """
+        kind = self.lexer.kinds.get(name) if self.lexer is not None else None
+        if kind is None:
+            return None
+        return self.tokens().end(kind, self.pos)
+
+    def line_index(self):
+        """ Returns the current line as an index into line_table() """
+        return self.line - self.state.first_line
 
     def eof(self, num=1):
         end = self.pos + num - 1
@@ -116,8 +280,19 @@ class ParseCtx(object):
         self.pos = end
         return next_text
 
+    def skip_to(self, end):
+        """ Consumes the text up to offset end, like next() without returning it """
+        text = self.text
+        newline = text.rfind('\n', self.pos, end)
+        if newline == -1:
+            self.col += end - self.pos
+        else:
+            self.line += text.count('\n', self.pos, end)
+            self.col = end - newline - 1
+        self.pos = end
+
     def clone(self):
-        other = ParseCtx()
+        other = type(self).__new__(type(self))
         other.update(self)
         return other
 
@@ -126,27 +301,334 @@ class ParseCtx(object):
         self.pos = other.pos
         self.line = other.line
         self.col = other.col
+        self.indents = other.indents
+        self.side_table = other.side_table
         self.declarations = other.declarations
+        self.scans = other.scans
+        self.lexer = other.lexer
+        self.memoize = other.memoize
+        self.budget = other.budget
+        self.tracer = other.tracer
+        self.state = other.state
 
     def position(self):
         return (self.line, self.col)
 
+    def indent(self):
+        return self.indents[-1]
+
+    def push_indent(self, col):
+        # NOTE: indents is immutable so that clone()/update() restore it on backtrack
+        self.indents = self.indents + (col,)
+
+    def pop_indent(self):
+        self.indents = self.indents[:-1]
+
+    def add_side_entry(self, offset, text):
+        # NOTE: a linked list of (offset, text, rest), so that entries added
+        # by a failed alternative are dropped on backtrack like indents
+        self.side_table = (offset, text, self.side_table)
+
+    def side_entries(self, until=None):
+        """ Returns the side table entries added since until, by offset """
+        result = []
+        entry = self.side_table
+        while entry is not until:
+            result.append(entry[:2])
+            entry = entry[2]
+        result.reverse()
+        return result
+
+    def push_choice(self):
+        point = ChoicePoint(self.pos)
+        self.state.choices.append(point)
+        return point
+
+    def pop_choice(self):
+        self.state.choices.pop()
+
+    def cut(self):
+        """ Commits the innermost open choice and prunes state behind it """
+        choices = self.state.choices
+        if choices:
+            choices[-1].cut = True
+        self.commit()
+
+    def commit(self):
+        # nothing before the outermost uncut choice can be evaluated again
+        floor = self.pos
+        for point in self.state.choices:
+            if not point.cut:
+                floor = point.pos
+                break
+        if floor <= self.state.commit_pos:
+            return
+        self.state.commit_pos = floor
+        memo = self.state.memo
+        if memo:
+            for pos in [x for x in memo if x < floor]:
+                del memo[pos]
+
+    def budget_evaluate(self, decl, fn):
+        """ Evaluates fn(ctx) for decl as one step of the parse budget """
+        state = self.state
+        budget = self.budget
+        state.steps += 1
+        stack = state.decl_stack
+        stack.append(decl.name)
+        if budget.max_steps is not None and state.steps > budget.max_steps:
+            self.exceed('Parse step budget of {} exceeded'.format(budget.max_steps))
+        if budget.max_depth is not None and len(stack) > budget.max_depth:
+            self.exceed('Parse depth budget of {} exceeded'.format(budget.max_depth))
+        if not state.steps % budget.TIME_CHECK_STEPS:
+            if state.deadline is not None and default_timer() > state.deadline:
+                self.exceed('Parse time budget of {}s exceeded'.format(budget.max_time))
+            if budget.cancel is not None and budget.cancel.is_set():
+                raise ParseCancelled(self.position(), 'Parse cancelled')
+        if self.tracer is not None:
+            self.tracer.evaluate(self, decl)
+        if self.memoize:
+            result = self.memo_evaluate(decl, fn)
+        else:
+            result = fn(self)
+        stack.pop()
+        return result
+
+    def exceed(self, msg):
+        raise ParseBudgetExceeded(self.position(), msg, list(self.state.decl_stack))
+
+    def memo_evaluate(self, prod, fn):
+        """ Evaluates fn(ctx) for prod, reusing the result at this position """
+        state = self.state
+        key = (prod, self.indents)
+        entries = state.memo.get(self.pos)
+        if entries is not None and key in entries:
+            items, end, did_cut, side_entries = entries[key]
+            if end is None:
+                return AstResult(False)
+            side_table = self.side_table
+            self.update(end)
+            # the end ctx may have been reached with different earlier entries
+            self.side_table = side_table
+            for offset, text in side_entries:
+                self.add_side_entry(offset, text)
+            if did_cut:
+                self.cut()
+            return AstResult(list(items))
+
+        start = self.pos
+        side_table = self.side_table
+        point = state.choices[-1] if state.choices else None
+        was_cut = point is not None and point.cut
+        result = fn(self)
+        if start < state.commit_pos:
+            return result
+        did_cut = point is not None and point.cut and not was_cut
+        if result:
+            entry = (list(result.items), self.clone(), did_cut, self.side_entries(side_table))
+        else:
+            entry = (None, None, did_cut, None)
+        state.memo.setdefault(start, {})[key] = entry
+        return result
+
     def get_decl(self, name):
         return self.declarations[name]
 
     def add_decl(self, decl):
+        self.declarations = dict(self.declarations)
         self.declarations[decl.name] = decl
+        # the grammar's scans may not hold for the new decl
+        self.scans = {}
+        if self.lexer is not None:
+            self.lexer = self.lexer.with_decl(decl, self.declarations)
+        elif isinstance(decl, TokenDecl):
+            from ansible_hint.lexer import build_lexer
+            self.lexer = build_lexer([decl])
 
     def get_text(self, terminating_ctx):
         start = self.pos
         end = terminating_ctx.pos
         return self.text[start:end]
 
+    def slice(self, start, end):
+        """ Returns the input text from offset start to end """
+        return self.text[start:end]
+
+    def window(self, start, multiline=False):
+        """
+        Returns (text, base): text holds the input from offset start to the
+        end of its line, or of the input if multiline, and base is the
+        offset of text[0]
+        """
+        return self.text, 0
+
+    def skip_spaces(self):
+        """ Consumes the spaces at the current position """
+        if self.col == 0:
+            # leading spaces never include a newline, so skip them without next()
+            num = self.line_table().spaces(self.line_index())
+            self.pos += num
+            self.col += num
+            return
+        end = self.pos
+        while end < len(self.text) and self.text[end] == ' ':
+            end += 1
+        self.next(end - self.pos)
+
+
+class StreamParseCtx(ParseCtx):
+    """
+    A ParseCtx that reads its input from a file-like object of text into a
+    sliding buffer, for inputs larger than memory.
+
+    Offsets and positions are those of the whole input.  Nothing behind
+    the commit point can be evaluated again, so the text before it is
+    released when the buffer is next filled, and so is the text of the
+    nodes that start there; their text is then None, as is the text of a
+    node that started in released text, such as the root of a stream of
+    documents.
+    """
+    def __init__(self, declarations=None, memoize=False, budget=None, tracer=None,
+            chunk_size=65536):
+        self.chunk_size = chunk_size
+        ParseCtx.__init__(self, declarations, memoize, budget, tracer)
+        # NOTE: skipping needs a PreScan of the whole input
+        self.scans = {}
+
+    def reset(self, stream, line=0):
+        """ stream is a file-like object of text, such as from io.open(), or a string """
+        ParseCtx.reset(self, None, line)
+        if isinstance(stream, basestring):
+            stream = io.StringIO(stream)
+        state = self.state
+        state.stream = stream
+        state.chunk_size = self.chunk_size
+        state.buffer = ''
+        # offset of buffer[0] in the input
+        state.base = 0
+        state.done = False
+        state.nodes = []
+
+    def fill(self, end):
+        """ Reads the input up to offset end, or to its end, into the buffer """
+        state = self.state
+        if state.done or end <= state.base + len(state.buffer):
+            return
+        parts = [state.buffer[state.commit_pos - state.base:]]
+        state.base = state.commit_pos
+        self.release_nodes()
+        size = state.base + len(parts[0])
+        while size < end:
+            chunk = state.stream.read(max(state.chunk_size, end - size))
+            if not chunk:
+                state.done = True
+                break
+            parts.append(chunk)
+            size += len(chunk)
+        state.buffer = ''.join(parts)
+
+    def release_nodes(self):
+        """ Drops the text of the nodes that start before the buffer """
+        state = self.state
+        kept = []
+        for start, node in state.nodes:
+            if start < state.base:
+                node.text = None
+            else:
+                kept.append((start, node))
+        state.nodes = kept
+
+    def skip_to(self, end):
+        self.next(end - self.pos)
+
+    def token_end(self, name):
+        """
+        Tokens are matched within the rest of the line, or further while a
+        match runs to the end of the buffer
+        """
+        kind = self.lexer.kinds.get(name) if self.lexer is not None else None
+        if kind is None:
+            return None
+        state = self.state
+        text, base = self.window(self.pos)
+        while True:
+            found = self.lexer.match(text, self.pos - base)
+            if state.done or found is None or found[1] < len(text):
+                break
+            self.fill(base + len(text) + 1)
+            text, base = state.buffer, state.base
+        if found is None or found[0] != kind:
+            return None
+        return found[1] + base
+
+    def eof(self, num=1):
+        end = self.pos + num
+        self.fill(end)
+        return end > self.state.base + len(self.state.buffer)
+
+    def peek(self, num=1):
+        return self.slice(self.pos, self.pos + num)
+
+    def next(self, num=1):
+        end = self.pos + num
+        next_text = self.slice(self.pos, end)
+        for ch in next_text:
+            if ch == '\n':
+                self.line += 1
+                self.col = 0
+            else:
+                self.col += 1
+        self.pos = end
+        return next_text
+
+    def get_text(self, terminating_ctx):
+        return self.slice(self.pos, terminating_ctx.pos)
+
+    def slice(self, start, end):
+        """ Returns the input text from offset start to end, or None if it was released """
+        state = self.state
+        if start < state.base:
+            return None
+        self.fill(end)
+        return state.buffer[start - state.base:end - state.base]
+
+    def window(self, start, multiline=False):
+        state = self.state
+        while not state.done and (multiline or
+                state.buffer.find('\n', start - state.base) == -1):
+            self.fill(state.base + len(state.buffer) + 1)
+        return state.buffer, state.base
+
+    def skip_spaces(self):
+        text, base = self.window(self.pos)
+        end = self.pos - base
+        while end < len(text) and text[end] == ' ':
+            end += 1
+        self.next(end + base - self.pos)
+
 
 class ProductionBase(UnicodeRepr):
+    # set by freeze(); frozen productions can be shared by any number of grammars
+    frozen = False
+
     def __init__(self):
         self.on_fail_msg = None
 
+    def __setattr__(self, name, value):
+        if self.frozen:
+            raise AttributeError('{} is frozen'.format(type(self).__name__))
+        object.__setattr__(self, name, value)
+
+    def freeze(self):
+        """ Makes this production and the productions within it immutable """
+        stack = [self]
+        while stack:
+            prod = stack.pop()
+            if not prod.frozen:
+                stack.extend(x for x in prod.ctor_args() if isinstance(x, ProductionBase))
+                object.__setattr__(prod, 'frozen', True)
+        return self
+
     def eval_impl(self, ctx):
         """ To be overridden """
         return AstResult(False)
@@ -164,6 +646,10 @@ class ProductionBase(UnicodeRepr):
         self.on_fail_msg = msg
         return self  # allow chain call
 
+    def ctor_args(self):
+        """ Constructor arguments that rebuild this production """
+        return ()
+
     def to_unicode(self):
         """ To be overridden """
         return 'ProductionBase()'
@@ -218,6 +704,9 @@ class CharRange(ProductionBase):
             return AstResult(True)
         return AstResult(False)
 
+    def ctor_args(self):
+        return (self.start_ch, self.end_ch)
+
     def to_unicode(self):
         return 'CharRange("{}","{}")'.format(self.start_ch, self.end_ch)
 
@@ -236,6 +725,9 @@ class Literal(ProductionBase):
             return AstResult(True)
         return AstResult(False)
 
+    def ctor_args(self):
+        return (self.text,)
+
     def to_unicode(self):
         return 'Literal("{}")'.format(self.text)
 
@@ -250,11 +742,17 @@ class Negate(ProductionBase):
         if ctx.eof():
             return AstResult(False)
         eval_ctx = ctx.clone()
-        if not self.production.evaluate(eval_ctx):
+        ctx.push_choice()
+        result = self.production.evaluate(eval_ctx)
+        ctx.pop_choice()
+        if not result:
             ctx.next()
             return AstResult(True)
         return AstResult(False)
 
+    def ctor_args(self):
+        return (self.production,)
+
     def to_unicode(self):
         return 'Negate({})'.format(self.production)
 
@@ -268,11 +766,16 @@ class Optional(ProductionBase):
         if ctx.eof():
             return AstResult(True)
         eval_ctx = ctx.clone()
+        point = ctx.push_choice()
         result = self.production.evaluate(eval_ctx)
+        ctx.pop_choice()
         if result:
             ctx.update(eval_ctx)
             return result
-        return AstResult(True)
+        return AstResult(not point.cut)
+
+    def ctor_args(self):
+        return (self.production,)
 
     def to_unicode(self):
         return 'Optional({})'.format(self.production)
@@ -290,6 +793,9 @@ class OneOf(ProductionBase):
                 return AstResult(True)
         return AstResult(False)
 
+    def ctor_args(self):
+        return (self.text,)
+
     def to_unicode(self):
         return 'OneOf("{}")'.format(self.text)
 
@@ -310,6 +816,9 @@ class Sequence(ProductionBase):
         ctx.update(eval_ctx)
         return result
 
+    def ctor_args(self):
+        return tuple(self.items)
+
     def to_unicode(self):
         return 'Sequence({})'.format(','.join(map(unicode, self.items)))
 
@@ -320,14 +829,23 @@ class OrGroup(ProductionBase):
         self.items = items
 
     def eval_impl(self, ctx):
+        point = ctx.push_choice()
         for item in self.items:
+            point.cut = False
             eval_ctx = ctx.clone()
             result = item.evaluate(eval_ctx)
             if result:
+                ctx.pop_choice()
                 ctx.update(eval_ctx)
                 return result
+            if point.cut:
+                break
+        ctx.pop_choice()
         return AstResult(False)
 
+    def ctor_args(self):
+        return tuple(self.items)
+
     def to_unicode(self):
         return 'OrGroup({})'.format(','.join(map(unicode, self.items)))
 
@@ -344,15 +862,24 @@ class OneOrMore(ProductionBase):
         if not result:
             return AstResult(False)
         ctx.update(eval_ctx)
+        point = ctx.push_choice()
         while not ctx.eof():
+            point.pos = ctx.pos
+            point.cut = False
             eval_ctx = eval_ctx.clone()
             eval_result = self.production.evaluate(eval_ctx)
             if not eval_result:
+                if point.cut:
+                    result = AstResult(False)
                 break
             ctx.update(eval_ctx)
             result.combine(eval_result)
+        ctx.pop_choice()
         return result
 
+    def ctor_args(self):
+        return (self.production,)
+
     def to_unicode(self):
         return 'OneOrMore({})'.format(self.production)
 
@@ -365,17 +892,27 @@ class OneOrMoreUntil(ProductionBase):
     def eval_impl(self, ctx):
         if ctx.eof():
             return AstResult(False)
+        point = ctx.push_choice()
+        scan_ctx = ctx.clone()
         eval_ctx = ctx.clone()
-        if self.term.evaluate(eval_ctx):
-            return AstResult(False)
-        while True:
-            ctx.next()
-            eval_ctx = ctx.clone()
+        result = AstResult(not self.term.evaluate(eval_ctx))
+        chars = ctx.scans.get(self)
+        while result:
+            scan_ctx.next()
+            if chars is not None:
+                scan_ctx.skip_to(scan_ctx.prescan().next_of(chars, scan_ctx.pos))
+            point.pos = scan_ctx.pos
+            eval_ctx = scan_ctx.clone()
             if self.term.evaluate(eval_ctx):
+                ctx.update(scan_ctx)
                 break
             elif eval_ctx.eof():
-                return AstResult(False)
-        return AstResult(True)
+                result = AstResult(False)
+        ctx.pop_choice()
+        return result
+
+    def ctor_args(self):
+        return (self.term,)
 
     def to_unicode(self):
         return 'OneOrMoreUntil({})'.format(self.term)
@@ -389,15 +926,24 @@ class ZeroOrMore(ProductionBase):
 
     def eval_impl(self, ctx):
         result = AstResult()
+        point = ctx.push_choice()
         while not ctx.eof():
+            point.pos = ctx.pos
+            point.cut = False
             eval_ctx = ctx.clone()
             eval_result = self.production.evaluate(eval_ctx)
             if not eval_result:
+                if point.cut:
+                    result = AstResult(False)
                 break
             ctx.update(eval_ctx)
             result.combine(eval_result)
+        ctx.pop_choice()
         return result
 
+    def ctor_args(self):
+        return (self.production,)
+
     def to_unicode(self):
         return 'ZeroOrMore({})'.format(self.production)
 
@@ -410,21 +956,39 @@ class ZeroOrMoreUntil(ProductionBase):
     def eval_impl(self, ctx):
         if ctx.eof():
             return AstResult(True)
-        eval_ctx = ctx.clone()
+        point = ctx.push_choice()
+        scan_ctx = ctx.clone()
+        result = AstResult(True)
+        chars = ctx.scans.get(self)
         while True:
+            if chars is not None:
+                scan_ctx.skip_to(scan_ctx.prescan().next_of(chars, scan_ctx.pos))
+                point.pos = scan_ctx.pos
+            eval_ctx = scan_ctx.clone()
             if self.term.evaluate(eval_ctx):
+                ctx.update(scan_ctx)
                 break
             elif eval_ctx.eof():
-                return AstResult(False)
-            ctx.next()
-            eval_ctx = ctx.clone()
-        return AstResult(True)
+                result = AstResult(False)
+                break
+            scan_ctx.next()
+            point.pos = scan_ctx.pos
+        ctx.pop_choice()
+        return result
+
+    def ctor_args(self):
+        return (self.term,)
 
     def to_unicode(self):
         return 'ZeroOrMoreUntil({})'.format(self.term)
 
 
-class Decl(ProductionBase):
+class DeclBase(ProductionBase):
+    """
+    Base class of named declarations.  A decl is evaluated as one step of
+    the parse budget, or through the memo, and subclasses define only
+    eval_decl(), which matches the decl at ctx
+    """
     def __init__(self, name, *sequence_items):
         ProductionBase.__init__(self)
         self.name = name
@@ -434,51 +998,86 @@ class Decl(ProductionBase):
             self.prod = Sequence(*sequence_items)
 
     def eval_impl(self, ctx):
+        if ctx.budget is not None:
+            return ctx.budget_evaluate(self, self.eval_decl)
+        if ctx.memoize:
+            return ctx.memo_evaluate(self, self.eval_decl)
+        return self.eval_decl(ctx)
+
+    def eval_decl(self, ctx):
+        """ To be overridden """
+        return AstResult(False)
+
+    def ctor_args(self):
+        return (self.name, self.prod)
+
+    def to_unicode(self):
+        return '{}("{}", {})'.format(type(self).__name__, self.name, self.prod)
+
+
+class Decl(DeclBase):
+    def eval_decl(self, ctx):
         eval_ctx = ctx.clone()
         eval_result = self.prod.evaluate(eval_ctx)
         if eval_result:
             ast = AstNode(self.name, ctx.get_text(eval_ctx), ctx.position(), *eval_result.items)
+            if ctx.state.nodes is not None:
+                ctx.state.nodes.append((ctx.pos, ast))
             ctx.update(eval_ctx)
             return AstResult(ast)
         return AstResult(False)
 
-    def to_unicode(self):
-        return 'Decl("{}", {})'.format(self.name, self.prod)
-
 
-class UnreportedDecl(ProductionBase):
-    def __init__(self, name, *sequence_items):
-        ProductionBase.__init__(self)
-        self.name = name
-        if len(sequence_items) == 1:
-            self.prod = sequence_items[0]
-        else:
-            self.prod = Sequence(*sequence_items)
-
-    def eval_impl(self, ctx):
+class UnreportedDecl(DeclBase):
+    def eval_decl(self, ctx):
         if self.prod.evaluate(ctx):
             return AstResult(True)
         else:
             return AstResult(False)
 
-    def to_unicode(self):
-        return 'UnreportedDecl("{}", {})'.format(self.name, self.prod)
 
+class ExpandedDecl(DeclBase):
+    def eval_decl(self, ctx):
+        return self.prod.evaluate(ctx)
 
-class ExpandedDecl(ProductionBase):
-    def __init__(self, name, *sequence_items):
-        ProductionBase.__init__(self)
-        self.name = name
-        if len(sequence_items) == 1:
-            self.prod = sequence_items[0]
-        else:
-            self.prod = Sequence(*sequence_items)
 
-    def eval_impl(self, ctx):
-        return self.prod.evaluate(ctx)
+class SideTableDecl(DeclBase):
+    """ records matched text in ctx.side_table instead of building a node """
+    def eval_decl(self, ctx):
+        start = ctx.pos
+        eval_ctx = ctx.clone()
+        if self.prod.evaluate(eval_ctx):
+            ctx.update(eval_ctx)
+            ctx.add_side_entry(start, ctx.slice(start, ctx.pos))
+            return AstResult(True)
+        return AstResult(False)
 
-    def to_unicode(self):
-        return 'ExpandedDecl("{}", {})'.format(self.name, self.prod)
+
+class TokenDecl(DeclBase):
+    """
+    matches where the grammar's lexer finds a name token, and builds a
+    node without children; see ansible_hint.lexer
+    """
+    def eval_decl(self, ctx):
+        end = ctx.token_end(self.name)
+        if end is None:
+            return AstResult(False)
+        start = ctx.pos
+        pos = ctx.position()
+        ctx.skip_to(end)
+        ast = AstNode(self.name, ctx.slice(start, end), pos)
+        if ctx.state.nodes is not None:
+            ctx.state.nodes.append((start, ast))
+        return AstResult(ast)
+
+
+class UnreportedTokenDecl(TokenDecl):
+    def eval_decl(self, ctx):
+        end = ctx.token_end(self.name)
+        if end is None:
+            return AstResult(False)
+        ctx.skip_to(end)
+        return AstResult(True)
 
 
 class DeclRef(ProductionBase):
@@ -490,6 +1089,9 @@ class DeclRef(ProductionBase):
         decl = ctx.get_decl(self.name)
         return decl.evaluate(ctx)
 
+    def ctor_args(self):
+        return (self.name,)
+
     def to_unicode(self):
         return 'DeclRef("{}")'.format(self.name)
 
@@ -499,15 +1101,33 @@ class Lookahead(ProductionBase):
         self.item = item
 
     def eval_impl(self, ctx):
-        result = item.evaluate(ctx)
+        ctx.push_choice()
+        result = self.item.evaluate(ctx.clone())
+        ctx.pop_choice()
         if result:
             return AstResult(True)
         else:
             return AstResult(False)
 
+    def ctor_args(self):
+        return (self.item,)
+
     def to_unicode(self):
         return 'Lookahead({})'.format(self.item)
 
+class Cut(ProductionBase):
+    def __init__(self):
+        """ commits the enclosing choice; its other alternatives are not tried """
+        ProductionBase.__init__(self)
+
+    def eval_impl(self, ctx):
+        ctx.cut()
+        return AstResult(True)
+
+    def to_unicode(self):
+        return 'Cut()'
+
+
 class Debug(ProductionBase):
     def __init__(self, msg, item):
         ProductionBase.__init__(self)
@@ -519,9 +1139,12 @@ class Debug(ProductionBase):
         if result:
             print('DEBUG(pass):', self.msg, result.items[0].text)
         else:
-            print('DEBUG(fail):', self.msg, ctx.text[ctx.pos:ctx.pos+10] + '...')
+            print('DEBUG(fail):', self.msg, ctx.peek(10) + '...')
         return result
 
+    def ctor_args(self):
+        return (self.msg, self.item)
+
     def to_unicode(self):
         return 'Debug("{}", {})'.format(self.msg, self.item)
 
@@ -534,16 +1157,271 @@ class Fail(ProductionBase):
     def eval_impl(self, ctx):
         raise ParseError(ctx.position(), self.msg)
 
+    def ctor_args(self):
+        return (self.msg,)
+
     def to_unicode(self):
         return 'Fail("{}")'.format(self.msg)
 
 
+class IndentAtLeast(ProductionBase):
+    def __init__(self, min_indent):
+        """ consumes leading spaces; opens a block at least min_indent deeper """
+        ProductionBase.__init__(self)
+        self.min_indent = min_indent
+
+    def eval_impl(self, ctx):
+        eval_ctx = ctx.clone()
+        eval_ctx.skip_spaces()
+        if eval_ctx.col < ctx.indent() + self.min_indent:
+            return AstResult(False)
+        ctx.update(eval_ctx)
+        ctx.push_indent(ctx.col)
+        return AstResult(True)
+
+    def ctor_args(self):
+        return (self.min_indent,)
+
+    def to_unicode(self):
+        return 'IndentAtLeast({})'.format(self.min_indent)
+
+
+class Indent(IndentAtLeast):
+    def __init__(self):
+        """ consumes leading spaces; opens a block deeper than the current one """
+        IndentAtLeast.__init__(self, 1)
+
+    def ctor_args(self):
+        return ()
+
+    def to_unicode(self):
+        return 'Indent()'
+
+
+class SameIndent(ProductionBase):
+    def __init__(self):
+        """ consumes leading spaces; matches the indent of the current block """
+        ProductionBase.__init__(self)
+
+    def eval_impl(self, ctx):
+        eval_ctx = ctx.clone()
+        eval_ctx.skip_spaces()
+        if eval_ctx.col != ctx.indent():
+            return AstResult(False)
+        ctx.update(eval_ctx)
+        return AstResult(True)
+
+    def to_unicode(self):
+        return 'SameIndent()'
+
+
+class Dedent(ProductionBase):
+    def __init__(self):
+        """ closes the current block without consuming input """
+        ProductionBase.__init__(self)
+
+    def eval_impl(self, ctx):
+        if len(ctx.indents) == 1:
+            return AstResult(False)
+        ctx.pop_indent()
+        return AstResult(True)
+
+    def to_unicode(self):
+        return 'Dedent()'
+
+
+# opening delimiter -> (closing delimiter, node name)
+JINJA_DELIMITERS = {
+    '{{': ('}}', 'jinja_expression'),
+    '{%': ('%}', 'jinja_statement'),
+    '{#': ('#}', 'jinja_comment'),
+}
+
+# names of the nodes that Jinja builds
+JINJA_NODES = frozenset(name for close, name in JINJA_DELIMITERS.values())
+
+JINJA_BRACKETS = {'(': ')', '[': ']', '{': '}'}
+
+# characters that can change the scanner state inside a Jinja tag
+JINJA_SPECIAL = re.compile(r'[\'"()\[\]{}%]')
+
+JINJA_STRING = {
+    "'": re.compile(r"'(?:[^'\\\n]|\\.)*'"),
+    '"': re.compile(r'"(?:[^"\\\n]|\\.)*"'),
+}
+
+
+class Jinja(ProductionBase):
+    def __init__(self, multiline=False):
+        """
+        scans one Jinja2 {{ }}, {% %} or {# #} tag with a hand-written scanner
+        and builds a jinja_expression, jinja_statement or jinja_comment node;
+        an unterminated tag is a ParseError
+        """
+        ProductionBase.__init__(self)
+        self.multiline = multiline
+
+    def eval_impl(self, ctx):
+        delimiter = JINJA_DELIMITERS.get(ctx.peek(2))
+        if delimiter is None:
+            return AstResult(False)
+        close, name = delimiter
+        end = self.scan(ctx, ctx.pos + 2, close)
+        start = ctx.pos
+        pos = ctx.position()
+        ast = AstNode(name, ctx.next(end - start), pos)
+        if ctx.state.nodes is not None:
+            ctx.state.nodes.append((start, ast))
+        return AstResult(ast)
+
+    def scan(self, ctx, index, close):
+        """ Returns the offset just past the close delimiter """
+        text, base = ctx.window(index, self.multiline)
+        return self.scan_text(ctx, text, base, index - base, close) + base
+
+    def scan_text(self, ctx, text, base, index, close):
+        # NOTE: indexes are into text, which starts at offset base of the input
+        limit = len(text)
+        if not self.multiline:
+            newline = text.find('\n', index)
+            if newline != -1:
+                limit = newline
+        if close == '#}':
+            end = text.find(close, index, limit)
+            if end == -1:
+                self.error(ctx, ctx.pos, 'Unterminated Jinja comment, expected "#}"')
+            return end + 2
+
+        brackets = []
+        while True:
+            match = JINJA_SPECIAL.search(text, index, limit)
+            if match is None:
+                self.error(ctx, ctx.pos,
+                        'Unterminated Jinja expression, expected "{}"'.format(close))
+            index = match.start()
+            ch = match.group()
+            if ch in JINJA_STRING:
+                string = JINJA_STRING[ch].match(text, index, limit)
+                if string is None:
+                    self.error(ctx, index + base, 'Unterminated string in Jinja expression')
+                index = string.end()
+                continue
+            if not brackets and text.startswith(close, index):
+                return index + 2
+            if ch in JINJA_BRACKETS:
+                brackets.append((JINJA_BRACKETS[ch], index))
+            elif ch in ')]}':
+                if not brackets or brackets[-1][0] != ch:
+                    if brackets:
+                        self.error(ctx, brackets[-1][1] + base,
+                                'Unclosed "{}" in Jinja expression'.format(text[brackets[-1][1]]))
+                    self.error(ctx, index + base, 'Unexpected "{}" in Jinja expression'.format(ch))
+                brackets.pop()
+            index += 1
+
+    def error(self, ctx, offset, msg):
+        error_ctx = ctx.clone()
+        error_ctx.next(offset - ctx.pos)
+        raise ParseError(error_ctx.position(), msg)
+
+    def ctor_args(self):
+        if self.multiline:
+            return (self.multiline,)
+        return ()
+
+    def to_unicode(self):
+        if self.multiline:
+            return 'Jinja(True)'
+        return 'Jinja()'
+
+
+# production classes by their index in the serialized form of a Grammar;
+# NOTE: append new classes, or serialized grammars stop loading
+PRODUCTION_TYPES = [Eof, Any, CharRange, Literal, Negate, Optional, OneOf, Sequence, OrGroup,
+    OneOrMore, OneOrMoreUntil, ZeroOrMore, ZeroOrMoreUntil, Decl, UnreportedDecl,
+    ExpandedDecl, SideTableDecl, DeclRef, Lookahead, Cut, Debug, Fail, IndentAtLeast, Indent,
+    SameIndent, Dedent, Jinja, TokenDecl, UnreportedTokenDecl]
+
+PRODUCTION_TYPE_INDEX = dict((x, index) for index, x in enumerate(PRODUCTION_TYPES))
+
+
+def _encode_production(prod):
+    # (type index, on_fail message, constructor args...), with productions nested
+    return (PRODUCTION_TYPE_INDEX[type(prod)], prod.on_fail_msg) + tuple(
+            _encode_production(x) if isinstance(x, ProductionBase) else x
+            for x in prod.ctor_args())
+
+
+def _decode_production(data):
+    args = [_decode_production(x) if isinstance(x, tuple) else x for x in data[2:]]
+    prod = PRODUCTION_TYPES[data[0]](*args)
+    if data[1] is not None:
+        prod.on_fail(data[1])
+    return prod
+
+
+def _load_grammar_data(data):
+    return Grammar.loads(data)
+
+
+class Grammar(tuple):
+    """
+    An immutable sequence of frozen decls, with the start decl first.
+
+    The decl map is built once and shared by every ParseCtx.  A Grammar
+    pickles to its compact serialized form, so it can be sent to worker
+    processes, including spawn and forkserver pools, in one message.
+    """
+    def __new__(cls, decls):
+        self = tuple.__new__(cls, [decl.freeze() for decl in decls])
+        self.decl_map = dict((decl.name, decl) for decl in self)
+        return self
+
+    def scans(self):
+        """
+        Returns {repetition: chars} for the OneOrMoreUntil and ZeroOrMoreUntil
+        productions that can skip to the next of chars, built on first use
+        """
+        scans = self.__dict__.get('_scans')
+        if scans is None:
+            # NOTE: deferred because the analyzer imports the productions above
+            from ansible_hint.analysis import GrammarAnalyzer
+            scans = self._scans = GrammarAnalyzer(self).scans()
+        return scans
+
+    def lexer(self):
+        """ Returns the Lexer of the grammar's tokens, or None if there are none """
+        if '_lexer' not in self.__dict__:
+            # NOTE: deferred because the lexer imports the productions above
+            from ansible_hint.lexer import build_lexer
+            self._lexer = build_lexer(self)
+        return self._lexer
+
+    def dumps(self):
+        """ Returns the serialized form: compressed, marshalled nested tuples """
+        return zlib.compress(marshal.dumps(tuple(_encode_production(x) for x in self)))
+
+    @staticmethod
+    def loads(data):
+        return Grammar(_decode_production(x) for x in marshal.loads(zlib.decompress(data)))
+
+    def __reduce__(self):
+        return _load_grammar_data, (self.dumps(),)
+
+
 class BasicParser(UnicodeRepr):
-    def __init__(self, decls):
-        self.decls = decls
+    def __init__(self, decls, memoize=False, strict=False, budget=None, tracer=None):
+        """ findings lists grammar problems; if strict, they raise GrammarError """
+        # NOTE: deferred because the analyzer imports the productions above
+        from ansible_hint.analysis import analyze_grammar
+        self.decls = Grammar(decls)
+        self.memoize = memoize
+        self.budget = budget
+        self.tracer = tracer
+        self.findings = analyze_grammar(self.decls, strict)
 
     def parse(self, decl, text):
-        ctx = ParseCtx(self.decls)
+        ctx = ParseCtx(self.decls, self.memoize, self.budget, self.tracer)
         ctx.reset(text)
         return ctx.get_decl(decl).evaluate(ctx)
 
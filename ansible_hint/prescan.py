@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import re
+from array import array
+from bisect import bisect_left
+
+# LineTable flags
+BLANK = 1
+COMMENT = 2
+TABS = 4
+
+# indent, content and trailing whitespace of one line
+LINE = re.compile(r'^([ \t]*)([^\n]*?)([ \t]*)$', re.M)
+
+# texts shorter than this are scanned without NumPy, which costs more to import
+# and to set up than it saves on them
+VECTORIZE_MIN_CHARS = 16384
+
+# the numpy module once imported, or False if it is not installed
+_numpy = None
+
+
+def load_numpy():
+    """ Returns the numpy module, or None if it is not installed """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy or None
+
+
+class PreScan(object):
+    """
+    Line starts, indent widths and the positions of structural characters
+    of a text, each found in one pass so that the parser and rules can jump
+    straight to them.
+
+    The passes are vectorized with NumPy when it is installed and vectorized
+    is true, which it is by default for long texts.  Otherwise they use
+    regular expressions, with identical results.
+    """
+    def __init__(self, text, vectorized=None):
+        self.text = text
+        if vectorized is None:
+            vectorized = len(text) >= VECTORIZE_MIN_CHARS
+        self.numpy = load_numpy() if vectorized else None
+        self._codes = None
+        # chars -> positions
+        self._positions = {}
+
+    def codes(self):
+        """ Returns the text as a NumPy array of code points """
+        if self._codes is None:
+            self._codes = self.numpy.frombuffer(self.text.encode('utf-32-le'), dtype='<u4')
+        return self._codes
+
+    def positions(self, chars):
+        """ Returns the offsets of all characters in chars, in order """
+        result = self._positions.get(chars)
+        if result is None:
+            if self.numpy is not None:
+                np = self.numpy
+                found = np.flatnonzero(np.in1d(self.codes(), [ord(ch) for ch in chars]))
+                result = array(b'l', found.tolist())
+            else:
+                pattern = re.compile('[{}]'.format(re.escape(chars)))
+                result = array(b'l', [match.start() for match in pattern.finditer(self.text)])
+            self._positions[chars] = result
+        return result
+
+    def next_of(self, chars, offset):
+        """ Returns the offset of the first character in chars at or after offset, or the end """
+        positions = self.positions(chars)
+        index = bisect_left(positions, offset)
+        return positions[index] if index < len(positions) else len(self.text)
+
+    def lines(self):
+        """
+        Returns arrays of the start, end, indent width, content end column
+        and flags of each line, as LineTable holds them
+        """
+        if self.numpy is not None:
+            return self._vectorized_lines()
+        starts, ends, indents, content_ends = [array(b'l') for _ in range(4)]
+        flags = array(b'B')
+        for match in LINE.finditer(self.text):
+            start = match.start()
+            content = match.group(2)
+            flag = 0
+            if not content:
+                flag |= BLANK
+            elif content[0] == '#':
+                flag |= COMMENT
+            if '\t' in match.group(1):
+                flag |= TABS
+            starts.append(start)
+            ends.append(match.end())
+            indents.append(match.end(1) - start)
+            content_ends.append(match.end(2) - start)
+            flags.append(flag)
+        return starts, ends, indents, content_ends, flags
+
+    def _vectorized_lines(self):
+        np = self.numpy
+        codes = self.codes()
+        size = len(codes)
+        newlines = np.flatnonzero(codes == 10)
+        starts = np.concatenate(([0], newlines + 1))
+        ends = np.concatenate((newlines, [size]))
+
+        blanks = (codes == 32) | (codes == 9)
+        # the first character after the indent; the newline or end of a blank line
+        nonblank = np.append(np.flatnonzero(~blanks), size)
+        firsts = nonblank[np.searchsorted(nonblank, starts)]
+        # the last content character, or the start of a blank line
+        content = np.flatnonzero(~blanks & (codes != 10))
+        lasts = np.searchsorted(content, ends) - 1
+        lasts = np.where(lasts >= 0, content[np.maximum(lasts, 0)] if len(content) else -1, -1)
+        content_ends = np.maximum(lasts + 1, firsts)
+
+        blank_lines = firsts == ends
+        flags = np.where(blank_lines, BLANK, 0)
+        first_codes = np.append(codes, 0)[firsts]
+        flags |= np.where(~blank_lines & (first_codes == 35), COMMENT, 0)
+        tabs = np.append(np.flatnonzero(codes == 9), size)
+        flags |= np.where(tabs[np.searchsorted(tabs, starts)] < firsts, TABS, 0)
+        return (array(b'l', starts.tolist()), array(b'l', ends.tolist()),
+                array(b'l', (firsts - starts).tolist()),
+                array(b'l', (content_ends - starts).tolist()), array(b'B', flags.tolist()))
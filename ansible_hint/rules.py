@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from collections import OrderedDict
+from timeit import default_timer
+from ansible_hint.parser import UnicodeRepr
+
+
+class Diagnostic(UnicodeRepr):
+    def __init__(self, path, position, msg, rule=None):
+        self.path = path
+        self.position = position
+        self.msg = msg
+        self.rule = rule
+
+    def __unicode__(self):
+        result = '{}:{}:{}: {}'.format(
+                self.path, self.position[0] + 1, self.position[1] + 1, self.msg)
+        if self.rule is not None:
+            result += ' [{}]'.format(self.rule)
+        return result
+
+
+class Rule(object):
+    """
+    Base class for lint rules.
+
+    Rules receive nodes through methods named visit_<node name>, which are
+    called with the node in document order.  begin() is called before each
+    file is walked, with the file's LineTable in self.lines.  Nodes that a
+    rule reads from node.children without visiting them must be listed in
+    requires, or they may not be built.
+
+    Rules that set uses_comments get the file's CommentTable in
+    self.comments; comments are then not built as tree nodes.
+
+    When a whole project is linted, self.graph is its DependencyGraph, in
+    which the files that this file references are already parsed;
+    otherwise it is None.
+    """
+    name = None
+    requires = ()
+    uses_comments = False
+
+    def begin(self, path):
+        pass
+
+    def report(self, node, msg):
+        self.report_at(node.pos, msg)
+
+    def report_at(self, position, msg):
+        self.diagnostics.append(Diagnostic(self.path, position, msg, self.name))
+
+    def visitors(self):
+        """ Returns a dict of node name -> bound visitor method """
+        result = {}
+        for attr in dir(self):
+            if attr.startswith('visit_'):
+                result[attr[len('visit_'):]] = getattr(self, attr)
+        return result
+
+
+class DisallowMultipleDocuments(Rule):
+    name = 'disallow_multiple_documents'
+
+    def begin(self, path):
+        self.documents = 0
+
+    def visit_document(self, node):
+        self.documents += 1
+        if self.documents == 2:
+            self.report(node, 'Multiple documents in one file')
+
+
+class Indentation(Rule):
+    name = 'indentation'
+    step = 2
+
+    def _check(self, node):
+        if node.pos[1] % self.step:
+            self.report(node, 'Indentation is not a multiple of {}'.format(self.step))
+
+    visit_block_mapping = _check
+    visit_block_sequence = _check
+
+
+class TrailingWhitespace(Rule):
+    name = 'trailing_whitespace'
+
+    def begin(self, path):
+        lines = self.lines
+        for line in range(len(lines)):
+            start, end = lines.trailing(line)
+            if start != end:
+                self.report_at((line, start), 'Trailing whitespace')
+
+
+# name -> rule class
+RULES = OrderedDict((rule.name, rule) for rule in [
+    DisallowMultipleDocuments,
+    Indentation,
+    TrailingWhitespace,
+])
+
+
+class RuleStats(object):
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+
+
+class RuleEngine(object):
+    """
+    Runs a set of rules over parse results in a single walk.
+
+    The dispatch table maps node names to the visitors interested in them,
+    so each node costs one dict lookup no matter how many rules are enabled.
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.dispatch = {}
+        self.stats = OrderedDict()
+        # diagnostics of the file being walked
+        self.diagnostics = None
+        for rule in rules:
+            stats = self.stats[rule.name] = RuleStats()
+            for node_name, fn in rule.visitors().items():
+                self.dispatch.setdefault(node_name, []).append((fn, stats))
+
+    def uses_comments(self):
+        return any(rule.uses_comments for rule in self.rules)
+
+    def node_names(self):
+        """ Returns the names of all nodes that some rule visits or requires """
+        result = set(self.dispatch)
+        for rule in self.rules:
+            result.update(rule.requires)
+        return result
+
+    def run(self, path, ast_result, lines=None, graph=None):
+        """
+        Walks ast_result once, returning the diagnostics from all rules.
+        lines is the LineTable of the parsed text, and graph the project's
+        DependencyGraph, if any.
+        """
+        self.begin(path, ast_result.comments, lines, graph)
+        self.walk(ast_result.items)
+        return self.end()
+
+    def begin(self, path, comments=None, lines=None, graph=None):
+        """ Starts a file whose nodes are then passed to walk(), in document order """
+        self.diagnostics = []
+        for rule in self.rules:
+            rule.path = path
+            rule.diagnostics = self.diagnostics
+            rule.lines = lines
+            rule.comments = comments
+            rule.graph = graph
+            rule.begin(path)
+
+    def walk(self, nodes):
+        """ Dispatches nodes and all their descendants to the rules """
+        dispatch = self.dispatch
+        stack = list(reversed(nodes))
+        while stack:
+            node = stack.pop()
+            for fn, stats in dispatch.get(node.name, ()):
+                start = default_timer()
+                fn(node)
+                stats.time += default_timer() - start
+                stats.calls += 1
+            stack.extend(reversed(node.children))
+
+    def end(self):
+        """ Returns the diagnostics of the file, in order """
+        diagnostics = self.diagnostics
+        self.diagnostics = None
+        diagnostics.sort(key=lambda x: x.position)
+        return diagnostics
+
+    def format_stats(self):
+        lines = ['{:<32} {:>10} {:>10}'.format('rule', 'calls', 'seconds')]
+        for name, stats in self.stats.items():
+            lines.append('{:<32} {:>10} {:>10.4f}'.format(name, stats.calls, stats.time))
+        return '\n'.join(lines)
@@ -0,0 +1,472 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import os
+from timeit import default_timer
+from ansible_hint.parser import AstNode, AstResult, ParseCtx, ParseError, StreamParseCtx
+from ansible_hint.grammar import load_grammar
+from ansible_hint.lines import LineTable
+from ansible_hint.comments import COMMENT_DECLS, CommentTable
+from ansible_hint.rules import Diagnostic, RuleEngine
+from ansible_hint.graph import (REFERENCE_NODES, DependencyGraph, file_references,
+        mentions_reference)
+from ansible_hint.memory import (MemoryLimitExceeded, MemoryTracker, format_size,
+        projected_memory, projected_stream_memory)
+from ansible_hint.metrics import RunMetrics, count_cache
+
+# characters that parse_stream() reads at a time
+STREAM_CHUNK_SIZE = 65536
+
+
+def parse_text(decls, decl, text, line=0, budget=None, memoize=False):
+    """ Parses all of text from decl, returning (result, error) """
+    ctx = ParseCtx(decls, memoize, budget)
+    ctx.reset(text, line)
+    return _parse(ctx, decl)
+
+
+def parse_part(decls, decl, text, line, budget, memoize=False):
+    """
+    Parses text, a part of a file, as parse_text() does, within budget, a
+    ParseBudget.for_file() budget of the whole file, if not None; adds the
+    steps that the parse takes to budget.spent_steps
+    """
+    ctx = ParseCtx(decls, memoize, budget)
+    ctx.reset(text, line)
+    try:
+        return _parse(ctx, decl)
+    finally:
+        if budget is not None:
+            budget.spent_steps = ctx.state.steps
+
+
+def parse_stream(decls, decl, stream, line=0, budget=None, chunk_size=STREAM_CHUNK_SIZE,
+        memoize=False):
+    """
+    Parses all of the text read from the file-like object stream, as
+    parse_text() does, holding only the text after the last commit point
+    in memory
+    """
+    ctx = StreamParseCtx(decls, memoize, budget, chunk_size=chunk_size)
+    ctx.reset(stream, line)
+    return _parse(ctx, decl)
+
+
+def _parse(ctx, decl):
+    try:
+        result = ctx.get_decl(decl).evaluate(ctx)
+    except ParseError as e:
+        return AstResult(False), e
+    if not result:
+        return result, ParseError(ctx.position(), 'Syntax Error')
+    if not ctx.eof():
+        return result, ParseError(ctx.position(), 'Unexpected text')
+    result.comments = CommentTable(ctx.side_entries())
+    return result, None
+
+
+def read_error(e):
+    """ Returns the message of the diagnostic for e, an error reading a file """
+    if isinstance(e, UnicodeDecodeError):
+        return 'Cannot decode file as UTF-8: {} at byte {}'.format(e.reason, e.start)
+    return 'Cannot read file: {}'.format(e.strerror or e)
+
+
+# LintRunner of a file worker process, created by _init_file_worker()
+_worker_runner = None
+
+
+def _init_file_worker(args):
+    global _worker_runner
+    _worker_runner = LintRunner(*args)
+
+
+def _worker_result(path, value):
+    # value with the memory and metrics measured for path, which this process then forgets
+    memory, metrics = _worker_runner.memory, _worker_runner.metrics
+    return (value, memory.files.pop(path, None) if memory is not None else None,
+            metrics.pop(path, _worker_runner.engine) if metrics is not None else None)
+
+
+def _lint_file_worker(path):
+    # NOTE: module-level so that it can be sent to pool workers
+    return _worker_result(path, _worker_runner.lint_file(path))
+
+
+def _parse_file_worker(path):
+    return _worker_result(path, _worker_runner.parse_file(path))
+
+
+class LintRunner(object):
+    def __init__(self, grammar, decl=None, document_workers=0, rules=(), prune=True,
+            comments=False, budget=None, jobs=0, project=False, decls=None, max_memory=None,
+            memory_report=False, metrics=False, memoize=False, stream=False):
+        """
+        With jobs > 1, files are linted on that many worker processes, and
+        document_workers is not used.  Rule stats only cover this process.
+
+        With max_memory, a file projected to need more than max_memory bytes
+        is streamed by lint_file(), and text given to lint_text() is linted
+        one document at a time, dropping each document's tree once the rules
+        have walked it; either is skipped with a diagnostic if even that
+        does not fit.  With memory_report, self.memory is a
+        MemoryTracker of each file's phases.  With metrics, self.metrics is
+        the RunMetrics of the run, which began when the runner was created.
+
+        With memoize, each file is parsed with a packrat memo, which keeps
+        backtracking linear; the cuts of the grammar bound its size.
+
+        With stream, lint_file() parses each file from a StreamParseCtx, so
+        only the text after the last cut of the grammar is in memory, and
+        nodes behind it have no text.
+
+        With project, the trees keep the nodes that name included files and
+        roles, for lint_project().  Without it, the graph methods parse each
+        file that mentions a reference key a second time, with only those
+        nodes; see references().
+
+        decls is the Grammar to parse with when it is already loaded, as it
+        is in file workers; it must match grammar and the other options.
+        """
+        self.metrics = RunMetrics() if metrics else None
+        self.grammar = grammar
+        self.budget = budget
+        self.memoize = memoize
+        self.stream = stream
+        self.project = project
+        self.engine = RuleEngine(rules)
+        self.jobs = jobs
+        self._file_pool = None
+        self.max_memory = max_memory
+        self.memory = MemoryTracker() if memory_report else None
+        # DependencyGraph of the last lint_project()
+        self.graph = None
+
+        # collect comments in a side table rather than as tree nodes
+        self.side_table = COMMENT_DECLS if comments or self.engine.uses_comments() else ()
+
+        # only build the nodes that the enabled rules look at
+        self.keep = self.engine.node_names() if prune else None
+        if project and self.keep is not None:
+            self.keep.update(REFERENCE_NODES)
+        if decl is not None and self.keep is not None:
+            self.keep.add(decl)
+        start = default_timer()
+        self.decls = decls if decls is not None else load_grammar(grammar, self.keep,
+                self.side_table)
+        if self.metrics is not None:
+            self.metrics.add(None, 'grammar', default_timer() - start)
+        if decl is None:
+            decl = self.decls[0].name
+        self.decl = decl
+        # NOTE: the Grammar pickles compactly, so workers need not load it again
+        self.worker_args = (grammar, decl, 0, rules, prune, comments, budget, 0, project,
+                self.decls, max_memory, memory_report, metrics, memoize, stream)
+        self.document_workers = document_workers
+        self._pool = None
+
+    def _get_pool(self):
+        if self._pool is None and self.document_workers > 1:
+            from multiprocessing import Pool
+            self._pool = Pool(self.document_workers)
+        return self._pool
+
+    def _get_file_pool(self):
+        if self._file_pool is None:
+            from multiprocessing import Pool
+            self._file_pool = Pool(self.jobs, _init_file_worker, (self.worker_args,))
+        return self._file_pool
+
+    def close(self):
+        for pool in [self._pool, self._file_pool]:
+            if pool is not None:
+                pool.close()
+                pool.join()
+        self._pool = None
+        self._file_pool = None
+
+    def parse(self, text, budget=None):
+        """ Returns (result, error) for text, parsed within budget if given, else self.budget """
+        budget = self.budget if budget is None else budget
+        if self.document_workers and self.grammar == 'yaml':
+            from ansible_hint.yaml import parse_documents
+            return parse_documents(self.grammar, self.decl, text, self._get_pool(), self.keep,
+                    self.side_table, budget, self.memoize)
+        return parse_text(self.decls, self.decl, text, budget=budget, memoize=self.memoize)
+
+    def _measure(self, path, phase, fn, *args):
+        # fn(*args), adding the memory it allocates and the time it takes to phase
+        # if they are tracked
+        memory, metrics = self.memory, self.metrics
+        if memory is None and metrics is None:
+            return fn(*args)
+        if memory is not None:
+            memory.begin()
+        start = default_timer()
+        try:
+            return fn(*args)
+        finally:
+            if metrics is not None:
+                metrics.add(path, phase, default_timer() - start)
+            if memory is not None:
+                memory.end(path, phase)
+
+    def _read(self, path):
+        with io.open(path, encoding='utf-8') as f:
+            text = f.read()
+            if self.metrics is not None:
+                self.metrics.add_bytes(path, os.fstat(f.fileno()).st_size)
+        return text
+
+    def projected_memory(self, size):
+        return projected_memory(size, self.keep is not None)
+
+    def check_memory(self, text, documents=True):
+        """
+        Returns the document chunks of text, as split_documents() returns
+        them, if it must be parsed one document at a time to stay within
+        max_memory, or None if it can be parsed whole.  Raises
+        MemoryLimitExceeded if neither is projected to fit, or if documents
+        is false and text does not fit whole.
+        """
+        if self.max_memory is None or self.projected_memory(len(text)) <= self.max_memory:
+            return None
+        largest = len(text)
+        # NOTE: rules get the CommentTable of the whole file before its first node
+        if documents and self.grammar == 'yaml' and not self.side_table:
+            from ansible_hint.yaml import split_documents
+            chunks = split_documents(text)
+            ends = [offset for offset, line in chunks[1:]] + [len(text)]
+            largest = max(end - offset for (offset, line), end in zip(chunks, ends))
+            if self.projected_memory(largest) <= self.max_memory:
+                return chunks
+        raise self._memory_exceeded(self.projected_memory(largest))
+
+    def _memory_exceeded(self, needed):
+        return MemoryLimitExceeded((0, 0), 'Skipped: parsing needs about {} of memory, over the '
+                'limit of {}'.format(format_size(needed), format_size(self.max_memory)))
+
+    def lint_text(self, path, text, budget=None):
+        """
+        Returns a list of diagnostics for text, parsed within budget if
+        given, else self.budget
+        """
+        try:
+            chunks = self.check_memory(text)
+        except MemoryLimitExceeded as e:
+            return [Diagnostic(path, e.position, e.msg)]
+        if chunks is not None:
+            return self.lint_documents(path, text, chunks, budget)
+        result, error = self._measure(path, 'parse', self.parse, text, budget)
+        if error is not None:
+            return [Diagnostic(path, error.position, error.msg)]
+        lines = self._measure(path, 'lines', LineTable, text)
+        return self._measure(path, 'rules', self.engine.run, path, result, lines)
+
+    def lint_documents(self, path, text, chunks, budget=None):
+        """
+        Returns a list of diagnostics for text, parsing the document chunks
+        of text one at a time.  The root node is visited without children,
+        and a chunk that does not parse on its own is a syntax error.
+        """
+        engine = self.engine
+        budget = self.budget if budget is None else budget
+        if budget is not None:
+            budget = budget.for_file()
+        lines = self._measure(path, 'lines', LineTable, text)
+        engine.begin(path, lines=lines)
+        engine.walk([AstNode(self.decl, text, (0, 0))])
+        ends = [offset for offset, line in chunks[1:]] + [len(text)]
+        for (offset, line), end in zip(chunks, ends):
+            result, error = self._measure(path, 'parse', parse_part, self.decls, self.decl,
+                    text[offset:end], line, budget, self.memoize)
+            if error is not None:
+                engine.end()
+                return [Diagnostic(path, error.position, error.msg)]
+            nodes = [child for node in result.items for child in node.children]
+            self._measure(path, 'rules', engine.walk, nodes)
+            # NOTE: the tree must be gone before the next document is parsed
+            del result, nodes
+        return engine.end()
+
+    def lint_file(self, path):
+        """
+        Returns a list of diagnostics for the file at path, which is a
+        single diagnostic if it cannot be read
+        """
+        try:
+            if self.stream:
+                return self.lint_stream(path)
+            # NOTE: a file has no more characters than bytes
+            if self.max_memory is not None and self.projected_memory(
+                    os.path.getsize(path)) > self.max_memory:
+                return self.lint_large_file(path)
+            return self.lint_text(path, self._measure(path, 'read', self._read, path))
+        except (IOError, OSError, UnicodeDecodeError) as e:
+            return [Diagnostic(path, (0, 0), read_error(e))]
+
+    def lint_large_file(self, path):
+        """
+        Returns a list of diagnostics for the file at path, which is too
+        large to parse whole within max_memory.  It is streamed if the
+        textless tree of the file and the parse of its largest document are
+        projected to fit, and skipped with a diagnostic otherwise.
+        """
+        size = largest = os.path.getsize(path)
+        if self.grammar == 'yaml':
+            from ansible_hint.yaml import largest_document
+            with io.open(path, encoding='utf-8') as f:
+                largest = self._measure(path, 'read', largest_document, f)
+        needed = projected_stream_memory(size, largest, self.keep is not None)
+        if needed > self.max_memory:
+            error = self._memory_exceeded(needed)
+            return [Diagnostic(path, error.position, error.msg)]
+        return self.lint_stream(path)
+
+    def lint_stream(self, path):
+        """
+        Returns a list of diagnostics for the file at path, which is read
+        twice: once for its LineTable, and once as the parse reads it
+        """
+        with io.open(path, encoding='utf-8') as f:
+            if self.metrics is not None:
+                self.metrics.add_bytes(path, os.fstat(f.fileno()).st_size)
+            lines = self._measure(path, 'lines', LineTable.read, f)
+            f.seek(0)
+            result, error = self._measure(path, 'parse', parse_stream, self.decls, self.decl, f,
+                    0, self.budget, STREAM_CHUNK_SIZE, self.memoize)
+        if error is not None:
+            return [Diagnostic(path, error.position, error.msg)]
+        return self._measure(path, 'rules', self.engine.run, path, result, lines)
+
+    def parse_file(self, path):
+        """
+        Returns (text, result, error) for the file at path.  The whole tree
+        is kept, so a file over max_memory is skipped.  A file that cannot
+        be read has no text, and the error says why.
+        """
+        try:
+            text = self._measure(path, 'read', self._read, path)
+        except (IOError, OSError, UnicodeDecodeError) as e:
+            return '', AstResult(False), ParseError((0, 0), read_error(e))
+        try:
+            self.check_memory(text, documents=False)
+        except MemoryLimitExceeded as e:
+            return text, AstResult(False), e
+        result, error = self._measure(path, 'parse', self.parse, text)
+        return text, result, error
+
+    def _worker_results(self, paths, results):
+        # yields the value of the _worker_result() of each path, keeping its memory
+        # and metrics
+        for path in paths:
+            value, measured, metrics = next(results)
+            if measured is not None:
+                self.memory.files[path] = measured
+            if metrics is not None:
+                self.metrics.merge(path, *metrics)
+            yield value
+
+    def parse_files(self, paths):
+        """ Yields (path, (text, result, error)) for each path in the order given """
+        if self.jobs > 1:
+            results = self._worker_results(paths,
+                    self._get_file_pool().imap(_parse_file_worker, paths))
+        else:
+            results = (self.parse_file(path) for path in paths)
+        for path in paths:
+            yield path, next(results)
+
+    def build_graph(self, paths):
+        """
+        Parses paths and every file they reference, each physical file once,
+        and returns their DependencyGraph.  Files are parsed one level of
+        references at a time, each level on the file workers if jobs > 1.
+        """
+        graph = DependencyGraph()
+        level = []
+        for path in paths:
+            path, new = graph.add(path)
+            if new:
+                level.append(path)
+        self.parse_graph_files(graph, level)
+        return graph
+
+    def parse_graph_files(self, graph, paths):
+        """
+        Parses paths, which are in graph, replacing what they reference, and
+        adds and parses every file that they newly reference
+        """
+        level = paths
+        while level:
+            next_level = []
+            for path, (text, result, error) in self.parse_files(level):
+                item = graph.files[path]
+                item.text, item.result, item.error = text, result, error
+                item.references = []
+                if error is not None:
+                    continue
+                for kind, target in self.references(path, text, result):
+                    target, new = graph.add(target)
+                    count_cache('include_graph', not new)
+                    graph.add_reference(path, kind, target)
+                    if new:
+                        next_level.append(target)
+            level = next_level
+
+    def references(self, path, text, result):
+        """
+        Returns the (kind, target path) of each reference of the file at
+        path, whose text parsed to result.  The trees of a pruned runner
+        that is not a project runner lack the nodes that name other files,
+        so text is parsed again with only those nodes if it mentions a
+        reference key; most files do not, and their parse is kept pruned.
+        """
+        if self.project or self.keep is None:
+            return file_references(path, result)
+        if not mentions_reference(text):
+            return []
+        decls = load_grammar(self.grammar, REFERENCE_NODES)
+        result, error = self._measure(path, 'references', parse_text, decls, self.decl, text, 0,
+                self.budget, self.memoize)
+        return file_references(path, result) if error is None else []
+
+    def lint_project(self, paths):
+        """
+        Yields (path, diagnostics) for paths and every file they include or
+        use as a role, each physical file once, with each file after the
+        files it references.  Rules can reach the shared parse results of
+        those files through self.graph.
+        """
+        self.graph = graph = self.build_graph(paths)
+        for path in graph.topological_order():
+            yield path, self.lint_graph_file(graph, path)
+
+    def lint_graph_file(self, graph, path):
+        """ Returns a list of diagnostics for the file at path of graph, which is parsed """
+        item = graph.files[path]
+        if item.error is not None:
+            return [Diagnostic(path, item.error.position, item.error.msg)]
+        lines = self._measure(path, 'lines', LineTable, item.text)
+        return self._measure(path, 'rules', self.engine.run, path, item.result, lines, graph)
+
+    def lint_files(self, paths):
+        """
+        Yields (path, diagnostics) for each path in the order given, as soon
+        as that file and all files before it are done
+        """
+        if self.jobs > 1:
+            # NOTE: imap() returns results in order, however workers finish
+            results = self._worker_results(paths,
+                    self._get_file_pool().imap(_lint_file_worker, paths))
+        else:
+            results = (self.lint_file(path) for path in paths)
+        for path in paths:
+            yield path, next(results)
+
+    def run(self, paths):
+        """ Yields diagnostics for each path in order """
+        for path, diagnostics in self.lint_files(paths):
+            for diagnostic in diagnostics:
+                yield diagnostic
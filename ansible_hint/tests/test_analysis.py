@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from ansible_hint.analysis import GrammarError, analyze_grammar, BACKTRACKING
+from ansible_hint.bnf import BnfParserGenerator, build_bnf_parser_decls
+from ansible_hint.yaml import build_yaml_decls
+
+GRAMMAR = '''
+start := (a / b)*, ("x" / "xy"), missing, d
+a := "a"?
+b := "b"
+c := "c"
+d := (b, "1") / (b, "2") / (b, "3")
+'''
+
+
+class TestGrammarAnalyzer(TestCase):
+    def test_findings(self):
+        generator = BnfParserGenerator()
+        generator.process(GRAMMAR)
+        self.assertEquals(generator.warnings, [
+                'start: ZeroOrMore repeats OrGroup(DeclRef("a"),DeclRef("b")), '
+                'which can match empty text and never stop [nullable-repetition]',
+                'start: Alternative 2 (Literal("xy")) is never tried; '
+                'alternative 1 matches a prefix of it [shadowed-alternative]',
+                'start: Reference to undeclared "missing" [missing-decl]',
+                'c: Not reachable from "start" [unreachable-decl]',
+                'd: Alternatives 1, 2, 3 start with "b", which may be parsed 3 times '
+                'at one offset [backtracking]',
+            ])
+
+    def test_strict(self):
+        with self.assertRaises(GrammarError) as context:
+            BnfParserGenerator(strict=True).process(GRAMMAR)
+        self.assertEquals(len(context.exception.findings), 5)
+        BnfParserGenerator(strict=True).process('start := "a", b\nb := "b"+\n')
+
+    def test_builtin_grammars(self):
+        self.assertEquals(analyze_grammar(build_bnf_parser_decls()), [])
+        findings = analyze_grammar(build_yaml_decls())
+        self.assertEquals([x for x in findings if x.kind != BACKTRACKING], [])
@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+from unittest import TestCase
+from ansible_hint.backtracking import BacktrackingDetector, count_evaluations
+from ansible_hint.bnf import BnfParserGenerator
+from ansible_hint.grammar import load_grammar
+
+# every item tries a tail to the end of the input, so the parse is quadratic
+QUADRATIC_GRAMMAR = '''
+start := item*
+item := (tail, "!") / [a-z] / "\\n"
+tail := ([a-z] / "\\n"), tail?
+'''
+
+
+class TestBacktrackingDetector(TestCase):
+    def setUp(self):
+        self.decls = BnfParserGenerator().process(QUADRATIC_GRAMMAR).decls
+
+    def test_count_evaluations(self):
+        counter = count_evaluations(self.decls, 'start', 'abc')
+        self.assertEquals(counter.counts[('tail', 2)], 3)
+        self.assertEquals(counter.worst('tail'), (2, 3))
+        self.assertEquals(counter.ratios()['start'], 1)
+        self.assertEquals(sorted(counter.top_callers('tail')), ['item', 'tail'])
+
+    def test_detect(self):
+        reports = BacktrackingDetector(self.decls, 'start').detect('abcdefgh\n' * 8)
+        self.assertEquals([x.decl for x in reports], ['tail'])
+        self.assertEquals(unicode(reports[0]).split('\n'), [
+                '"tail" is evaluated 36.5 times per offset (9.5 at 25%, 18.5 at 50%, 36.5 at 100%)',
+                '  worst at 8:9, 72 evaluations',
+                '  via tail: Sequence item 2 > Optional',
+                '  via item: OrGroup alternative 1 > Sequence item 1',
+                "  excerpt: u'abcdefgh'",
+            ])
+
+    def test_yaml_is_linear(self):
+        with open('testfiles/test.yml') as f:
+            text = f.read().decode('utf-8') * 4
+        self.assertEquals(BacktrackingDetector(load_grammar('yaml'), 'stream').detect(text), [])
@@ -4,7 +4,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 import unittest
 from ansible_hint.tests.base import ParserTestBase
 from ansible_hint.parser import AstNode, ParseError
-from ansible_hint.bnf import bnf_parser_decls, BnfParserGenerator
+from ansible_hint.bnf import bnf_parser_decls, BnfParserGenerator, SemanticError
 
 class TestBnfProductions(ParserTestBase, unittest.TestCase):
     def run_parser(self, *args, **kwargs):
@@ -651,6 +651,22 @@ class TestBnfParserGenerator(ParserTestBase, unittest.TestCase):
         self.run_parser_fn('-foobar+', 'element_token', fn,
                 'OneOrMoreUntil(DeclRef("foobar"))')
 
+    def test_process_builtin(self):
+        fn = BnfParserGenerator._process_element_token
+        self.run_parser_fn('Indent', 'element_token', fn, 'Indent()')
+        self.run_parser_fn('SameIndent', 'element_token', fn, 'SameIndent()')
+        self.run_parser_fn('Dedent', 'element_token', fn, 'Dedent()')
+        self.run_parser_fn('Eof', 'element_token', fn, 'Eof()')
+        self.run_parser_fn('Jinja', 'element_token', fn, 'Jinja()')
+        self.run_parser_fn('IndentAtLeast( 2 )', 'element_token', fn, 'IndentAtLeast(2)')
+        self.run_parser_fn('foo ! "fail"', 'element_token', fn, 'DeclRef("foo").on_fail("fail")')
+
+    def test_builtin_name_decl(self):
+        for text in ['Indent := "a"\n', 'start := Jinja\n<Jinja> := "{{"\n']:
+            with self.assertRaises(SemanticError) as context:
+                BnfParserGenerator().process(text)
+            self.assertIn('has the name of a builtin', unicode(context.exception))
+
     def test_process_range(self):
         fn = BnfParserGenerator._process_range
         self.run_parser_fn('[a]', 'range', fn, 'Literal("a")')
@@ -678,6 +694,8 @@ class TestBnfParserGenerator(ParserTestBase, unittest.TestCase):
                 'Sequence(DeclRef("foo").on_fail("fail"),DeclRef("bar").on_fail("fail"))')
         self.run_parser_fn('! "fail", foo, !"baz", bar', 'seq_group', fn,
                 'Sequence(DeclRef("foo").on_fail("fail"),DeclRef("bar").on_fail("baz"))')
+        self.run_parser_fn('foo, ~, bar', 'seq_group', fn,
+                'Sequence(DeclRef("foo"),Cut(),DeclRef("bar"))')
 
     def test_process_fo_group(self):
         fn = BnfParserGenerator._process_fo_group
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import unittest
+from ansible_hint.comments import CommentTable
+from ansible_hint.lines import LineTable
+from ansible_hint.parser import AstNode
+from ansible_hint.runner import LintRunner
+from ansible_hint.yaml import parse_documents
+
+TEXT = '# doc for a\na: 1  # one\nb: 2\n# doc for c\nc: 3\n'
+
+
+class TestCommentTable(unittest.TestCase):
+    def setUp(self):
+        self.table = CommentTable([(29, '# doc for c'), (0, '# doc for a'), (18, '# one')])
+
+    def test_lookup(self):
+        table = self.table
+        self.assertEquals(list(table), [(0, '# doc for a'), (18, '# one'), (29, '# doc for c')])
+        self.assertEquals(table.preceding(18), (0, '# doc for a'))
+        self.assertEquals(table.preceding(0), None)
+        self.assertEquals(table.following(19), (29, '# doc for c'))
+        self.assertEquals(table.following(30), None)
+        self.assertEquals(table.between(1, 29), [(18, '# one')])
+
+    def test_attach(self):
+        nodes = [AstNode('a', 'a', (1, 0)), AstNode('b', 'b', (2, 0)), AstNode('c', 'c', (4, 0))]
+        attached = self.table.attach(nodes, LineTable(TEXT))
+        self.assertEquals([(node.name, comments) for node, comments in attached.items()], [
+                ('a', [(0, '# doc for a'), (18, '# one')]),
+                ('b', []),
+                ('c', [(29, '# doc for c')]),
+            ])
+
+
+class TestCommentSideTable(unittest.TestCase):
+    def test_parse(self):
+        runner = LintRunner('yaml', comments=True)
+        result, error = runner.parse(TEXT)
+        self.assertIs(error, None)
+        self.assertEquals(list(result.comments), [(0, '# doc for a'), (18, '# one'), (29, '# doc for c')])
+
+        runner = LintRunner('yaml', prune=False, comments=True)
+        result, error = runner.parse(TEXT)
+        self.assertNotIn('"comment"', unicode(result))
+
+    def test_parse_documents(self):
+        text = 'a: 1 # x\n---\n# y\nb: 2\n'
+        result, error = parse_documents('yaml', 'stream', text, side_table=('comment',))
+        self.assertEquals(list(result.comments), [(5, '# x'), (13, '# y')])
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import datetime
+import glob
+import io
+import unittest
+from unittest import TestCase
+from ansible_hint.grammar import load_grammar
+from ansible_hint.runner import parse_text
+from ansible_hint.construct import (resolve_plain, unquote_single, unquote_double,
+        construct_documents, first_difference)
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+TEXT = '''\
+# header
+a: 1
+b: [x, "y", {z: ~}]
+c:
+- 'it''s'
+-
+- d: 0x10  # comment
+  e: http://example.com/#x
+---
+---
+- "tab\\t\\u00e9"
+'''
+
+
+def load(text):
+    result, error = parse_text(load_grammar('yaml'), 'stream', text)
+    if error is not None:
+        raise error
+    return construct_documents(result)
+
+
+class TestConstruct(TestCase):
+    def test_resolve_plain(self):
+        for text, value in [('~', None), ('', None), ('Yes', True), ('off', False), ('0644', 420),
+                ('0x1F', 31), ('-1_000', -1000), ('0b101', 5), ('190:20:30', 685230),
+                ('1.5e+3', 1500.0), ('-.inf', float('-inf')), ('2001-12-14', datetime.date(2001, 12, 14)),
+                ('2001-12-14t21:59:43.10-05:00', datetime.datetime(2001, 12, 15, 2, 59, 43, 100000)),
+                ('1e3', '1e3'), ('-.5', '-.5'), ('a b', 'a b')]:
+            self.assertEquals(resolve_plain(text), value, text)
+            self.assertIs(type(resolve_plain(text)), type(value), text)
+
+    def test_unquote(self):
+        self.assertEquals(unquote_single("'it''s\n  two\n\n  lines'"), "it's two\nlines")
+        self.assertEquals(unquote_double('"a\\tb\\x41\\u00e9\\"\\\n   c"'), 'a\tbAé"c')
+
+    def test_construct_documents(self):
+        self.assertEquals(load(TEXT), [
+            {'a': 1, 'b': ['x', 'y', {'z': None}],
+                'c': ["it's", None, {'d': 16, 'e': 'http://example.com/#x'}]},
+            None,
+            ['tab\té'],
+        ])
+        self.assertEquals(load(''), [])
+
+    def test_first_difference(self):
+        self.assertEquals(first_difference({'a': [1, 2]}, {'a': [1, 2]}), None)
+        self.assertEquals(first_difference({'a': [1, 2]}, {'a': [1, True]}), ('[u\'a\'][1]', 2, True))
+        self.assertEquals(first_difference([1], [1, 2]), ('[1]', '<missing>', 2))
+        self.assertEquals(first_difference(float('nan'), float('nan')), None)
+
+
+@unittest.skipIf(yaml is None, 'PyYAML is not installed')
+class TestPyYamlConformance(TestCase):
+    def test_testfiles(self):
+        for path in glob.glob('testfiles/*.yml') + [None]:
+            if path is None:
+                text = TEXT
+            else:
+                with io.open(path, encoding='utf-8') as f:
+                    text = f.read()
+            try:
+                expected = list(yaml.safe_load_all(text))
+            except yaml.YAMLError:
+                continue
+            self.assertEquals(first_difference(load(text), expected), None, path)
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import marshal
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+import zlib
+import ansible_hint.grammar as ahg
+import ansible_hint.parser as ahp
+from ansible_hint.bnf import bnf_parser_decls, build_bnf_parser_decls
+
+
+class TestGrammar(unittest.TestCase):
+    def test_production_source(self):
+        prod = ahp.Sequence(ahp.Literal('\n'), ahp.CharRange('a', 'z')).on_fail('oops')
+        self.assertEquals(ahg.production_source(prod),
+                "Sequence(Literal(u'\\n'), CharRange(u'a', u'z')).on_fail(u'oops')")
+
+    def test_freeze_round_trip(self):
+        decls = build_bnf_parser_decls()
+        scope = {}
+        exec(ahg.freeze_grammar(decls).encode('utf-8'), scope)
+        self.assertEquals(
+                '\n'.join(map(unicode, scope['decls'])),
+                '\n'.join(map(unicode, decls)))
+
+    def test_lazy_decls(self):
+        self.assertIs(bnf_parser_decls.decls, ahg.load_grammar('bnf'))
+        self.assertEquals(bnf_parser_decls[0].name, 'declaration_set')
+        self.assertEquals(len(bnf_parser_decls), len(build_bnf_parser_decls()))
+
+
+def flatten(nodes, names):
+    result = []
+    stack = list(reversed(nodes))
+    while stack:
+        node = stack.pop()
+        if node.name in names:
+            result.append((node.name, node.text, node.pos))
+        stack.extend(reversed(node.children))
+    return result
+
+
+class TestPruneGrammar(unittest.TestCase):
+    def test_prune_kinds(self):
+        decls = ahg.prune_grammar(build_bnf_parser_decls(), set(['name']), 'declaration_set')
+        kinds = dict((decl.name, type(decl).__name__) for decl in decls)
+        self.assertEquals(kinds['declaration_set'], 'Decl')
+        self.assertEquals(kinds['name'], 'TokenDecl')
+        self.assertEquals(kinds['declaration'], 'ExpandedDecl')
+        self.assertEquals(kinds['literal'], 'UnreportedDecl')
+        self.assertEquals(kinds['ts'], 'UnreportedDecl')
+        self.assertEquals(kinds['space'], 'UnreportedTokenDecl')
+        decls = ahg.prune_grammar(build_bnf_parser_decls(), set(['literal']), 'declaration_set')
+        self.assertEquals(dict((decl.name, type(decl).__name__) for decl in decls)['name'],
+                'UnreportedTokenDecl')
+
+    def test_prune_positions(self):
+        with open('testfiles/test.yml') as f:
+            text = f.read().decode('utf-8')
+        keep = set(['key', 'plain_scalar', 'document'])
+        full = ahp.BasicParser(ahg.load_grammar('yaml')).parse('stream', text)
+        pruned = ahp.BasicParser(ahg.load_grammar('yaml', keep)).parse('stream', text)
+
+        self.assertEquals(flatten(pruned.items, keep), flatten(full.items, keep))
+        self.assertEquals(flatten(pruned.items, set(['plain_key', 'mapping_entry'])), [])
+        self.assertIs(ahg.load_grammar('yaml', keep), ahg.load_grammar('yaml', keep))
+
+
+class TestGrammarObject(unittest.TestCase):
+    def test_frozen(self):
+        grammar = ahg.load_grammar('bnf')
+        self.assertIsInstance(grammar, ahp.Grammar)
+        with self.assertRaises(AttributeError):
+            grammar[0].on_fail('oops')
+        with self.assertRaises(AttributeError):
+            grammar[0].prod.items = ()
+
+    def test_pickle(self):
+        grammar = ahg.load_grammar('yaml')
+        data = pickle.dumps(grammar, pickle.HIGHEST_PROTOCOL)
+        self.assertLess(len(data), len(pickle.dumps(list(grammar), pickle.HIGHEST_PROTOCOL)) / 4)
+
+        loaded = pickle.loads(data)
+        self.assertIsInstance(loaded, ahp.Grammar)
+        self.assertEquals('\n'.join(map(unicode, loaded)), '\n'.join(map(unicode, grammar)))
+        self.assertTrue(all(decl.frozen for decl in loaded))
+
+        with open('testfiles/test.yml') as f:
+            text = f.read().decode('utf-8')
+        self.assertEquals(unicode(ahp.BasicParser(loaded).parse('stream', text)),
+                unicode(ahp.BasicParser(grammar).parse('stream', text)))
+
+    def test_shared_decl_map(self):
+        grammar = ahg.load_grammar('bnf')
+        ctx = ahp.ParseCtx(grammar)
+        self.assertIs(ctx.declarations, grammar.decl_map)
+        ctx.add_decl(ahp.Decl('extra', ahp.Literal('x')))
+        self.assertNotIn('extra', grammar.decl_map)
+        self.assertEquals(ctx.get_decl('extra').name, 'extra')
+
+
+CORE_MODULE = '''
+start  :=  word, (" ", word)*
+word   :=  [a-z]+
+'''
+
+DIGITS_MODULE = '''
+@import core
+
+word   :=  [a-z0-9]+
+'''
+
+LIST_MODULE = '''
+@import digits
+
+list   :=  start, (",", start)*
+'''
+
+
+class TestGrammarModules(unittest.TestCase):
+    def setUp(self):
+        self.modules = dict((name, ahg.compile_module(name, text)) for name, text in
+                [('core', CORE_MODULE), ('digits', DIGITS_MODULE), ('list', LIST_MODULE)])
+
+    def test_compile_module(self):
+        module = self.modules['digits']
+        self.assertEquals(module.imports, ('core',))
+        self.assertEquals([decl.name for decl in module.decls], ['word'])
+
+    def test_link(self):
+        core = ahg.link_grammar('core', self.modules)
+        digits = ahg.link_grammar('digits', self.modules)
+        self.assertEquals([decl.name for decl in digits], ['start', 'word'])
+        self.assertIs(digits.decl_map['start'], core.decl_map['start'])
+        self.assertIsNot(digits.decl_map['word'], core.decl_map['word'])
+        self.assertEquals(unicode(ahp.BasicParser(digits).parse('start', 'a1 b2').items[0].text),
+                'a1 b2')
+
+        grammar = ahg.link_grammar('list', self.modules)
+        self.assertEquals([decl.name for decl in grammar], ['list', 'start', 'word'])
+        self.assertIs(grammar.decl_map['word'], digits.decl_map['word'])
+
+    def test_import_errors(self):
+        self.modules['core'] = ahg.compile_module('core', '@import list\n' + CORE_MODULE)
+        with self.assertRaises(ahg.GrammarImportError) as cm:
+            ahg.link_grammar('list', self.modules)
+        self.assertEquals(unicode(cm.exception),
+                'Grammar modules import each other: list > digits > core > list')
+        with self.assertRaises(ahg.GrammarImportError):
+            ahg.link_grammar('no_such_module')
+
+    def test_yaml_modules(self):
+        yaml = ahg.load_grammar('yaml')
+        core = ahg.load_grammar('yaml_core')
+        self.assertEquals([decl.name for decl in yaml], [decl.name for decl in core])
+        self.assertIs(yaml.decl_map['stream'], core.decl_map['stream'])
+        self.assertIn('Jinja', unicode(yaml.decl_map['plain_scalar']))
+        self.assertNotIn('Jinja', unicode(core.decl_map['plain_scalar']))
+
+    def test_module_cache(self):
+        cache = tempfile.mkdtemp()
+        old = os.environ.get(ahg.CACHE_ENV)
+        os.environ[ahg.CACHE_ENV] = cache
+        try:
+            ahg._modules.pop('yaml_core', None)
+            compiled = ahg.load_module('yaml_core')
+            self.assertEquals(len(os.listdir(cache)), 1)
+
+            ahg._modules.pop('yaml_core')
+            cached = ahg.load_module('yaml_core')
+            self.assertIsNot(cached, compiled)
+            self.assertEquals(cached.imports, compiled.imports)
+            self.assertEquals('\n'.join(map(unicode, cached.decls)),
+                    '\n'.join(map(unicode, compiled.decls)))
+
+            # a file that does not decode is compiled again, and replaced
+            path = os.path.join(cache, os.listdir(cache)[0])
+            with open(path, 'rb') as f:
+                content = f.read()
+            imports, data = marshal.loads(content)
+            stale = zlib.compress(marshal.dumps(((len(ahp.PRODUCTION_TYPES), None),)))
+            for broken in [content[:len(content) // 2],
+                    marshal.dumps((imports, data[:len(data) // 2])),
+                    marshal.dumps((imports, stale))]:
+                with open(path, 'wb') as f:
+                    f.write(broken)
+                ahg._modules.pop('yaml_core')
+                self.assertEquals('\n'.join(map(unicode, ahg.load_module('yaml_core').decls)),
+                        '\n'.join(map(unicode, compiled.decls)))
+                with open(path, 'rb') as f:
+                    self.assertEquals(f.read(), content)
+        finally:
+            if old is None:
+                del os.environ[ahg.CACHE_ENV]
+            else:
+                os.environ[ahg.CACHE_ENV] = old
+            shutil.rmtree(cache)
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from ansible_hint.graph import DependencyGraph, file_references
+from ansible_hint.runner import LintRunner
+
+FILES = {
+    'site.yml': (
+        '- hosts: all\n'
+        '  roles:\n'
+        '    - common\n'
+        '    - role: web\n'
+        '  tasks:\n'
+        '    - include_tasks: tasks/setup.yml\n'
+        '    - import_role:\n'
+        '        name: "{{ dynamic }}"\n'),
+    'other.yml': (
+        '- hosts: db\n'
+        '  tasks:\n'
+        '    - include_role: {name: common}\n'
+        '    - import_tasks: ./tasks/../tasks/setup.yml\n'),
+    'tasks/setup.yml': '- debug: msg=setup\n',
+    'roles/common/tasks/main.yml': '- include_tasks: extra.yml\n',
+    'roles/common/tasks/extra.yml': '- debug: msg=extra\n',
+    'roles/web/tasks/main.yml': '- debug: msg=web\n',
+    'roles/web/handlers/main.yaml': '- name: restart\n  service: name=web\n',
+    'roles/web/meta/main.yml': 'dependencies:\n  - common\n',
+}
+
+
+class CountingRunner(LintRunner):
+    def __init__(self, *args, **kwargs):
+        LintRunner.__init__(self, *args, **kwargs)
+        self.parsed = []
+
+    def parse_file(self, path):
+        self.parsed.append(os.path.realpath(path))
+        return LintRunner.parse_file(self, path)
+
+
+class TestDependencyGraph(TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        for name, text in FILES.items():
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.relpath(os.path.join(self.root, name))
+
+    def test_file_references(self):
+        runner = LintRunner('yaml', project=True)
+        text, result, error = runner.parse_file(self.path('site.yml'))
+        self.assertEquals(error, None)
+        self.assertEquals(file_references(self.path('site.yml'), result), [
+            ('roles', self.path('roles/common/tasks/main.yml')),
+            ('roles', self.path('roles/web/tasks/main.yml')),
+            ('roles', self.path('roles/web/handlers/main.yaml')),
+            ('roles', self.path('roles/web/meta/main.yml')),
+            ('include_tasks', self.path('tasks/setup.yml')),
+        ])
+
+    def test_parse_once(self):
+        runner = CountingRunner('yaml', project=True)
+        graph = runner.build_graph([self.path('site.yml'), self.path('other.yml'),
+                self.path('tasks/setup.yml')])
+        self.assertEquals(len(graph), len(FILES))
+        self.assertEquals(sorted(runner.parsed), sorted(set(runner.parsed)))
+        self.assertEquals(len(runner.parsed), len(FILES))
+        self.assertEquals(graph.dependencies(self.path('other.yml')),
+                [self.path('roles/common/tasks/main.yml'), self.path('tasks/setup.yml')])
+        self.assertEquals(graph.dependents(self.path('roles/common/tasks/main.yml')), [
+                self.path('site.yml'), self.path('other.yml'), self.path('roles/web/meta/main.yml')])
+
+    def test_topological_order(self):
+        runner = LintRunner('yaml', project=True)
+        graph = runner.build_graph([self.path('site.yml'), self.path('other.yml')])
+        order = graph.topological_order()
+        self.assertEquals(sorted(order), sorted(graph.files))
+        for path in order:
+            for dependency in graph.dependencies(path):
+                self.assertLess(order.index(dependency), order.index(path))
+        self.assertEquals(order[0], self.path('roles/common/tasks/extra.yml'))
+        self.assertEquals(order[-1], self.path('other.yml'))
+
+    def test_cycle(self):
+        graph = DependencyGraph()
+        for name in ['a.yml', 'b.yml']:
+            graph.add(self.path(name))
+        graph.add_reference(self.path('a.yml'), 'include', self.path('b.yml'))
+        graph.add_reference(self.path('b.yml'), 'include', self.path('a.yml'))
+        self.assertEquals(graph.topological_order(), [self.path('b.yml'), self.path('a.yml')])
+
+    def test_remove(self):
+        runner = LintRunner('yaml', project=True)
+        graph = runner.build_graph([self.path('site.yml'), self.path('other.yml')])
+        common = self.path('roles/common/tasks/main.yml')
+        self.assertEquals(graph.all_dependents([self.path('roles/common/tasks/extra.yml')]),
+                [self.path('site.yml'), self.path('other.yml'), common,
+                 self.path('roles/web/meta/main.yml')])
+        selected = [self.path('other.yml'), common, self.path('roles/common/tasks/extra.yml')]
+        self.assertEquals(graph.topological_order(selected), list(reversed(selected)))
+
+        graph.remove(common)
+        self.assertNotIn(common, graph)
+        self.assertEquals(graph.dependencies(self.path('other.yml')), [self.path('tasks/setup.yml')])
+        self.assertEquals(graph.all_dependents([common]), [])
+
+    def test_lint_project(self):
+        paths = [self.path('site.yml'), self.path('other.yml')]
+        runner = LintRunner('yaml', project=True)
+        linted = [path for path, diagnostics in runner.lint_project(paths)]
+        self.assertEquals(linted, runner.graph.topological_order())
+
+        runner = LintRunner('yaml', project=True, jobs=2)
+        try:
+            self.assertEquals([path for path, diagnostics in runner.lint_project(paths)], linted)
+        finally:
+            runner.close()
+
+    def test_to_dict(self):
+        graph = LintRunner('yaml', project=True).build_graph([self.path('other.yml')])
+        data = json.loads(graph.to_json())
+        self.assertEquals([x['path'] for x in data['nodes']], graph.topological_order())
+        self.assertEquals(data['edges'][0], {'source': self.path('other.yml'),
+                'target': self.path('roles/common/tasks/main.yml'), 'kind': 'include_role'})
+        self.assertIn('-> "{}" [label="import_tasks"];'.format(self.path('tasks/setup.yml')),
+                graph.to_dot())
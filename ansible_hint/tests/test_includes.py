@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+from unittest import TestCase
+from ansible_hint.includes import related_files
+from ansible_hint.runner import LintRunner
+from ansible_hint.vcs import GitError, changed_files, work_tree_files
+
+FILES = {
+    'play.yml': '- include_tasks: tasks/a.yml\n- import_playbook: "{{ other }}.yml"\n',
+    'tasks/a.yml': '- import_tasks: b.yml  # comment\n- include: missing.yml\n',
+    'tasks/b.yml': 'x: 1\n',
+    'other.yml': 'y: 2\n',
+    'site.yml': '- hosts: all\n  roles:\n    - role: web\n',
+    'roles/web/tasks/main.yml': '- debug: msg=web\n',
+    'README': 'include: play.yml\n',
+}
+
+
+class TestIncludes(TestCase):
+    def setUp(self):
+        self.root = os.path.realpath(tempfile.mkdtemp())
+        for name, text in FILES.items():
+            self.write(name, text)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.relpath(os.path.join(self.root, name))
+
+    def write(self, name, text):
+        directory = os.path.dirname(os.path.join(self.root, name))
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        with io.open(os.path.join(self.root, name), 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def git(self, *args):
+        subprocess.check_call(['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com']
+                + list(args), cwd=self.root, stdout=open(os.devnull, 'w'))
+
+    def test_related_files(self):
+        runner = LintRunner('yaml', project=True)
+        paths = [self.path(x) for x in ['play.yml', 'tasks/a.yml', 'tasks/b.yml', 'other.yml',
+                'site.yml', 'roles/web/tasks/main.yml']]
+        self.assertEquals(related_files(runner, paths, [self.path('tasks/a.yml')]), paths[:3])
+        # files that include a changed file through other files are selected too
+        self.assertEquals(related_files(runner, paths, [self.path('tasks/b.yml')]), paths[:3])
+        self.assertEquals(related_files(runner, paths, [self.path('roles/web/tasks/main.yml')]),
+                paths[4:])
+        self.assertEquals(related_files(runner, paths, []), [])
+
+    def test_changed_files(self):
+        self.git('init', '-q')
+        self.git('add', '.')
+        self.git('commit', '-q', '-m', 'init')
+        self.assertEquals(changed_files('HEAD', self.root), [])
+
+        self.write('tasks/b.yml', 'x: 2\n')
+        self.write('new.yaml', 'z: 3\n')
+        self.git('mv', 'other.yml', 'renamed.yml')
+        self.assertEquals(sorted(changed_files('HEAD', self.root)),
+                sorted(self.path(x) for x in ['tasks/b.yml', 'new.yaml', 'renamed.yml']))
+        self.assertEquals(sorted(work_tree_files(self.root)), sorted(self.path(x) for x in
+                ['play.yml', 'tasks/a.yml', 'tasks/b.yml', 'new.yaml', 'renamed.yml', 'site.yml',
+                 'roles/web/tasks/main.yml']))
+
+        with self.assertRaises(GitError):
+            changed_files('no-such-ref', self.root)
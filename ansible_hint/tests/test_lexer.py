@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import unittest
+from ansible_hint.analysis import INVALID_TOKEN
+from ansible_hint.bnf import BnfParserGenerator, SemanticError
+from ansible_hint.lexer import build_lexer, token_pattern
+from ansible_hint.parser import (AstNode, AstResult, ParseCtx, StreamParseCtx, Literal, OneOf,
+        CharRange, Sequence, OrGroup, OneOrMore, ZeroOrMoreUntil, Decl, TokenDecl,
+        UnreportedTokenDecl, DeclRef, Eof, Indent)
+
+GRAMMAR = '''\
+pairs             :=  pair, (space?, ",", space?, pair)*, space?, Eof
+pair              :=  word, space?, "=", space?, (number / word)
+@token word       :=  [a-z_], [a-z0-9_]*
+@token number     :=  [0-9]+
+@token <space>    :=  (" " / "\\t" / "\\n" / comment)+
+comment           :=  "#", -"\\n"*
+'''
+
+TEXT = 'a = 1, b_2=x # c\n , c=22'
+
+
+class TestLexer(unittest.TestCase):
+    def test_token_pattern(self):
+        decls = {'eol': Decl('eol', OrGroup(Literal('\n'), Eof()))}
+        self.assertEquals(token_pattern(Sequence(Literal('a.'), OneOf('^]')), decls),
+                '(?:a\\.[\\^\\]])')
+        self.assertEquals(token_pattern(ZeroOrMoreUntil(DeclRef('eol')), decls),
+                '(?:(?!(?:\\\n|\\Z))[\\s\\S])*(?=(?:\\\n|\\Z))')
+        self.assertRaises(ValueError, token_pattern, Sequence(Indent(), Literal('a')), decls)
+        self.assertRaises(ValueError, token_pattern, Literal('a').on_fail('no a'), decls)
+        self.assertRaises(ValueError, token_pattern, DeclRef('missing'), decls)
+
+    def test_tokenize(self):
+        lexer = build_lexer([TokenDecl('word', OneOrMore(CharRange('a', 'z'))),
+                TokenDecl('if', Literal('if')), UnreportedTokenDecl('space', OneOf(' '))])
+        tokens = lexer.tokenize('if ab-c')
+        self.assertEquals(list(tokens.starts), [0, 2, 3, 6])
+        self.assertEquals(list(tokens.ends), [2, 3, 5, 7])
+        # the first token declared wins
+        self.assertEquals(list(tokens.kinds), [0, 2, 0, 0])
+        self.assertEquals(tokens.at(1), (0, 2))
+        self.assertEquals(tokens.at(5), None)
+        self.assertEquals(tokens.end(1, 0), None)
+
+    def test_parse(self):
+        parser = BnfParserGenerator().process(GRAMMAR)
+        self.assertEquals(parser.findings, [])
+        result = parser.parse('pairs', TEXT)
+        self.assertEquals(unicode(result), unicode(AstResult(AstNode('pairs', TEXT, (0, 0),
+            AstNode('pair', 'a = 1', (0, 0), AstNode('word', 'a', (0, 0)),
+                AstNode('number', '1', (0, 4))),
+            AstNode('pair', 'b_2=x', (0, 7), AstNode('word', 'b_2', (0, 7)),
+                AstNode('word', 'x', (0, 11))),
+            AstNode('pair', 'c=22', (1, 3), AstNode('word', 'c', (1, 3)),
+                AstNode('number', '22', (1, 5))),
+        ))))
+        self.assertFalse(parser.parse('pairs', 'a = 1,'))
+
+        ctx = StreamParseCtx(parser.decls, chunk_size=3)
+        ctx.reset(io.StringIO(TEXT))
+        self.assertEquals(unicode(ctx.get_decl('pairs').evaluate(ctx)), unicode(result))
+
+    def test_add_decl(self):
+        ctx = ParseCtx([Decl('start', DeclRef('word'))])
+        ctx.add_decl(TokenDecl('word', OneOf('ab')))
+        ctx.reset('ba')
+        self.assertEquals(ctx.get_decl('start').evaluate(ctx).items[0].children[0].text, 'b')
+        ctx.add_decl(TokenDecl('word', Sequence(OneOf('ab'), OneOf('ab'))))
+        self.assertEquals(ctx.lexer.names, ['word'])
+        ctx.reset('ba')
+        self.assertEquals(ctx.get_decl('start').evaluate(ctx).items[0].children[0].text, 'ba')
+
+    def test_bnf_errors(self):
+        with self.assertRaises(SemanticError) as context:
+            BnfParserGenerator().process('@token >a< := "a"\n')
+        self.assertEquals(unicode(context.exception),
+                '(0, 7): A token cannot be an >expanded< declaration')
+        parser = BnfParserGenerator().process(
+                'start := a, b\n@token a := Indent, "a"\n@token b := "b"?\n')
+        self.assertEquals([(x.kind, x.decl) for x in parser.findings],
+                [(INVALID_TOKEN, 'a'), (INVALID_TOKEN, 'b')])
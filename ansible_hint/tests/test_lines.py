@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import unittest
+from ansible_hint.lines import LineTable
+from ansible_hint.parser import ParseCtx
+
+
+class TestLineTable(unittest.TestCase):
+    def setUp(self):
+        self.table = LineTable('a: 1\n  b: 2  \n\t# c\n   \n')
+
+    def test_lines(self):
+        table = self.table
+        self.assertEquals(len(table), 5)
+        self.assertEquals([table.start(x) for x in range(5)], [0, 5, 14, 19, 23])
+        self.assertEquals([table.end(x) for x in range(5)], [4, 13, 18, 22, 23])
+        self.assertEquals([table.indent(x) for x in range(5)], [0, 2, 1, 3, 0])
+        self.assertEquals(table.indent_text(2), '\t')
+
+    def test_flags(self):
+        table = self.table
+        self.assertEquals([table.is_blank(x) for x in range(5)], [False, False, False, True, True])
+        self.assertEquals([table.is_comment(x) for x in range(5)], [False, False, True, False, False])
+        self.assertEquals([table.has_tabs(x) for x in range(5)], [False, False, True, False, False])
+        self.assertEquals(table.spaces(1), 2)
+        self.assertEquals(table.spaces(2), 0)
+
+    def test_trailing(self):
+        table = self.table
+        self.assertEquals([table.trailing(x) for x in range(5)], [(4, 4), (6, 8), (4, 4), (0, 3), (0, 0)])
+
+    def test_position(self):
+        self.assertEquals(self.table.position(0), (0, 0))
+        self.assertEquals(self.table.position(9), (1, 4))
+        self.assertEquals(self.table.position(23), (4, 0))
+
+    def test_read(self):
+        text = self.table.text * 3
+        expected = LineTable(text)
+        for size in [1, 7, 4096]:
+            table = LineTable.read(io.StringIO(text), size)
+            self.assertEquals(table.text, None)
+            for name in ['starts', 'ends', 'indents', 'content_ends', 'flags']:
+                self.assertEquals(getattr(table, name), getattr(expected, name), (size, name))
+        self.assertEquals(list(LineTable.read(io.StringIO('a\nb')).starts), [0, 2])
+
+    def test_parse_ctx(self):
+        ctx = ParseCtx()
+        ctx.reset('a\n  b\n', 3)
+        self.assertIs(ctx.line_table(), ctx.clone().line_table())
+        ctx.next(2)
+        self.assertEquals(ctx.line_index(), 1)
+        self.assertEquals(ctx.line_table().indent(ctx.line_index()), 2)
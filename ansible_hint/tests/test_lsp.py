@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import os
+import sys
+import threading
+import time
+from unittest import TestCase
+from ansible_hint.grammar import load_grammar
+from ansible_hint.lsp import (LanguageServer, apply_change, lsp_diagnostic, read_message,
+        uri_path, write_message)
+from ansible_hint.parser import ParseBudget, ParseCancelled
+from ansible_hint.rules import Diagnostic, RULES
+from ansible_hint.runner import LintRunner, parse_text
+
+URI = 'file:///tmp/a%20b.yml'
+
+
+def edit(start, end, text):
+    return {'range': {'start': {'line': start[0], 'character': start[1]},
+            'end': {'line': end[0], 'character': end[1]}}, 'text': text}
+
+
+def notification(method, **params):
+    return {'jsonrpc': '2.0', 'method': method, 'params': params}
+
+
+class Log(object):
+    """ Collects what is written to it, as stderr while a test runs """
+    def __init__(self):
+        self.parts = []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def getvalue(self):
+        return ''.join(self.parts)
+
+
+class TestProtocol(TestCase):
+    def test_messages(self):
+        stream = io.BytesIO()
+        write_message(stream, {'id': 1, 'text': 'é'})
+        self.assertTrue(stream.getvalue().startswith(b'Content-Length: 27\r\n\r\n{'))
+        stream.seek(0)
+        self.assertEquals(read_message(stream), {'id': 1, 'text': 'é'})
+        self.assertEquals(read_message(stream), None)
+        self.assertEquals(uri_path(URI), '/tmp/a b.yml')
+
+    def test_apply_change(self):
+        text = 'a: 1\nb: 😀x\n'
+        self.assertEquals(apply_change(text, {'text': 'c'}), 'c')
+        self.assertEquals(apply_change(text, edit((0, 3), (1, 1), '2\nc')), 'a: 2\nc: 😀x\n')
+        # LSP columns count UTF-16 code units, two for the emoji
+        self.assertEquals(apply_change(text, edit((1, 5), (1, 6), 'y')), 'a: 1\nb: 😀y\n')
+        self.assertEquals(apply_change(text, edit((5, 0), (5, 0), 'c: 3\n')), text + 'c: 3\n')
+
+    def test_diagnostic(self):
+        diagnostic = Diagnostic('a.yml', (0, 4), 'Trailing whitespace', 'trailing_whitespace')
+        result = lsp_diagnostic(diagnostic, ['😀: 1  '])
+        self.assertEquals((result['range']['start'], result['range']['end']),
+                ({'line': 0, 'character': 5}, {'line': 0, 'character': 7}))
+        self.assertEquals((result['severity'], result['code']), (2, 'trailing_whitespace'))
+        result = lsp_diagnostic(Diagnostic('a.yml', (1, 0), 'Expected closing "}"'), ['{'])
+        self.assertEquals((result['severity'], 'code' in result), (1, False))
+
+    def test_cancel(self):
+        cancel = threading.Event()
+        cancel.set()
+        text = ''.join('- name: t{}\n  debug: msg=x\n'.format(i) for i in range(50))
+        result, error = parse_text(load_grammar('yaml'), 'stream', text,
+                budget=ParseBudget(cancel=cancel))
+        self.assertIsInstance(error, ParseCancelled)
+
+
+class TestLanguageServer(TestCase):
+    def setUp(self):
+        read, write = os.pipe()
+        self.input = os.fdopen(write, 'wb')
+        self.output = io.BytesIO()
+        runner = LintRunner('yaml', rules=[x() for x in RULES.values()])
+        self.server = LanguageServer(runner, os.fdopen(read, 'rb'), self.output, debounce=0.05)
+        self.thread = threading.Thread(target=self.serve)
+        self.thread.start()
+
+    def serve(self):
+        self.status = self.server.serve()
+
+    def tearDown(self):
+        self.input.close()
+        self.thread.join()
+
+    def send(self, message):
+        write_message(self.input, message)
+
+    def quiet(self):
+        # NOTE: errors are logged to stderr with their tracebacks
+        stderr, sys.stderr = sys.stderr, Log()
+        self.addCleanup(setattr, sys, 'stderr', stderr)
+
+    def messages(self, count):
+        # the first count messages the server sent, waiting up to 10 seconds for them
+        deadline = time.time() + 10
+        while True:
+            stream = io.BytesIO(self.output.getvalue())
+            result = []
+            message = read_message(stream)
+            while message is not None:
+                result.append(message)
+                message = read_message(stream)
+            if len(result) >= count or time.time() > deadline:
+                return result
+            time.sleep(0.01)
+
+    def test_server(self):
+        self.send({'jsonrpc': '2.0', 'id': 1, 'method': 'initialize', 'params': {}})
+        self.assertEquals(self.messages(1)[0]['result']['capabilities']['textDocumentSync'],
+                {'openClose': True, 'change': 2})
+
+        self.send(notification('textDocument/didOpen',
+                textDocument={'uri': URI, 'version': 1, 'text': 'a: 1\n'}))
+        self.assertEquals(self.messages(2)[1]['params'], {'uri': URI, 'version': 1,
+                'diagnostics': []})
+
+        # only the last of quick edits is linted and published
+        for version, change in enumerate([edit((0, 4), (0, 4), ' '),
+                edit((1, 0), (1, 0), 'b: 2  \n')], 2):
+            self.send(notification('textDocument/didChange',
+                    textDocument={'uri': URI, 'version': version}, contentChanges=[change]))
+        self.send({'jsonrpc': '2.0', 'id': 2, 'method': 'unknown'})
+        messages = self.messages(4)
+        self.assertEquals(messages[2]['error']['code'], -32601)
+        params = messages[3]['params']
+        self.assertEquals(params['version'], 3)
+        self.assertEquals([(x['range']['start']['line'], x['message'])
+                for x in params['diagnostics']],
+                [(0, 'Trailing whitespace'), (1, 'Trailing whitespace')])
+        self.assertEquals(self.server.documents[URI].text, 'a: 1 \nb: 2  \n')
+
+        self.send(notification('textDocument/didClose', textDocument={'uri': URI}))
+        self.assertEquals(self.messages(5)[4]['params'], {'uri': URI, 'diagnostics': []})
+        self.send({'jsonrpc': '2.0', 'id': 3, 'method': 'shutdown'})
+        self.send(notification('exit'))
+        self.thread.join()
+        self.assertEquals(self.status, 0)
+
+    def test_errors(self):
+        self.quiet()
+
+        # a lint that fails publishes the error, and the lint thread goes on
+        lint_text = self.server.runner.lint_text
+
+        def failing_lint_text(path, text, budget=None):
+            if text.startswith('fail'):
+                raise ValueError('lint failed')
+            return lint_text(path, text, budget)
+
+        self.server.runner.lint_text = failing_lint_text
+        self.send(notification('textDocument/didOpen',
+                textDocument={'uri': URI, 'version': 1, 'text': 'fail: 1\n'}))
+        self.assertEquals([x['message'] for x in self.messages(1)[0]['params']['diagnostics']],
+                ['Internal error: lint failed'])
+        self.send(notification('textDocument/didChange', textDocument={'uri': URI, 'version': 2},
+                contentChanges=[{'text': 'a: 1 \n'}]))
+        self.assertEquals([x['message'] for x in self.messages(2)[1]['params']['diagnostics']],
+                ['Trailing whitespace'])
+
+        # a handler that fails answers with an internal error
+        def fail(params):
+            raise ValueError('handler failed')
+
+        self.server.handlers['fail'] = fail
+        self.send({'jsonrpc': '2.0', 'id': 1, 'method': 'fail'})
+        self.assertEquals(self.messages(3)[2]['error'],
+                {'code': -32603, 'message': 'Internal error: handler failed'})
+        self.assertIn('handler failed', sys.stderr.getvalue())
+
+    def test_budget(self):
+        # each lint has its own copy of the runner's budget
+        budget = self.server.runner.budget = ParseBudget(max_steps=10 ** 6)
+        cancel = threading.Event()
+        cancel.set()
+        text = ''.join('- name: t{}\n  debug: msg=x\n'.format(i) for i in range(50))
+        diagnostics = self.server.lint(URI, text, cancel)
+        self.assertEquals([x.msg for x in diagnostics], ['Parse cancelled'])
+        self.assertIsNone(budget.cancel)
+        self.assertEquals(self.server.runner.lint_text('a.yml', text), [])
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import os
+import tempfile
+from collections import OrderedDict
+from unittest import TestCase
+from ansible_hint.memory import (MemoryTracker, format_size, parse_size, projected_memory,
+        projected_stream_memory, PRUNED_BYTES_PER_CHAR)
+from ansible_hint.rules import RULES
+from ansible_hint.runner import LintRunner
+
+TEXT = (
+    'a: 1 \n'
+    '---\n'
+    '- b\n'
+    '---\n'
+    'c:\n'
+    '   d: 2\n'
+)
+
+DIAGNOSTICS = [
+    '<text>:1:5: Trailing whitespace [trailing_whitespace]',
+    '<text>:3:1: Multiple documents in one file [disallow_multiple_documents]',
+    '<text>:6:4: Indentation is not a multiple of 2 [indentation]',
+]
+
+
+def build_runner(**kwargs):
+    return LintRunner('yaml', rules=[x() for x in RULES.values()], **kwargs)
+
+
+def phase_names(tracker, path):
+    return [x[0] for x in tracker.phases(path)]
+
+
+class TestMemory(TestCase):
+    def test_sizes(self):
+        self.assertEquals(parse_size('4096'), 4096)
+        self.assertEquals(parse_size('512k'), 512 * 1024)
+        self.assertEquals(parse_size('1.5G'), 3 * 1024 ** 3 // 2)
+        self.assertEquals(parse_size(' 64MiB '), 64 * 1024 ** 2)
+        self.assertRaises(ValueError, parse_size, '5x')
+        self.assertEquals(format_size(200), '200B')
+        self.assertEquals(format_size(1536), '1.5KB')
+        self.assertEquals(format_size(3 * 1024 ** 3), '3.0GB')
+
+    def test_phases(self):
+        tracker = MemoryTracker()
+        tracker.files['a.yml'] = OrderedDict([('parse', [1000, 300, 9000]),
+                ('lines', [50, 40, 9100]), ('rules', [20, 10, 9100])])
+        self.assertEquals(tracker.phases('a.yml'), [('parse', 700, 0, 9000),
+                ('tree', 300, 300, None), ('lines', 50, 40, 9100), ('rules', 20, 10, 9100)])
+        tracker.files['b.yml'] = OrderedDict([('parse', [1000, None, None])])
+        self.assertEquals(tracker.phases('b.yml'), [('parse', 1000, None, None)])
+        self.assertIn('a.yml', tracker.format_report())
+
+    def test_memory_report(self):
+        runner = build_runner(memory_report=True)
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TEXT)), DIAGNOSTICS)
+        runner.lint_text('<error>', '{')
+        # NOTE: the tree is only measured apart from the parse with tracemalloc
+        tree = ['tree'] if runner.memory.tracing else []
+        self.assertEquals(phase_names(runner.memory, '<text>'),
+                ['parse'] + tree + ['lines', 'rules'])
+        self.assertEquals(phase_names(runner.memory, '<error>'), ['parse'] + tree)
+        self.assertTrue(all(x[3] > 0 for x in runner.memory.phases('<text>') if x[0] != 'tree'))
+
+        runner = build_runner(memory_report=True, jobs=2)
+        try:
+            list(runner.lint_files(['testfiles/test.yml', 'testfiles/valid_config.yml']))
+        finally:
+            runner.close()
+        self.assertEquals(list(runner.memory.files),
+                ['testfiles/test.yml', 'testfiles/valid_config.yml'])
+
+    def test_max_memory(self):
+        runner = build_runner(max_memory=projected_memory(len(TEXT)))
+        self.assertEquals(runner.check_memory(TEXT), None)
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TEXT)), DIAGNOSTICS)
+
+        # the largest document is the last, of 15 characters
+        runner = build_runner(max_memory=15 * PRUNED_BYTES_PER_CHAR, memory_report=True)
+        self.assertEquals(runner.check_memory(TEXT), [(0, 0), (6, 1), (14, 3)])
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TEXT)), DIAGNOSTICS)
+        self.assertEquals(phase_names(runner.memory, '<text>')[-2:], ['lines', 'rules'])
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TEXT + '---\n{\n')),
+                ['<text>:9:1: Expected closing "}"'])
+
+        runner = build_runner(max_memory=14 * PRUNED_BYTES_PER_CHAR)
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TEXT)),
+                ['<text>:1:1: Skipped: parsing needs about {} of memory, over the limit of '
+                 '{}'.format(format_size(15 * PRUNED_BYTES_PER_CHAR),
+                 format_size(14 * PRUNED_BYTES_PER_CHAR))])
+        text, result, error = runner.parse_file('testfiles/test.yml')
+        self.assertTrue(error.msg.startswith('Skipped: '))
+
+    def test_max_memory_file(self):
+        fd, path = tempfile.mkstemp(suffix='.yml')
+        os.close(fd)
+        try:
+            with io.open(path, 'w', encoding='utf-8') as f:
+                f.write(TEXT)
+            diagnostics = [x.replace('<text>', path) for x in DIAGNOSTICS]
+
+            # a file that does not fit whole is streamed, after its documents are sized
+            needed = projected_stream_memory(len(TEXT), 15)
+            runner = build_runner(max_memory=needed, memory_report=True)
+            self.assertEquals(map(unicode, runner.lint_file(path)), diagnostics)
+            self.assertEquals(list(runner.memory.files[path]), ['read', 'lines', 'parse', 'rules'])
+
+            runner = build_runner(max_memory=needed - 1)
+            self.assertEquals(map(unicode, runner.lint_file(path)), ['{}:1:1: Skipped: parsing '
+                    'needs about {} of memory, over the limit of {}'.format(path,
+                    format_size(needed), format_size(needed - 1))])
+        finally:
+            os.remove(path)
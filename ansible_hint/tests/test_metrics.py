@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import json
+import os
+from collections import OrderedDict
+from unittest import TestCase
+from ansible_hint.metrics import RunMetrics, count_cache
+from ansible_hint.rules import RULES, RuleEngine
+from ansible_hint.runner import LintRunner
+
+PATHS = ['testfiles/test.yml', 'testfiles/valid_config.yml', 'testfiles/invalid_config.yml']
+
+
+def build_runner(**kwargs):
+    return LintRunner('yaml', rules=[x() for x in RULES.values()], metrics=True, **kwargs)
+
+
+def lint(runner, paths):
+    try:
+        list(runner.lint_files(paths))
+    finally:
+        runner.close()
+    runner.metrics.finish(runner.engine, max(runner.jobs, 1))
+    return runner.metrics
+
+
+class TestMetrics(TestCase):
+    def test_to_dict(self):
+        metrics = RunMetrics()
+        count_cache('test', True)
+        count_cache('test', True)
+        count_cache('test', False)
+        metrics.add(None, 'grammar', 1.0)
+        metrics.add('a.yml', 'parse', 2.0)
+        metrics.add('a.yml', 'rules', 1.0)
+        metrics.add_bytes('a.yml', 300)
+        metrics.merge('b.yml', OrderedDict([('parse', 4.0)]), 100, [('indentation', 3, 0.5)])
+        metrics.finish(RuleEngine([]), workers=2)
+        metrics.seconds = 5.0
+
+        data = metrics.to_dict(top=1)
+        self.assertEquals((data['files'], data['bytes']), (2, 400))
+        self.assertEquals((data['files_per_second'], data['bytes_per_second']), (0.4, 80.0))
+        self.assertEquals(data['phases'], {'grammar': 1.0, 'parse': 6.0, 'rules': 1.0})
+        self.assertEquals(data['caches']['test'], {'hits': 2, 'misses': 1, 'hit_rate': 2 / 3})
+        self.assertEquals(data['worker_utilization'], 0.7)
+        self.assertEquals(data['slowest_files'], [{'path': 'b.yml', 'seconds': 4.0, 'bytes': 100}])
+        self.assertEquals(data['slowest_rules'],
+                [{'rule': 'indentation', 'seconds': 0.5, 'calls': 3}])
+
+    def test_prometheus(self):
+        metrics = RunMetrics()
+        metrics.add('a "b"\\c.yml', 'parse', 0.25)
+        metrics.finish(RuleEngine([]))
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE ansible_hint_files gauge\nansible_hint_files 1\n', text)
+        self.assertIn('ansible_hint_phase_seconds{phase="parse"} 0.25\n', text)
+        self.assertIn('ansible_hint_file_seconds{rank="1",path="a \\"b\\"\\\\c.yml"} 0.25\n', text)
+
+    def test_runner(self):
+        metrics = lint(build_runner(), PATHS)
+        self.assertEquals(list(metrics.files), PATHS)
+        self.assertEquals(list(metrics.files[PATHS[0]]), ['read', 'parse', 'lines', 'rules'])
+        # NOTE: a file that does not parse is not walked by the rules
+        self.assertEquals(list(metrics.files[PATHS[2]]), ['read', 'parse'])
+        self.assertEquals(metrics.bytes, dict((x, os.path.getsize(x)) for x in PATHS))
+        self.assertIn('grammar', metrics.phases)
+        data = json.loads(metrics.to_json())
+        self.assertEquals(data['files'], 3)
+
+        # workers send back their measurements and rule times with each file
+        workers = lint(build_runner(jobs=2), PATHS)
+        self.assertEquals(list(workers.files), PATHS)
+        self.assertEquals(workers.bytes, metrics.bytes)
+        self.assertEquals(dict((name, x[0]) for name, x in workers.rules.items()),
+                dict((name, x[0]) for name, x in metrics.rules.items()))
+        self.assertEquals(workers.workers, 2)
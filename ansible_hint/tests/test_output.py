@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import json
+from unittest import TestCase
+from ansible_hint.output import TextFormatter, JsonLinesFormatter, SarifFormatter
+from ansible_hint.rules import Diagnostic, RULES
+from ansible_hint.runner import LintRunner
+
+FILES = [
+    ('a.yml', [Diagnostic('a.yml', (0, 4), 'Trailing whitespace', 'trailing_whitespace')]),
+    ('b.yml', []),
+    ('c.yml', [Diagnostic('c.yml', (2, 0), 'Expected closing "}"')]),
+]
+
+
+class TestFormatters(TestCase):
+    def format(self, cls):
+        stream = io.BytesIO()
+        formatter = cls(stream, [RULES['trailing_whitespace']()])
+        formatter.begin()
+        for path, diagnostics in FILES:
+            formatter.write_file(path, diagnostics)
+        formatter.end()
+        return stream.getvalue().decode('utf-8')
+
+    def test_text(self):
+        self.assertEquals(self.format(TextFormatter),
+                'a.yml:1:5: Trailing whitespace [trailing_whitespace]\n'
+                'c.yml:3:1: Expected closing "}"\n')
+
+    def test_json_lines(self):
+        lines = self.format(JsonLinesFormatter).splitlines()
+        self.assertEquals(map(json.loads, lines), [
+                {'path': 'a.yml', 'line': 1, 'column': 5, 'message': 'Trailing whitespace',
+                    'rule': 'trailing_whitespace'},
+                {'path': 'c.yml', 'line': 3, 'column': 1, 'message': 'Expected closing "}"',
+                    'rule': None},
+            ])
+
+    def test_fixed(self):
+        stream = io.BytesIO()
+        for cls in [TextFormatter, JsonLinesFormatter]:
+            cls(stream).write_fixed('a.yml', FILES[0][1])
+        text, line = stream.getvalue().decode('utf-8').splitlines()
+        self.assertEquals(text, 'fixed: a.yml:1:5: Trailing whitespace [trailing_whitespace]')
+        self.assertEquals(json.loads(line)['fixed'], True)
+
+        # SARIF marks a fixed diagnostic as absent from the run
+        stream = io.BytesIO()
+        formatter = SarifFormatter(stream)
+        formatter.begin()
+        formatter.write_fixed('a.yml', FILES[0][1])
+        formatter.end()
+        result, = json.loads(stream.getvalue().decode('utf-8'))['runs'][0]['results']
+        self.assertEquals(result['baselineState'], 'absent')
+
+    def test_sarif(self):
+        log = json.loads(self.format(SarifFormatter))
+        self.assertEquals(log['version'], '2.1.0')
+        run = log['runs'][0]
+        self.assertEquals([x['id'] for x in run['tool']['driver']['rules']],
+                ['trailing_whitespace', 'parse_error'])
+        self.assertEquals([(x['ruleId'], x['locations'][0]['physicalLocation']['region'])
+                for x in run['results']], [
+                ('trailing_whitespace', {'startLine': 1, 'startColumn': 5}),
+                ('parse_error', {'startLine': 3, 'startColumn': 1}),
+            ])
+
+        stream = io.BytesIO()
+        formatter = SarifFormatter(stream)
+        formatter.begin()
+        formatter.end()
+        self.assertEquals(json.loads(stream.getvalue())['runs'][0]['results'], [])
+
+
+class TestLintFiles(TestCase):
+    def test_jobs(self):
+        paths = ['testfiles/invalid_config.yml', 'testfiles/test.yml',
+                'testfiles/invalid_disallow_multiple_documents.yml']
+        runner = LintRunner('yaml', rules=[cls() for cls in RULES.values()], jobs=2)
+        try:
+            results = [(path, map(unicode, diagnostics))
+                    for path, diagnostics in runner.lint_files(paths)]
+        finally:
+            runner.close()
+        self.assertEquals(results, [
+                ('testfiles/invalid_config.yml',
+                    ['testfiles/invalid_config.yml:2:6: '
+                     'Unterminated Jinja expression, expected "}}"']),
+                ('testfiles/test.yml', []),
+                ('testfiles/invalid_disallow_multiple_documents.yml',
+                    ['testfiles/invalid_disallow_multiple_documents.yml:4:1: '
+                    'Multiple documents in one file [disallow_multiple_documents]']),
+            ])
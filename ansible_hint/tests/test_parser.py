@@ -4,6 +4,7 @@ from __future__ import division, absolute_import, print_function, unicode_litera
 from unittest import TestCase
 from ansible_hint.tests.base import ParserTestBase
 import ansible_hint.parser as ahp
+import io
 import json
 
 class TestAstResult(TestCase):
@@ -382,3 +383,236 @@ class TestParseProduction(ParserTestBase, TestCase):
         self.assertAst(result, [
                     ahp.AstNode('money', '$67890', (0, 7), ahp.AstNode('digits', '67890', (0, 8)))
             ])
+
+    def test_lookahead(self):
+        ctx = ahp.ParseCtx()
+        ctx.text = 'foobar'
+
+        prod = ahp.Lookahead(ahp.Literal('foo'))
+        self.assertTrue(prod.evaluate(ctx))
+        self.assertPeek(ctx, 'f', (0, 0))
+
+        prod = ahp.Lookahead(ahp.Negate(ahp.Literal('foo')))
+        self.assertFalse(prod.evaluate(ctx))
+        self.assertPeek(ctx, 'f', (0, 0))
+
+
+class TestJinjaProduction(ParserTestBase, TestCase):
+    def test_tags(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('x {{ f("}}", [1, {"a": 2}]) }}{% if x %}{# c #}')
+        self.assertFalse(ahp.Jinja().evaluate(ctx))
+        ctx.next(2)
+        self.assertAst(ahp.Jinja().evaluate(ctx),
+                [ahp.AstNode('jinja_expression', '{{ f("}}", [1, {"a": 2}]) }}', (0, 2))])
+        self.assertAst(ahp.Jinja().evaluate(ctx),
+                [ahp.AstNode('jinja_statement', '{% if x %}', (0, 30))])
+        self.assertAst(ahp.Jinja().evaluate(ctx),
+                [ahp.AstNode('jinja_comment', '{# c #}', (0, 40))])
+        self.assertTrue(ctx.eof())
+
+    def test_multiline(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('{% if x\n  %}')
+        with self.assertRaises(ahp.ParseError) as cm:
+            ahp.Jinja().evaluate(ctx)
+        self.assertEquals(unicode(cm.exception), '(1, 1): Unterminated Jinja expression, expected "%}"')
+        self.assertTrue(ahp.Jinja(True).evaluate(ctx))
+        self.assertPeek(ctx, '', (1, 4))
+
+    def test_errors(self):
+        for text, error in [
+                ('a {{ b', '(1, 3): Unterminated Jinja expression, expected "}}"'),
+                ('{{ "b }}', '(1, 4): Unterminated string in Jinja expression'),
+                ('{{ f(a] }}', '(1, 5): Unclosed "(" in Jinja expression'),
+                ('{{ a) }}', '(1, 5): Unexpected ")" in Jinja expression'),
+                ('{# a }}', '(1, 1): Unterminated Jinja comment, expected "#}"')]:
+            ctx = ahp.ParseCtx()
+            ctx.reset(text)
+            ctx.next(text.index('{'))
+            with self.assertRaises(ahp.ParseError) as cm:
+                ahp.Jinja().evaluate(ctx)
+            self.assertEquals(unicode(cm.exception), error)
+
+
+class TestStreamParseCtx(ParserTestBase, TestCase):
+    def setUp(self):
+        self.ctx = ahp.StreamParseCtx(chunk_size=3)
+        self.ctx.add_decl(ahp.Decl('item', ahp.OneOrMore(ahp.CharRange('a', 'z')),
+                ahp.Literal(';\n'), ahp.Cut()))
+        self.ctx.add_decl(ahp.Decl('items', ahp.ZeroOrMore(ahp.DeclRef('item'))))
+
+    def test_read(self):
+        ctx = self.ctx
+        ctx.reset(io.StringIO('ab\ncd'), 2)
+        self.assertPeek(ctx, 'ab\nc', (2, 0))
+        self.assertEquals(ctx.next(4), 'ab\nc')
+        self.assertPeek(ctx, 'd', (3, 1))
+        self.assertFalse(ctx.eof())
+        self.assertTrue(ctx.eof(2))
+        ctx.next()
+        self.assertTrue(ctx.eof())
+
+    def test_release(self):
+        ctx = self.ctx
+        ctx.reset(io.StringIO('ab;\ncde;\nf;\n'))
+        result = ctx.get_decl('items').evaluate(ctx)
+        # all of the input is behind the cut after the last item, and so is
+        # the text of every node
+        self.assertAst(result, [ahp.AstNode('items', None, (0, 0),
+                ahp.AstNode('item', None, (0, 0)),
+                ahp.AstNode('item', None, (1, 0)),
+                ahp.AstNode('item', None, (2, 0)))])
+        self.assertTrue(ctx.eof())
+        self.assertEquals(ctx.slice(9, 11), None)
+        self.assertEquals((ctx.state.base, ctx.state.buffer), (12, ''))
+
+    def test_jinja(self):
+        ctx = self.ctx
+        ctx.reset('{{ a("}}")\n}} {{ b }}')
+        with self.assertRaises(ahp.ParseError) as cm:
+            ahp.Jinja().evaluate(ctx)
+        self.assertEquals(unicode(cm.exception),
+                '(1, 1): Unterminated Jinja expression, expected "}}"')
+        self.assertAst(ahp.Jinja(True).evaluate(ctx),
+                [ahp.AstNode('jinja_expression', '{{ a("}}")\n}}', (0, 0))])
+        ctx.next()
+        self.assertAst(ahp.Jinja().evaluate(ctx),
+                [ahp.AstNode('jinja_expression', '{{ b }}', (1, 3))])
+
+
+class TestIndentProduction(ParserTestBase, TestCase):
+    def setUp(self):
+        # item := Indent, [a-z]+, '\n', (SameIndent, [a-z]+, '\n')*, Dedent
+        self.block = ahp.Sequence(
+                ahp.Indent(), ahp.OneOrMore(ahp.CharRange('a', 'z')), ahp.Literal('\n'),
+                ahp.ZeroOrMore(ahp.Sequence(
+                    ahp.SameIndent(), ahp.OneOrMore(ahp.CharRange('a', 'z')), ahp.Literal('\n'))),
+                ahp.Dedent())
+
+    def test_indent(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('  foo')
+        self.assertTrue(ahp.Indent().evaluate(ctx))
+        self.assertPeek(ctx, 'foo', (0, 2))
+        self.assertEquals(ctx.indents, (-1, 2))
+
+        ctx.reset('  foo')
+        ctx.push_indent(2)
+        self.assertFalse(ahp.Indent().evaluate(ctx))
+        self.assertEquals(ctx.indents, (-1, 2))
+
+    def test_indent_at_least(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('  foo')
+        ctx.push_indent(2)
+        self.assertTrue(ahp.IndentAtLeast(0).evaluate(ctx))
+        self.assertEquals(ctx.indents, (-1, 2, 2))
+
+    def test_same_indent_dedent(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('  foo')
+        ctx.push_indent(2)
+        self.assertTrue(ahp.SameIndent().evaluate(ctx))
+        self.assertTrue(ahp.Dedent().evaluate(ctx))
+        self.assertEquals(ctx.indents, (-1,))
+        self.assertFalse(ahp.Dedent().evaluate(ctx))
+
+    def test_block(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('  foo\n  bar\n    baz\n')
+        self.assertTrue(self.block.evaluate(ctx))
+        self.assertPeek(ctx, '    baz', (2, 0))
+        self.assertEquals(ctx.indents, (-1,))
+
+    def test_backtrack(self):
+        ctx = ahp.ParseCtx()
+        ctx.reset('  foo\n  123\n')
+        prod = ahp.Sequence(self.block, ahp.Literal('  123\n'), ahp.Literal('x'))
+        self.assertFalse(prod.evaluate(ctx))
+        self.assertEquals(ctx.indents, (-1,))
+        self.assertPeek(ctx, '  foo', (0, 0))
+
+
+class TestCutProduction(ParserTestBase, TestCase):
+    def test_cut_or_group(self):
+        ctx = ahp.ParseCtx()
+        ctx.text = 'foobar'
+
+        # without a cut the second alternative is tried
+        prod = ahp.OrGroup(
+                ahp.Sequence(ahp.Literal('foo'), ahp.Literal('x')), ahp.Literal('foobar'))
+        self.assertTrue(prod.evaluate(ctx.clone()))
+
+        prod = ahp.OrGroup(
+                ahp.Sequence(ahp.Literal('foo'), ahp.Cut(), ahp.Literal('x')), ahp.Literal('foobar'))
+        self.assertFalse(prod.evaluate(ctx))
+        self.assertPeek(ctx, 'f', (0, 0))
+        self.assertEquals(ctx.state.choices, [])
+
+    def test_cut_is_local(self):
+        ctx = ahp.ParseCtx()
+        ctx.text = 'foobar'
+
+        inner = ahp.OrGroup(
+                ahp.Sequence(ahp.Literal('foo'), ahp.Cut(), ahp.Literal('x')), ahp.Literal('f'))
+        prod = ahp.OrGroup(inner, ahp.Literal('foobar'))
+        self.assertTrue(prod.evaluate(ctx))
+        self.assertPeek(ctx, '', (0, 6))
+
+    def test_cut_repetition(self):
+        ctx = ahp.ParseCtx()
+        ctx.text = 'a1a2ab'
+
+        item = ahp.Sequence(ahp.Literal('a'), ahp.Cut(), ahp.CharRange('0', '9'))
+        self.assertFalse(ahp.ZeroOrMore(item).evaluate(ctx))
+
+        ctx = ahp.ParseCtx()
+        ctx.text = 'a1a2'
+        self.assertTrue(ahp.OneOrMore(item).evaluate(ctx))
+        self.assertTrue(ctx.eof())
+
+    def test_memo_pruning(self):
+        ctx = ahp.ParseCtx(memoize=True)
+        ctx.add_decl(ahp.Decl('digit', ahp.CharRange('0', '9')))
+        ctx.reset('1;2;3;4;x')
+        prod = ahp.ZeroOrMore(ahp.Sequence(ahp.DeclRef('digit'), ahp.Literal(';'), ahp.Cut()))
+        result = prod.evaluate(ctx)
+        self.assertTrue(result)
+        self.assertEquals(len(result.items), 4)
+        self.assertPeek(ctx, 'x', (0, 8))
+        self.assertEquals(ctx.state.commit_pos, 8)
+        self.assertEquals(sorted(ctx.state.memo), [8])
+
+    def test_memo_reuse(self):
+        ctx = ahp.ParseCtx(memoize=True)
+        ctx.add_decl(ahp.Decl('word', ahp.OneOrMore(ahp.CharRange('a', 'z'))))
+        ctx.reset('foo!')
+        prod = ahp.OrGroup(
+                ahp.Sequence(ahp.DeclRef('word'), ahp.Literal('?')),
+                ahp.Sequence(ahp.DeclRef('word'), ahp.Literal('!')))
+        self.assertAst(prod.evaluate(ctx), [ahp.AstNode('word', 'foo', (0, 0))])
+        self.assertTrue(ctx.eof())
+        self.assertEquals(len(ctx.state.memo[0]), 1)
+
+
+class TestSideTableDecl(TestCase):
+    def test_backtrack(self):
+        comment = ahp.SideTableDecl('comment', ahp.Literal('#'), ahp.CharRange('a', 'z'))
+        prod = ahp.OrGroup(
+                ahp.Sequence(comment, ahp.Literal('!')),
+                ahp.Sequence(ahp.Literal('#a'), comment))
+        ctx = ahp.ParseCtx()
+        ctx.reset('#a#b')
+        self.assertEquals(prod.evaluate(ctx).items, [])
+        self.assertEquals(ctx.side_entries(), [(2, '#b')])
+
+    def test_memo_reuse(self):
+        ctx = ahp.ParseCtx(memoize=True)
+        ctx.add_decl(ahp.SideTableDecl('comment', ahp.Literal('#'), ahp.CharRange('a', 'z')))
+        ctx.reset('#a;')
+        prod = ahp.OrGroup(
+                ahp.Sequence(ahp.DeclRef('comment'), ahp.Literal('!')),
+                ahp.Sequence(ahp.DeclRef('comment'), ahp.Literal(';')))
+        self.assertTrue(prod.evaluate(ctx))
+        self.assertEquals(ctx.side_entries(), [(0, '#a')])
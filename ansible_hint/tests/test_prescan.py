@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import glob
+import io
+import unittest
+from ansible_hint.analysis import GrammarAnalyzer
+from ansible_hint.grammar import load_grammar
+from ansible_hint.parser import (ParseCtx, ParseError, Literal, OneOf, Sequence, OrGroup,
+        ZeroOrMore, OneOrMoreUntil, ZeroOrMoreUntil, Decl, DeclRef, Eof, Cut, Any)
+from ansible_hint.prescan import PreScan, load_numpy
+from ansible_hint.runner import parse_text
+
+TEXTS = ['', '\n', 'a', ' \t', 'a: 1\n  b: 2  \n\t# c\n   \n', '- "x\\"y"\n- \'é\'\n\t \n#',
+         'k: {{ v }}  # c\r\n\n']
+
+
+def parse(decls, text, scans=True):
+    ctx = ParseCtx(decls)
+    if not scans:
+        ctx.scans = {}
+    ctx.reset(text)
+    try:
+        result = ctx.get_decl(decls[0].name).evaluate(ctx)
+    except ParseError as e:
+        return unicode(e)
+    return unicode(result), ctx.position()
+
+
+class TestPreScan(unittest.TestCase):
+    def test_positions(self):
+        prescan = PreScan('a: "b"\n  c: d\n', False)
+        self.assertEquals(list(prescan.positions(':\n')), [1, 6, 10, 13])
+        self.assertEquals(prescan.next_of(':\n', 2), 6)
+        self.assertEquals(prescan.next_of('"', 6), 14)
+
+    def test_lines(self):
+        starts, ends, indents, content_ends, flags = PreScan('a\n \t# b  \n   ', False).lines()
+        self.assertEquals(list(starts), [0, 2, 10])
+        self.assertEquals(list(ends), [1, 9, 13])
+        self.assertEquals(list(indents), [0, 2, 3])
+        self.assertEquals(list(content_ends), [1, 5, 3])
+        self.assertEquals(list(flags), [0, 6, 1])
+
+    @unittest.skipIf(load_numpy() is None, 'NumPy is not installed')
+    def test_vectorized(self):
+        texts = list(TEXTS)
+        for path in glob.glob('testfiles/*.yml'):
+            with io.open(path, encoding='utf-8') as f:
+                texts.append(f.read())
+        for text in texts:
+            vectorized, fallback = PreScan(text, True), PreScan(text, False)
+            self.assertEquals(vectorized.lines(), fallback.lines(), text)
+            for chars in ['\n', ' \t:#', '"\\']:
+                self.assertEquals(vectorized.positions(chars), fallback.positions(chars), text)
+
+
+class TestScans(unittest.TestCase):
+    def test_first_chars(self):
+        analyzer = GrammarAnalyzer([Decl('a', OneOf('xy')), Decl('b', DeclRef('b'), 'z')])
+        self.assertEquals(analyzer.first_chars(Sequence(ZeroOrMore(Literal(' ')), DeclRef('a'))),
+                (' xy', False))
+        self.assertEquals(analyzer.first_chars(OrGroup(Literal('\n'), Eof())), ('\n', False))
+        self.assertEquals(analyzer.first_chars(Sequence(Cut(), Literal('x'))), (None, True))
+        self.assertEquals(analyzer.first_chars(Any()), (None, True))
+        self.assertEquals(analyzer.first_chars(DeclRef('b')), (None, True))
+        self.assertEquals(analyzer.first_chars(Literal('x').on_fail('no x')), (None, True))
+
+    def test_scans(self):
+        skip = OneOrMoreUntil(OrGroup(Literal('\n'), Eof()))
+        scans = GrammarAnalyzer([Decl('a', skip, ZeroOrMoreUntil(Any()))]).scans()
+        self.assertEquals(scans, {skip: '\n'})
+
+    def test_parse(self):
+        decls = load_grammar('yaml')
+        self.assertTrue(decls.scans())
+        for text in TEXTS + ["a: 'b\n  c'\nd: \"e\\\n  f\"\n", "a: 'b\n c\n"]:
+            self.assertEquals(parse(decls, text), parse(decls, text, False), text)
+        result, error = parse_text(decls, 'stream', "a: 'b\n c\n")
+        self.assertEquals(unicode(error), '(1, 5): Expected closing single-quote')
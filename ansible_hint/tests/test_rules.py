@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import os
+import tempfile
+import unittest
+from ansible_hint.parser import AstNode, AstResult
+from ansible_hint.rules import Rule, RuleEngine, RULES
+from ansible_hint.runner import LintRunner
+
+
+class RecordingRule(Rule):
+    name = 'recording'
+
+    def begin(self, path):
+        self.seen = []
+
+    def visit_key(self, node):
+        self.seen.append(node.text)
+
+    def visit_value(self, node):
+        self.seen.append(node.text)
+        if node.text == 'bad':
+            self.report(node, 'Bad value')
+
+
+class JinjaRule(Rule):
+    name = 'jinja'
+
+    def visit_jinja_expression(self, node):
+        self.report(node, 'Expression {}'.format(node.text))
+
+
+class TestRuleEngine(unittest.TestCase):
+    def setUp(self):
+        self.ast = AstResult(AstNode('root', 'a: bad', (0, 0),
+                AstNode('entry', 'a: bad', (0, 0),
+                    AstNode('key', 'a', (0, 0)),
+                    AstNode('value', 'bad', (0, 3)))))
+
+    def test_dispatch(self):
+        rule = RecordingRule()
+        engine = RuleEngine([rule])
+        self.assertEquals(engine.node_names(), set(['key', 'value']))
+
+        diagnostics = engine.run('test.yml', self.ast)
+        self.assertEquals(rule.seen, ['a', 'bad'])
+        self.assertEquals(map(unicode, diagnostics), ['test.yml:1:4: Bad value [recording]'])
+        self.assertEquals(engine.stats['recording'].calls, 2)
+
+    def test_builtin_rules(self):
+        runner = LintRunner('yaml', rules=[
+                RULES[name]() for name in ['disallow_multiple_documents', 'indentation']])
+        self.assertEquals(map(unicode, runner.lint_file(
+                'testfiles/invalid_disallow_multiple_documents.yml')), [
+                'testfiles/invalid_disallow_multiple_documents.yml:4:1: '
+                'Multiple documents in one file [disallow_multiple_documents]'
+            ])
+        self.assertEquals(runner.lint_file('testfiles/valid_disallow_multiple_documents.yml'), [])
+        self.assertEquals(runner.lint_file('testfiles/valid_indentation.yml'), [])
+        self.assertEquals(map(unicode, runner.lint_text('<text>', 'a:\n   b: 1\n')),
+                ['<text>:2:4: Indentation is not a multiple of 2 [indentation]'])
+
+    def test_trailing_whitespace(self):
+        runner = LintRunner('yaml', rules=[RULES['trailing_whitespace']()])
+        self.assertEquals(map(unicode, runner.lint_text('<text>', 'a: 1 \n  \nb: 2\n')), [
+                '<text>:1:5: Trailing whitespace [trailing_whitespace]',
+                '<text>:2:1: Trailing whitespace [trailing_whitespace]',
+            ])
+
+    def test_jinja_pruned(self):
+        # the decls that scan Jinja are expanded, not dropped, when their nodes are kept
+        text = 'a: x {{ y }}\nb: {{ z }}\n'
+        expected = ['t:1:6: Expression {{ y }} [jinja]', 't:2:4: Expression {{ z }} [jinja]']
+        for prune in [True, False]:
+            runner = LintRunner('yaml', rules=[JinjaRule()], prune=prune)
+            self.assertEquals(map(unicode, runner.lint_text('t', text)), expected)
+
+    def test_unreadable(self):
+        # a file that cannot be read is reported, and the next file is linted
+        fd, path = tempfile.mkstemp(suffix='.yml')
+        os.write(fd, b'a: \xff\n')
+        os.close(fd)
+        try:
+            for runner in [LintRunner('yaml', rules=[RULES['trailing_whitespace']()]),
+                    LintRunner('yaml', rules=[RULES['trailing_whitespace']()], stream=True)]:
+                results = list(runner.lint_files(['missing.yml', path,
+                        'testfiles/invalid_config.yml']))
+                self.assertEquals([map(unicode, x) for name, x in results], [
+                        ['missing.yml:1:1: Cannot read file: No such file or directory'],
+                        ['{}:1:1: Cannot decode file as UTF-8: invalid start byte at byte '
+                         '3'.format(path)],
+                        ['testfiles/invalid_config.yml:2:6: Unterminated Jinja expression, '
+                         'expected "}}"'],
+                    ])
+            text, result, error = runner.parse_file('missing.yml')
+            self.assertEquals(error.msg, 'Cannot read file: No such file or directory')
+        finally:
+            os.remove(path)
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from ansible_hint.rules import RULES
+from ansible_hint.runner import LintRunner
+from ansible_hint.watch import Watcher
+
+FILES = {
+    'site.yml': '- hosts: all\n  tasks:\n    - include_tasks: tasks/setup.yml\n',
+    'tasks/setup.yml': '- debug: msg=setup\n',
+}
+
+
+def events(items):
+    return [(path, map(unicode, new), map(unicode, fixed)) for path, new, fixed in items]
+
+
+class TestWatcher(TestCase):
+    def setUp(self):
+        self.root = os.path.relpath(os.path.realpath(tempfile.mkdtemp()))
+        for name, text in FILES.items():
+            self.write(name, text)
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def path(self, name):
+        return os.path.join(self.root, name)
+
+    def write(self, name, text):
+        path = self.path(name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+
+    def watcher(self, paths, follow_includes=False, project=True):
+        runner = LintRunner('yaml', rules=[x() for x in RULES.values()], project=project)
+        return Watcher(runner, paths, follow_includes)
+
+    def test_directory(self):
+        watcher = self.watcher([self.root])
+        self.assertEquals(watcher.start(), [])
+        self.assertEquals(watcher.linted, [self.path('tasks/setup.yml'), self.path('site.yml')])
+        self.assertEquals(watcher.poll(), [])
+        self.assertEquals(watcher.linted, [])
+
+        # the file that includes a changed file is linted again too
+        self.write('tasks/setup.yml', '- debug: msg=setup \n')
+        self.assertEquals(events(watcher.poll()), [(self.path('tasks/setup.yml'),
+                ['{}:1:19: Trailing whitespace [trailing_whitespace]'.format(
+                self.path('tasks/setup.yml'))], [])])
+        self.assertEquals(watcher.linted, [self.path('tasks/setup.yml'), self.path('site.yml')])
+
+        self.write('tasks/new.yml', 'a: {\n')
+        error = '{}:2:1: Expected closing "}}"'.format(self.path('tasks/new.yml'))
+        self.assertEquals(events(watcher.poll()), [(self.path('tasks/new.yml'), [error], [])])
+        os.remove(self.path('tasks/new.yml'))
+        self.assertEquals(events(watcher.poll()), [(self.path('tasks/new.yml'), [], [error])])
+        self.assertEquals(watcher.linted, [])
+
+    def test_includes(self):
+        watcher = self.watcher([self.path('site.yml')])
+        watcher.start()
+        self.assertEquals(watcher.linted, [self.path('site.yml')])
+        self.assertEquals(set(watcher.signatures),
+                set([self.path('site.yml'), self.path('tasks/setup.yml')]))
+
+        # included files are watched, but only linted with follow_includes
+        self.write('tasks/setup.yml', '- debug: msg=setup \n')
+        self.assertEquals(watcher.poll(), [])
+        self.assertEquals(watcher.linted, [self.path('site.yml')])
+
+        os.remove(self.path('tasks/setup.yml'))
+        watcher.poll()
+        self.assertEquals(list(watcher.graph.files), [self.path('site.yml')])
+        self.write('tasks/setup.yml', '- debug: msg=setup\n')
+        watcher.poll()
+        self.assertEquals(watcher.graph.dependencies(self.path('site.yml')),
+                [self.path('tasks/setup.yml')])
+
+        # a file that is no longer included is no longer watched
+        self.write('site.yml', '- hosts: all\n')
+        watcher.poll()
+        self.assertEquals(list(watcher.signatures), [self.path('site.yml')])
+
+    def test_follow_includes(self):
+        watcher = self.watcher([self.path('site.yml')], follow_includes=True)
+        watcher.start()
+        self.write('tasks/setup.yml', '- debug: msg=setup \n')
+        self.assertEquals([x[0] for x in watcher.poll()], [self.path('tasks/setup.yml')])
+        self.assertEquals(watcher.linted, [self.path('tasks/setup.yml'), self.path('site.yml')])
+
+    def test_pruned(self):
+        # a runner that is not a project runner finds references with a second parse
+        watcher = self.watcher([self.root], project=False)
+        self.assertNotIn('mapping_entry', watcher.runner.keep)
+        watcher.start()
+        self.assertEquals(watcher.graph.dependencies(self.path('site.yml')),
+                [self.path('tasks/setup.yml')])
+        self.write('tasks/setup.yml', '- debug: msg=setup \n')
+        watcher.poll()
+        self.assertEquals(watcher.linted, [self.path('tasks/setup.yml'), self.path('site.yml')])
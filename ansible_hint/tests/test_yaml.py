@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import glob
+import io
+import tempfile
+import unittest
+from multiprocessing import Pool
+from ansible_hint.grammar import load_grammar
+from ansible_hint.comments import COMMENT_DECLS
+from ansible_hint.memory import projected_memory
+from ansible_hint.parser import ParseBudget, ParseBudgetExceeded, ParseCtx
+from ansible_hint.rules import RULES
+from ansible_hint.runner import LintRunner, parse_text, parse_stream
+from ansible_hint.yaml import split_documents, parse_documents
+
+
+class TestYamlGrammar(unittest.TestCase):
+    def setUp(self):
+        self.runner = LintRunner('yaml')
+
+    def lint(self, path):
+        return map(unicode, self.runner.lint_file(path))
+
+    def test_valid_files(self):
+        for name in ['test.yml', 'valid_config.yml', 'valid_indentation.yml',
+                'valid_disallow_multiple_documents.yml',
+                'invalid_disallow_multiple_documents.yml', 'invalid_indentation.yml']:
+            path = 'testfiles/' + name
+            self.assertEquals(self.lint(path), [], path)
+
+    def test_invalid_config(self):
+        # a value that starts with "{{" is a Jinja template, not a flow mapping
+        self.assertEquals(self.lint('testfiles/invalid_config.yml'), [
+                'testfiles/invalid_config.yml:2:6: Unterminated Jinja expression, expected "}}"'
+            ])
+        self.assertEquals(map(unicode, self.runner.lint_text('<text>', 'a: {b: 1\n')),
+                ['<text>:2:1: Expected closing "}"'])
+
+    def test_indentation(self):
+        text = 'a:\n  b:\n    - one\n    - two\n  c: 3\nd: [1, 2]\n'
+        self.assertEquals(self.runner.lint_text('<text>', text), [])
+
+        text = 'a:\n  b: 1\n   c: 2\n'
+        self.assertEquals(map(unicode, self.runner.lint_text('<text>', text)),
+                ['<text>:3:4: Unexpected text'])
+
+
+    def test_jinja(self):
+        result, error = parse_text(load_grammar('yaml', ['plain_scalar']), 'stream',
+                'a: b {{ c | default("#") }} # d\n')
+        scalar = result.items[0].children[0]
+        self.assertEquals(scalar.text, 'b {{ c | default("#") }}')
+        self.assertEquals([(x.name, x.text, x.pos) for x in scalar.children],
+                [('jinja_expression', '{{ c | default("#") }}', (0, 5))])
+
+        self.assertEquals(map(unicode, self.runner.lint_text('<text>', 'a: 1\nb: c {{ d\n')),
+                ['<text>:2:6: Unterminated Jinja expression, expected "}}"'])
+
+
+class TestYamlDocuments(unittest.TestCase):
+    TEXT = ('# header\n---\na: 1\n---\nb: "x\n---\ny"\n---\n'
+            'c: [1,\n---\n]\n--- # comment\n- d\n- e\n')
+
+    def assertSameParse(self, text, pool=None):
+        sequential = parse_text(load_grammar('yaml'), 'stream', text)
+        split = parse_documents('yaml', 'stream', text, pool)
+        self.assertEquals(unicode(split[0]), unicode(sequential[0]))
+        self.assertEquals(unicode(split[1]), unicode(sequential[1]))
+
+    def test_split_documents(self):
+        self.assertEquals(split_documents(self.TEXT), [(0, 0), (9, 1), (18, 3), (35, 7), (52, 11)])
+        self.assertEquals(split_documents('a: 1\n'), [(0, 0)])
+
+    def test_parse_documents(self):
+        self.assertSameParse(self.TEXT)
+        with open('testfiles/test.yml') as f:
+            self.assertSameParse(f.read().decode('utf-8'))
+
+    def test_parse_documents_error(self):
+        self.assertSameParse('a: 1\n---\nb: [1,\n---\nc: 1\n')
+        self.assertSameParse('a: 1\n---\nb: {1\n---\nc: 1\n')
+
+    def test_parse_documents_pool(self):
+        pool = Pool(2)
+        try:
+            self.assertSameParse(self.TEXT, pool)
+            result, error = parse_documents('yaml', 'stream', self.TEXT, pool,
+                    budget=ParseBudget(max_depth=4))
+            self.assertIsInstance(error, ParseBudgetExceeded)
+            self.assertEquals(error.decl_stack[0], 'stream')
+        finally:
+            pool.close()
+            pool.join()
+
+
+def shape(node):
+    """ Returns the names and positions of node and its descendants """
+    return node.name, node.pos, [shape(x) for x in node.children]
+
+
+class TestYamlStream(unittest.TestCase):
+    def test_parse_stream(self):
+        decls = load_grammar('yaml', None, COMMENT_DECLS)
+        text = TestYamlDocuments.TEXT + '---\nf: "{{ g }}" # h\n'
+        expected, expected_error = parse_text(decls, 'stream', text)
+        result, error = parse_stream(decls, 'stream', io.StringIO(text), chunk_size=4)
+        self.assertEquals((expected_error, error), (None, None))
+        # NOTE: the root started in text that the cuts after "---" released,
+        # as did every document but the last
+        self.assertEquals(result.items[0].text, None)
+        self.assertEquals(shape(result.items[0]), shape(expected.items[0]))
+        last = result.items[0].children[-1]
+        self.assertEquals((last.name, last.text), ('document', 'f: "{{ g }}" # h\n'))
+        self.assertEquals(result.items[0].children[1].text, None)
+        self.assertEquals(list(result.comments), list(expected.comments))
+
+        text = 'a: 1\n---\nb: [1,\n---\nc: 1\n'
+        self.assertEquals(unicode(parse_stream(decls, 'stream', text, chunk_size=2)[1]),
+                unicode(parse_text(decls, 'stream', text)[1]))
+
+
+class MemoTracer(object):
+    """ Records the largest memo of a parse """
+    def __init__(self):
+        self.largest = 0
+
+    def evaluate(self, ctx, decl):
+        self.largest = max(self.largest, sum(len(x) for x in ctx.state.memo.values()))
+
+
+class TestYamlMemo(unittest.TestCase):
+    DOCUMENT = '---\n- name: task\n  debug: msg="{{ a }}"\n  when: b == 1\n'
+
+    def largest_memo(self, documents):
+        tracer = MemoTracer()
+        ctx = ParseCtx(load_grammar('yaml'), memoize=True, tracer=tracer)
+        ctx.reset(self.DOCUMENT * documents)
+        self.assertTrue(ctx.get_decl('stream').evaluate(ctx))
+        self.assertTrue(ctx.eof())
+        return tracer.largest
+
+    def test_bounded(self):
+        # the cut after each "---" prunes the memo of the documents before it
+        self.assertEquals(self.largest_memo(40), self.largest_memo(4))
+
+    def test_runner(self):
+        runner = LintRunner('yaml', memoize=True)
+        self.assertEquals(map(unicode, runner.lint_text('<text>', TestYamlDocuments.TEXT)),
+                map(unicode, LintRunner('yaml').lint_text('<text>', TestYamlDocuments.TEXT)))
+        self.assertEquals(map(unicode, runner.lint_file('testfiles/invalid_config.yml')),
+                ['testfiles/invalid_config.yml:2:6: '
+                 'Unterminated Jinja expression, expected "}}"'])
+
+
+class TestYamlStreamRunner(unittest.TestCase):
+    def test_lint_file(self):
+        rules = [x() for x in RULES.values()]
+        runner = LintRunner('yaml', rules=rules, stream=True)
+        expected = LintRunner('yaml', rules=rules)
+        for path in sorted(glob.glob('testfiles/*.yml')):
+            self.assertEquals(map(unicode, runner.lint_file(path)),
+                    map(unicode, expected.lint_file(path)), path)
+
+        text = ''.join('---\n- name: t{} \n  debug: msg="{{{{ a }}}}"\n'.format(i)
+                for i in range(200))
+        with tempfile.NamedTemporaryFile(suffix='.yml') as f:
+            f.write(text.encode('utf-8'))
+            f.flush()
+            diagnostics = map(unicode, runner.lint_file(f.name))
+            self.assertEquals(diagnostics, map(unicode, expected.lint_file(f.name)))
+        # one trailing whitespace per document, and the second document
+        self.assertEquals(len(diagnostics), 201)
+        self.assertEquals(diagnostics[-1],
+                '{}:599:13: Trailing whitespace [trailing_whitespace]'.format(f.name))
+
+
+class TestParseBudget(unittest.TestCase):
+    def test_runner(self):
+        runner = LintRunner('yaml', budget=ParseBudget(max_steps=150))
+        diagnostics = list(runner.run(['testfiles/test.yml', 'testfiles/invalid_config.yml']))
+        self.assertEquals(len(diagnostics), 2)
+        self.assertTrue(diagnostics[0].msg.startswith('Parse step budget of 150 exceeded in stream > '))
+        self.assertEquals(diagnostics[1].msg, 'Unterminated Jinja expression, expected "}}"')
+
+    def test_documents(self):
+        # the budget holds for the whole file however its documents are parsed
+        text = 'a: 1\nb: 2\n---\n' * 50
+        for budget in [ParseBudget(max_steps=2000), ParseBudget(max_depth=3)]:
+            expected = map(unicode, LintRunner('yaml', budget=budget).lint_text('t', text))
+            self.assertTrue(expected[0].startswith('t:'), expected)
+            for workers in [1, 2]:
+                runner = LintRunner('yaml', document_workers=workers, budget=budget)
+                try:
+                    self.assertEquals(map(unicode, runner.lint_text('t', text)), expected)
+                finally:
+                    runner.close()
+
+        # one document at a time, each document only has the steps the ones before left
+        runner = LintRunner('yaml', budget=ParseBudget(max_steps=2000),
+                max_memory=projected_memory(len(text)) - 1)
+        self.assertIsNot(runner.check_memory(text), None)
+        diagnostic, = runner.lint_text('t', text)
+        self.assertTrue(diagnostic.msg.startswith('Parse step budget of 2000 exceeded'))
+
+    def test_limits(self):
+        decls = load_grammar('yaml')
+        text = 'a:\n  b:\n    c: [1, 2]\n'
+        self.assertIs(parse_text(decls, 'stream', text, budget=ParseBudget(1000, 60, 20))[1], None)
+
+        result, error = parse_text(decls, 'stream', text, budget=ParseBudget(max_depth=5))
+        self.assertEquals(error.decl_stack, ['stream', 'document', 'block_mapping', 'mapping_entry',
+                'key', 'quoted_scalar'])
+        self.assertEquals(error.msg, 'Parse depth budget of 5 exceeded in '
+                'stream > document > block_mapping > mapping_entry > key > quoted_scalar')
+
+        budget = ParseBudget(max_time=0)
+        budget.TIME_CHECK_STEPS = 1
+        result, error = parse_text(decls, 'stream', text, budget=budget)
+        self.assertEquals(error.position, (0, 0))
+        self.assertTrue(error.msg.startswith('Parse time budget of 0s exceeded'))
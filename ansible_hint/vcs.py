@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import os
+import subprocess
+from ansible_hint.includes import is_yaml
+
+
+class GitError(Exception):
+    pass
+
+
+def git(args, cwd=None):
+    """ Runs git with args and returns its output as a list of lines """
+    # NOTE: core.quotepath=off leaves non-ASCII paths unquoted
+    process = subprocess.Popen(['git', '-c', 'core.quotepath=off'] + list(args), cwd=cwd,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    out, err = process.communicate()
+    if process.returncode != 0:
+        raise GitError(err.decode('utf-8').strip() or 'git {} failed'.format(' '.join(args)))
+    return out.decode('utf-8').splitlines()
+
+
+def _local_paths(root, names):
+    # git reports paths from the top of the work tree
+    return [os.path.normpath(os.path.relpath(os.path.join(root, name))) for name in names]
+
+
+def changed_files(ref, cwd='.'):
+    """
+    Returns the YAML files that were modified, added or renamed since ref
+    in the work tree at cwd, including uncommitted and untracked files.
+    Paths are relative to the current directory.
+    """
+    root = git(['rev-parse', '--show-toplevel'], cwd)[0]
+    names = []
+    for line in git(['diff', '--name-status', '-M', '--diff-filter=AMR', ref, '--'], cwd):
+        # renames are "R<score>\told\tnew"
+        names.append(line.split('\t')[-1])
+    names.extend(git(['ls-files', '--others', '--exclude-standard', '--full-name'], cwd))
+    return [path for path in _local_paths(root, names) if is_yaml(path)]
+
+
+def work_tree_files(cwd='.'):
+    """
+    Returns the tracked and untracked YAML files under cwd, relative to the
+    current directory
+    """
+    root = git(['rev-parse', '--show-toplevel'], cwd)[0]
+    names = git(['ls-files', '--cached', '--others', '--exclude-standard', '--full-name'], cwd)
+    return [path for path in _local_paths(root, names)
+            if is_yaml(path) and os.path.isfile(path)]
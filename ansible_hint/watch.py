@@ -0,0 +1,228 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import os
+import time
+from collections import OrderedDict
+from ansible_hint.includes import is_yaml
+
+# seconds between polls; a poll of 5000 files takes about 15ms
+DEFAULT_INTERVAL = 0.05
+
+
+def stat_signature(path):
+    """ Returns what changes when the file at path is written, or None if it does not exist """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime, st.st_size, st.st_ino
+
+
+def diagnostic_changes(old, new):
+    """ Returns (the diagnostics of new not in old, the diagnostics of old not in new) """
+    old_keys = set(map(unicode, old))
+    new_keys = set(map(unicode, new))
+    return ([x for x in new if unicode(x) not in old_keys],
+            [x for x in old if unicode(x) not in new_keys])
+
+
+class Watcher(object):
+    """
+    Lints files, then re-lints the files that change and the files that
+    reference them, keeping the parse result and diagnostics of every file
+    in memory between polls.
+
+    Changes are found by polling: each poll stats every file of the
+    DependencyGraph, and lists a watched directory again only when its own
+    stat changed, as it does when a file in it is added, removed or
+    renamed.  Files are compared by mtime, size and inode, so an editor
+    that saves by renaming a new file over the old one is noticed as well.
+
+    The references of each file are found as lint_project() finds them;
+    see LintRunner.references().  Files that the given files reference are
+    parsed and watched, but only linted with follow_includes.
+    """
+    def __init__(self, runner, paths, follow_includes=False):
+        self.runner = runner
+        self.follow_includes = follow_includes
+        # files named directly, which are linted whenever they exist
+        self.files = []
+        # directory -> (signature, its YAML files, its subdirectories)
+        self.directories = OrderedDict()
+        for path in paths:
+            path = os.path.normpath(path)
+            if os.path.isdir(path):
+                self._list_directory(path)
+            else:
+                self.files.append(path)
+        self.roots = []
+        self._root_set = set()
+        self.graph = None
+        # path -> signature of each file of the graph
+        self.signatures = {}
+        # path of a removed file -> the files that referenced it
+        self.missing = {}
+        # path -> diagnostics last reported
+        self.diagnostics = OrderedDict()
+        # paths linted by the last start() or poll()
+        self.linted = []
+
+    def _list_directory(self, path):
+        signature = stat_signature(path)
+        try:
+            names = sorted(os.listdir(path))
+        except OSError:
+            names = []
+        old = self.directories.get(path)
+        files, subdirs = [], []
+        for name in names:
+            # NOTE: hidden entries, such as .git, are never linted
+            if name.startswith('.'):
+                continue
+            child = os.path.join(path, name)
+            if os.path.isdir(child):
+                subdirs.append(child)
+            elif is_yaml(name):
+                files.append(child)
+        self.directories[path] = (signature, files, subdirs)
+        for child in subdirs:
+            if child not in self.directories:
+                self._list_directory(child)
+        if old is not None:
+            for child in old[2]:
+                if child not in subdirs:
+                    self._forget_directory(child)
+
+    def _forget_directory(self, path):
+        signature, files, subdirs = self.directories.pop(path, (None, [], []))
+        for child in subdirs:
+            self._forget_directory(child)
+
+    def _scan_directories(self):
+        # lists the directories that changed again, returning whether any did
+        changed = False
+        for path in list(self.directories):
+            entry = self.directories.get(path)
+            if entry is not None and stat_signature(path) != entry[0]:
+                self._list_directory(path)
+                changed = True
+        return changed
+
+    def _update_roots(self):
+        roots = OrderedDict((path, True) for path in self.files)
+        for signature, files, subdirs in self.directories.values():
+            roots.update((path, True) for path in files)
+        self.roots = list(roots)
+
+    def _reported(self, path):
+        return self.follow_includes or path in self._root_set
+
+    def start(self):
+        """
+        Lints all files, returning (path, diagnostics, []) for each file in
+        the order lint_project() yields them
+        """
+        self._update_roots()
+        self._root_set = set(self.roots)
+        self.graph = graph = self.runner.build_graph(
+                [path for path in self.roots if os.path.isfile(path)])
+        self.runner.graph = graph
+        for path in graph.files:
+            self.signatures[path] = stat_signature(path)
+        return self._lint([path for path in graph.topological_order() if self._reported(path)])
+
+    def poll(self):
+        """
+        Re-lints the files that changed since the last poll, and the files
+        that reference them, returning (path, new diagnostics, fixed
+        diagnostics) for each file whose diagnostics changed
+        """
+        graph = self.graph
+        if self._scan_directories():
+            self._update_roots()
+            self._root_set = set(self.roots)
+        changed, removed = [], []
+        for path, signature in self.signatures.items():
+            current = stat_signature(path)
+            if current != signature:
+                (changed if current is not None else removed).append(path)
+                self.signatures[path] = current
+        added = [path for path in self.roots
+                if path not in self.signatures and os.path.isfile(path)]
+        for path in list(self.missing):
+            if os.path.isfile(path):
+                changed.extend(x for x in self.missing.pop(path) if x in graph.files)
+        self.linted = []
+        if not (changed or removed or added):
+            return []
+
+        events = []
+        # files that referenced a removed file, whose references are gone with it
+        orphaned = []
+        for path in removed:
+            dependents = graph.dependents(path)
+            if dependents:
+                self.missing[path] = dependents
+                orphaned.extend(dependents)
+            graph.remove(path)
+            del self.signatures[path]
+            self._forget(path, events)
+        for path in added:
+            path, new = graph.add(path)
+            if new:
+                changed.append(path)
+        changed = [path for path in OrderedDict.fromkeys(changed) if path in graph.files]
+
+        references = dict((path, list(graph.files[path].references)) for path in changed)
+        self.runner.parse_graph_files(graph, changed)
+        for path in graph.files:
+            if path not in self.signatures:
+                self.signatures[path] = stat_signature(path)
+        if removed or any(graph.files[x].references != refs for x, refs in references.items()):
+            self._prune(events)
+
+        affected = set(changed + orphaned)
+        affected.update(graph.all_dependents(changed + orphaned))
+        order = graph.topological_order([path for path in graph.files if path in affected])
+        return events + self._lint([path for path in order if self._reported(path)])
+
+    def _prune(self, events):
+        # removes the files that no root references any more
+        graph = self.graph
+        reachable = set()
+        stack = [path for path in self.roots if path in graph.files]
+        while stack:
+            path = stack.pop()
+            if path not in reachable:
+                reachable.add(path)
+                stack.extend(target for kind, target in graph.files[path].references)
+        for path in [x for x in graph.files if x not in reachable]:
+            graph.remove(path)
+            del self.signatures[path]
+            self._forget(path, events)
+
+    def _forget(self, path, events):
+        old = self.diagnostics.pop(path, None)
+        if old:
+            events.append((path, [], old))
+
+    def _lint(self, paths):
+        events = []
+        for path in paths:
+            diagnostics = self.runner.lint_graph_file(self.graph, path)
+            new, fixed = diagnostic_changes(self.diagnostics.get(path, []), diagnostics)
+            self.diagnostics[path] = diagnostics
+            if new or fixed:
+                events.append((path, new, fixed))
+        self.linted = list(paths)
+        return events
+
+    def watch(self, interval=DEFAULT_INTERVAL):
+        """ Yields the events of start(), then those of a poll() every interval seconds """
+        for event in self.start():
+            yield event
+        while True:
+            time.sleep(interval)
+            for event in self.poll():
+                yield event
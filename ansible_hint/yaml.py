@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import io
+import re
+from ansible_hint.parser import AstNode, AstResult
+from ansible_hint.grammar import load_grammar, link_grammar
+from ansible_hint.runner import parse_text
+from ansible_hint.comments import CommentTable
+
+# a document marker line, as matched by document_start in the grammar
+DOCUMENT_START = re.compile(r'---[ \t]*(#.*)?$')
+
+# characters that open or close quoted scalars, flow collections and comments
+STRUCTURE_CHARS = re.compile(r'["\'#\[\]{}]')
+
+# the rest of a quoted scalar, up to and including its closing quote
+QUOTE_END = {
+    '"': re.compile(r'(?:[^"\\]|\\.)*"'),
+    "'": re.compile(r"(?:[^']|'')*'"),
+}
+
+
+def build_yaml_decls():
+    """ Builds the YAML grammar from its BNF grammar modules """
+    return link_grammar('yaml_block')
+
+
+def _opens_quote(line, index):
+    # a quote only starts a scalar at the start of a node, not inside a plain scalar
+    before = line[:index].rstrip(' \t')
+    return before == '' or before[-1] in ':-[{,'
+
+
+def _scan_line(line, quote, depth):
+    """ Returns the (quote, depth) state at the end of line """
+    index = 0
+    while True:
+        if quote is not None:
+            match = QUOTE_END[quote].match(line, index)
+            if match is None:
+                return quote, depth
+            quote = None
+            index = match.end()
+
+        match = STRUCTURE_CHARS.search(line, index)
+        if match is None:
+            return quote, depth
+        ch = match.group()
+        index = match.end()
+        if ch == '#':
+            return quote, depth
+        elif ch in '[{':
+            depth += 1
+        elif ch in ']}':
+            depth = max(depth - 1, 0)
+        elif _opens_quote(line, match.start()):
+            quote = ch
+
+
+def _chunk_bounds(lines):
+    """
+    Yields the (offset, line) at which each document chunk after the first
+    starts, for lines that keep their newlines, then the (offset, line) of
+    the end of the text
+    """
+    quote = None
+    depth = 0
+    offset = 0
+    line_no = 0
+    for line in lines:
+        content = line[:-1] if line.endswith('\n') else line
+        if quote is None and depth == 0 and offset > 0 and DOCUMENT_START.match(content):
+            yield offset, line_no
+        quote, depth = _scan_line(content, quote, depth)
+        offset += len(line)
+        line_no += 1
+    yield offset, line_no
+
+
+def split_documents(text):
+    """
+    Returns the (offset, line) at which each document chunk of text starts.
+
+    A chunk starts at a "---" marker line that is not inside a quoted scalar
+    or flow collection.  The scan is a heuristic; parse_documents() falls back
+    to a sequential parse if a chunk does not parse on its own.
+    """
+    return [(0, 0)] + list(_chunk_bounds(io.StringIO(text)))[:-1]
+
+
+def largest_document(stream):
+    """
+    Returns the characters of the largest document chunk of the text read
+    from the file-like object stream, as split_documents() splits it
+    """
+    largest = start = 0
+    for offset, line in _chunk_bounds(stream):
+        largest = max(largest, offset - start)
+        start = offset
+    return largest
+
+
+def _parse_chunk(args):
+    # NOTE: module-level so that it can be sent to pool workers
+    grammar, keep, side_table, budget, memoize, decl, text, line = args
+    result, error = parse_text(load_grammar(grammar, keep, side_table), decl, text, line, budget,
+            memoize)
+    if error is not None:
+        return None
+    return result.items, list(result.comments)
+
+
+def parse_documents(grammar, decl, text, pool=None, keep=None, side_table=(), budget=None,
+        memoize=False):
+    """
+    Parses each document chunk of text separately, optionally on a
+    multiprocessing pool, and returns (result, error) as parse_text() would
+    for the whole of text.  keep and side_table are passed to load_grammar().
+
+    The ParseBudget holds for the whole of text: the chunks share its
+    deadline, and a chunk over budget is parsed again sequentially, which
+    reports the error as a sequential parse does.  The steps of a
+    sequential parse are not those of its chunks added up, so text is
+    parsed sequentially if the budget limits steps.
+    """
+    decls = load_grammar(grammar, keep, side_table)
+    chunks = split_documents(text)
+    if len(chunks) == 1 or (budget is not None and budget.max_steps is not None):
+        return parse_text(decls, decl, text, budget=budget, memoize=memoize)
+    if budget is not None:
+        budget = budget.for_file()
+
+    ends = [offset for offset, line in chunks[1:]] + [len(text)]
+    jobs = [(grammar, keep, side_table, budget, memoize, decl, text[offset:end], line)
+            for (offset, line), end in zip(chunks, ends)]
+    results = pool.map(_parse_chunk, jobs) if pool is not None else map(_parse_chunk, jobs)
+
+    # any chunk that fails on its own, or is over budget, is reported exactly as a
+    # sequential parse would
+    if any(chunk is None for chunk in results):
+        return parse_text(decls, decl, text, budget=budget, memoize=memoize)
+
+    children = []
+    comments = []
+    for (items, chunk_comments), (start, line) in zip(results, chunks):
+        for node in items:
+            children.extend(node.children)
+        comments.extend((start + offset, comment) for offset, comment in chunk_comments)
+    result = AstResult(AstNode(decl, text, (0, 0), *children))
+    result.comments = CommentTable(comments)
+    return result, None
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Grammar serialization benchmark for ansible_hint.
+
+Measures the pickled size of each registered grammar, as sent to worker
+processes, and the time to unpickle it.  Exits non-zero if a grammar is
+over its size budget or the median load time exceeds its budget.
+
+    python bench/bench_grammar.py [--runs N]
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import argparse
+import os
+import pickle
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ansible_hint.grammar import GRAMMARS, GRAMMAR_MODULES, load_grammar
+
+# budgets in bytes and seconds, measured against the median run
+SIZE_BUDGET = 4096
+LOAD_BUDGET = 0.01
+
+
+def time_load(data):
+    start = time.time()
+    pickle.loads(data)
+    return time.time() - start
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ansible_hint grammar serialization benchmark')
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    failed = False
+    for name in sorted(list(GRAMMARS) + list(GRAMMAR_MODULES)):
+        grammar = load_grammar(name)
+        data = pickle.dumps(grammar, pickle.HIGHEST_PROTOCOL)
+        # the size of the decls pickled as plain objects, for comparison
+        plain = len(pickle.dumps(list(grammar), pickle.HIGHEST_PROTOCOL))
+        load = median([time_load(data) for _ in range(args.runs)])
+        over = len(data) > SIZE_BUDGET or load > LOAD_BUDGET
+        print('{:<8} {:8} bytes ({:.1f}x smaller) {:8.4f}s load (budget {} bytes, {:.3f}s) {}'.format(
+                name, len(data), plain / len(data), load, SIZE_BUDGET, LOAD_BUDGET,
+                'OVER BUDGET' if over else 'ok'))
+        failed = failed or over
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
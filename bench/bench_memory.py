@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Memory benchmark for ansible_hint.
+
+Measures the bytes per character of text that linting a generated playbook
+of many documents needs, in each parse mode, as the growth of the peak RSS
+of a fresh process.  Each mode is measured at two file sizes, and the
+difference is divided by the difference in characters, so memory that does
+not grow with the file, such as the stream buffer, is left out.  Compares
+the results to the projections in ansible_hint.memory, and exits non-zero
+if a projection is under its measurement.
+
+    python bench/bench_memory.py [--documents N]
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import argparse
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ansible_hint.memory import BYTES_PER_CHAR, PRUNED_BYTES_PER_CHAR, STREAMED_BYTES_PER_CHAR
+
+DOCUMENT = ('---\n'
+            '- name: task {0} with a longer name\n'
+            '  debug:\n'
+            '    msg: "{{{{ item }}}} {0}"\n'
+            '  when: x == {0}\n'
+            '  with_items: [a, b, c]\n')
+
+# mode -> (LintRunner options, projected bytes per character)
+MODES = [
+    ('whole', {'prune': False}, BYTES_PER_CHAR),
+    ('pruned', {}, PRUNED_BYTES_PER_CHAR),
+    ('streamed', {'stream': True}, STREAMED_BYTES_PER_CHAR),
+]
+
+# run in a fresh process: prints the growth of the peak RSS while linting a file
+MEASURE = '''
+import gc, json, resource, sys
+from ansible_hint.memory import RSS_UNIT
+from ansible_hint.rules import RULES
+from ansible_hint.runner import LintRunner
+runner = LintRunner('yaml', rules=[x() for x in RULES.values()], **json.loads(sys.argv[2]))
+gc.collect()
+start = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+runner.lint_file(sys.argv[1])
+print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start) * RSS_UNIT)
+'''
+
+
+def write_playbook(path, documents):
+    text = ''.join(DOCUMENT.format(i) for i in range(documents))
+    with io.open(path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    return len(text)
+
+
+def peak_growth(path, options):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    output = subprocess.check_output([sys.executable, '-c', MEASURE, path, json.dumps(options)],
+            env=env)
+    return int(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ansible_hint memory benchmark')
+    parser.add_argument('--documents', type=int, default=1000,
+            help='documents of the larger file; the smaller has a quarter of them')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        files = []
+        for documents in [args.documents // 4, args.documents]:
+            path = os.path.join(directory, '{}.yml'.format(documents))
+            files.append((path, write_playbook(path, documents)))
+        (small, small_size), (large, large_size) = files
+
+        failed = False
+        for name, options, projected in MODES:
+            growth = peak_growth(large, options) - peak_growth(small, options)
+            measured = growth / (large_size - small_size)
+            status = 'ok' if measured <= projected else 'OVER PROJECTION'
+            print('{:<10} {:8.1f} bytes/char (projected {}) {}'.format(
+                    name, measured, projected, status))
+            failed = failed or measured > projected
+    finally:
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
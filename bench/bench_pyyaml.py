@@ -0,0 +1,244 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Differential conformance and speed benchmark against PyYAML.
+
+Loads every input of a corpus - testfiles/*.yml, generated documents and
+any paths given - with the ansible_hint YAML parser and with PyYAML, and
+reports each input whose loaded values differ.  Inputs that both reject
+agree.  Then reports the throughput and peak memory of each loader, and
+their ratios to ansible_hint.  Exits non-zero if any input differs, and
+skips with status 0 if PyYAML is not installed.
+
+    python bench/bench_pyyaml.py [--generated N] [--seed S] [--runs N] [path ...]
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import argparse
+import glob
+import io
+import os
+import random
+import resource
+import sys
+import time
+from multiprocessing import Process, Pipe
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ansible_hint.parser import ParseError
+from ansible_hint.grammar import load_grammar
+from ansible_hint.runner import parse_text
+from ansible_hint.construct import construct_documents, first_difference
+
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+WORDS = ['name', 'hosts', 'tasks', 'become', 'state', 'path', 'owner', 'mode', 'with_items',
+    'when', 'notify', 'vars', 'src', 'dest', 'package', 'service', 'enabled', 'port']
+
+# plain scalars that resolve to other types or stay text
+PLAIN_SCALARS = ['present', 'yes', 'no', 'true', 'Off', '~', 'null', '42', '0644', '0x1F',
+    '1_000', '-7', '3.25', '.inf', '1e3', '2001-12-14', '12:30:45', 'a b c', '/etc/motd',
+    'foo {{ bar }} baz', 'x:y', 'http://example.com/#x', '-.5', '+12', 'v1.2.3']
+
+QUOTED_SCALARS = ["'single'", "'it''s'", "'# not a comment'", '"double"', '"tab\\there"',
+    '"quote \\" inside"', '"{{ item.name }}"', '"\\x41\\u00e9"', "''", '""', "'yes'", '"42"']
+
+FLOW_SCALARS = ['[a, b, c]', '[1, "two", 3.0]', '{a: 1, b: [x, y]}', '[]', '{}', '[{k: v}]']
+
+
+def generate_scalar(rng):
+    kind = rng.random()
+    if kind < 0.5:
+        return rng.choice(PLAIN_SCALARS)
+    if kind < 0.8:
+        return rng.choice(QUOTED_SCALARS)
+    return rng.choice(FLOW_SCALARS)
+
+
+def _comment(rng):
+    return '  # {}'.format(rng.choice(WORDS)) if rng.random() < 0.1 else ''
+
+
+def generate_block(rng, indent, depth, sequence=None):
+    """ Returns the lines of a block mapping or sequence at indent """
+    pad = ' ' * indent
+    lines = []
+    if sequence is None:
+        sequence = rng.random() < 0.4
+    if not sequence:
+        for key in rng.sample(WORDS, rng.randint(1, 5)):
+            if depth > 0 and rng.random() < 0.35:
+                lines.append('{}{}:{}'.format(pad, key, _comment(rng)))
+                if rng.random() < 0.3:
+                    # a sequence may be at the same indent as its key
+                    lines.extend(generate_block(rng, indent, depth - 1, True))
+                else:
+                    lines.extend(generate_block(rng, indent + 2, depth - 1))
+            elif rng.random() < 0.05:
+                lines.append('{}{}:'.format(pad, key))
+            else:
+                lines.append('{}{}: {}{}'.format(pad, key, generate_scalar(rng), _comment(rng)))
+            if rng.random() < 0.05:
+                lines.append('')
+        return lines
+    for _ in range(rng.randint(1, 4)):
+        kind = rng.random()
+        if depth > 0 and kind < 0.3:
+            # a compact mapping starts on the entry's line
+            nested = generate_block(rng, indent + 2, depth - 1)
+            lines.append('{}- {}'.format(pad, nested[0][indent + 2:]))
+            lines.extend(nested[1:])
+        elif depth > 0 and kind < 0.4:
+            lines.append('{}-'.format(pad))
+            lines.extend(generate_block(rng, indent + 2, depth - 1))
+        elif kind < 0.45:
+            lines.append('{}-'.format(pad))
+        else:
+            lines.append('{}- {}{}'.format(pad, generate_scalar(rng), _comment(rng)))
+    return lines
+
+
+def generate_stream(rng):
+    documents = []
+    for _ in range(rng.randint(1, 3)):
+        documents.append('\n'.join(generate_block(rng, 0, rng.randint(0, 4))) + '\n')
+    if len(documents) == 1 and rng.random() < 0.5:
+        return documents[0]
+    return ''.join('---\n' + x for x in documents)
+
+
+def build_corpus(paths, generated, seed):
+    """ Returns a list of (name, text) """
+    corpus = []
+    for path in sorted(glob.glob(os.path.join(ROOT, 'testfiles', '*.yml'))) + paths:
+        with io.open(path, encoding='utf-8') as f:
+            corpus.append((os.path.relpath(path), f.read()))
+    rng = random.Random(seed)
+    for index in range(generated):
+        corpus.append(('generated-{}'.format(index), generate_stream(rng)))
+    return corpus
+
+
+def load_ansible_hint(text):
+    result, error = parse_text(load_grammar('yaml'), 'stream', text)
+    if error is not None:
+        raise error
+    return construct_documents(result)
+
+
+def pyyaml_loaders():
+    """ Returns a list of (name, load function) for the PyYAML loaders available """
+    loaders = [('PyYAML', yaml.SafeLoader)]
+    if getattr(yaml, '__with_libyaml__', False):
+        loaders.append(('PyYAML (libyaml)', yaml.CSafeLoader))
+    return [(name, lambda text, loader=loader: list(yaml.load_all(text, Loader=loader)))
+            for name, loader in loaders]
+
+
+def _outcome(load, text):
+    try:
+        return load(text), None
+    except (ParseError, yaml.YAMLError) as e:
+        return None, unicode(e).split('\n')[0]
+
+
+def compare(name, text, reference):
+    """ Returns a description of how the loaders disagree on text, or None """
+    ours, our_error = _outcome(load_ansible_hint, text)
+    theirs, their_error = _outcome(reference, text)
+    if our_error is not None and their_error is not None:
+        return None
+    if our_error is not None:
+        return 'ansible_hint rejects it: {}'.format(our_error)
+    if their_error is not None:
+        return 'PyYAML rejects it: {}'.format(their_error)
+    difference = first_difference(ours, theirs)
+    if difference is None:
+        return None
+    return 'at {}: ansible_hint {!r}, PyYAML {!r}'.format(*difference)
+
+
+def _loads_all(load, corpus):
+    results = []
+    for name, text in corpus:
+        try:
+            results.append(load(text))
+        except (ParseError, yaml.YAMLError):
+            results.append(None)
+    return results
+
+
+def time_loader(load, corpus, runs):
+    """ Returns the best time to load the whole corpus """
+    best = None
+    for _ in range(runs):
+        start = time.time()
+        _loads_all(load, corpus)
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _measure_memory(load, corpus, conn):
+    # NOTE: the first load warms up grammars and imports before the baseline
+    _loads_all(load, corpus[:1])
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    results = _loads_all(load, corpus)
+    conn.send(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before)
+    del results
+
+
+def peak_memory(load, corpus):
+    """ Returns the growth of peak RSS, in KB, from loading the corpus in a new process """
+    receiver, sender = Pipe(False)
+    process = Process(target=_measure_memory, args=(load, corpus, sender))
+    process.start()
+    result = receiver.recv()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ansible_hint conformance benchmark against PyYAML')
+    parser.add_argument('paths', nargs='*', help='additional YAML files for the corpus')
+    parser.add_argument('--generated', type=int, default=200, metavar='N',
+            help='number of generated inputs (default: 200)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    if yaml is None:
+        print('PyYAML is not installed; skipping')
+        return 0
+
+    corpus = build_corpus(args.paths, args.generated, args.seed)
+    loaders = pyyaml_loaders()
+    mismatches = 0
+    for name, text in corpus:
+        difference = compare(name, text, loaders[0][1])
+        if difference is not None:
+            mismatches += 1
+            print('{}: {}'.format(name, difference))
+    print('{} of {} inputs differ'.format(mismatches, len(corpus)))
+
+    size = sum(len(text.encode('utf-8')) for name, text in corpus)
+    base_time = time_loader(load_ansible_hint, corpus, args.runs)
+    base_memory = max(peak_memory(load_ansible_hint, corpus), 1)
+    print('{:<20} {:>12} {:>8} {:>12} {:>8}'.format('loader', 'KB/s', 'speed', 'peak KB', 'memory'))
+    print('{:<20} {:12.1f} {:>8} {:12} {:>8}'.format(
+            'ansible_hint', size / 1024 / base_time, '1.00x', base_memory, '1.00x'))
+    for name, load in loaders:
+        elapsed = time_loader(load, corpus, args.runs)
+        memory = peak_memory(load, corpus)
+        print('{:<20} {:12.1f} {:>7.2f}x {:12} {:>7.2f}x'.format(
+                name, size / 1024 / elapsed, base_time / elapsed, memory, memory / base_memory))
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
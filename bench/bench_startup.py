@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Startup benchmark for ansible_hint.
+
+Measures the wall time of `python -c "import ansible_hint"` and the time from
+launching bin/ansible_hint to the first diagnostic line on stdout.  Exits
+non-zero if the median of either measurement exceeds its budget.
+
+    python bench/bench_startup.py [--runs N]
+"""
+
+from __future__ import division, absolute_import, print_function, unicode_literals
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# budgets in seconds, measured against the median run
+IMPORT_BUDGET = 0.25
+FIRST_DIAGNOSTIC_BUDGET = 0.75
+
+# a file that fails to parse, so the CLI always emits a diagnostic
+DIAGNOSTIC_FILE = os.path.join(ROOT, 'testfiles', 'invalid_config.yml')
+
+
+def _env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    return env
+
+
+def time_import():
+    start = time.time()
+    subprocess.check_call([sys.executable, '-c', 'import ansible_hint'], env=_env())
+    return time.time() - start
+
+
+def time_first_diagnostic():
+    cmd = [sys.executable, os.path.join(ROOT, 'bin', 'ansible_hint'), DIAGNOSTIC_FILE]
+    start = time.time()
+    proc = subprocess.Popen(cmd, stdout=subprocess.PIPE, env=_env())
+    line = proc.stdout.readline()
+    elapsed = time.time() - start
+    proc.communicate()
+    if not line:
+        raise RuntimeError('CLI produced no diagnostic for {}'.format(DIAGNOSTIC_FILE))
+    return elapsed
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ansible_hint startup benchmark')
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for name, fn, budget in [
+            ('import ansible_hint', time_import, IMPORT_BUDGET),
+            ('first diagnostic', time_first_diagnostic, FIRST_DIAGNOSTIC_BUDGET)]:
+        result = median([fn() for _ in range(args.runs)])
+        status = 'ok' if result <= budget else 'OVER BUDGET'
+        print('{:<20} {:8.3f}s (budget {:.3f}s) {}'.format(name, result, budget, status))
+        failed = failed or result > budget
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
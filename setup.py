@@ -1,6 +1,17 @@
 #!/usr/bin/env python
 
+import os
 from setuptools import setup
+from setuptools.command.build_py import build_py
+
+
+class build_py_frozen(build_py):
+    """ Freezes the registered grammars into the built package """
+    def run(self):
+        build_py.run(self)
+        from ansible_hint.grammar import freeze_all
+        freeze_all(os.path.join(self.build_lib, 'ansible_hint', 'frozen'))
+
 
 def readme():
     with open('readme.md') as f:
@@ -15,7 +26,10 @@ setup(
     author='Eric Anderton',
     author_email='eric.t.anderton@gmail.com',
     license='MIT',
-    packages=['ansible_hint'],
+    packages=['ansible_hint', 'ansible_hint.frozen'],
+    package_data={
+        'ansible_hint': ['*.bnf'],
+    },
     scripts=[
         'bin/ansible_hint'
     ],
@@ -27,4 +41,7 @@ setup(
         'nose'
     ],
     #include_package_data=True,  # NOTE: enable for MANIFEST.in data to install into site-packages
+    cmdclass={
+        'build_py': build_py_frozen,
+    },
     zip_safe=False)